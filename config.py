@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 
+from lib.logging_setup import parse_levels, parse_rates
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -13,6 +15,11 @@ DB_CONFIG = {
     'port': int(os.getenv('DB_PORT', '3306')),
 }
 
+# Storage backend: mysql (DB_CONFIG above), or sqlite / duckdb for a local database file
+# at DB_PATH (duckdb needs the duckdb package)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql')
+DB_PATH = os.getenv('DB_PATH') or f'nhl_data.{DB_BACKEND}'
+
 # NHL API configuration
 NHL_API_BASE_URL = 'https://api-web.nhle.com/v1'
 
@@ -24,6 +31,93 @@ REFRESH_INTERVALS = {
     'stats': 3600,    # 1 hour
 }
 
+# Games refresh interval per game type (in seconds); None fetches that type once per season
+GAME_TYPE_INTERVALS = {
+    1: None,    # preseason: fetched once
+    2: 3600,    # regular season: 1 hour
+    3: 900,     # playoffs: few games, high interest, 15 minutes
+}
+
+# Daemon scheduler settings (times in seconds)
+SCHEDULER = {
+    'state_file': os.getenv('SCHEDULER_STATE_FILE', 'scheduler_state.json'),
+    'workers': int(os.getenv('SCHEDULER_WORKERS', '2')),
+    'game_duration': 10800,   # expected length of a game, 3 hours
+    'postgame_delay': 900,    # wait for final stats after a game ends, 15 minutes
+    'idle_interval': 86400,   # stats check when no games are scheduled, 24 hours
+}
+
+# Player bio fields are refetched once the stored record is older than this (in seconds)
+PLAYER_STALENESS = int(os.getenv('PLAYER_STALENESS', '604800'))  # 7 days
+
+# Worker processes used to decode and transform boxscores (0 disables the pool)
+TRANSFORM_WORKERS = int(os.getenv('TRANSFORM_WORKERS', '0'))
+
+# Write games and stats with LOAD DATA LOCAL INFILE (requires local_infile=ON on the server)
+BULK_LOAD = os.getenv('BULK_LOAD', 'false').lower() == 'true'
+
+# Stats sync strategy: boxscore (per game), gamelog (per player) or auto (planner decides)
+STATS_STRATEGY = os.getenv('STATS_STRATEGY', 'auto')
+
+# Seasons fetched concurrently when several seasons are synchronized at once
+SEASON_WORKERS = int(os.getenv('SEASON_WORKERS', '4'))
+
+# Read-through cache for the web JSON API (set CACHE_REDIS_URL to share it between processes)
+CACHE = {
+    'max_entries': int(os.getenv('CACHE_MAX_ENTRIES', '1024')),
+    'ttl': int(os.getenv('CACHE_TTL', '300')),  # 5 minutes
+    'redis_url': os.getenv('CACHE_REDIS_URL') or None,
+}
+
+# Validators (ETag / Last-Modified / content hash) of standings and roster responses;
+# unchanged payloads skip the database write. Set HTTP_CACHE_PATH empty to disable.
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', 'http_cache.json')
+
+# Directory of the Parquet snapshots written by --export (needs the pyarrow package)
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+
+# Write-ahead spool: batches written while the database is unreachable are kept here and
+# replayed once it is back. Set SPOOL_DIR empty to fail the sync instead.
+SPOOL = {
+    'path': os.getenv('SPOOL_DIR', 'spool'),
+    'max_bytes': int(os.getenv('SPOOL_MAX_BYTES', str(2 * 1024 ** 3))),  # syncs stop at 2 GB spooled
+    'segment_bytes': 64 * 1024 * 1024,
+    'retry_interval': 30,       # seconds between reconnect attempts while spooling
+}
+
+# Sync job queue shared by the web interface and sync_worker.py
+JOB_QUEUE = {
+    'path': os.getenv('JOB_QUEUE_PATH', 'sync_jobs.db'),
+    'workers': int(os.getenv('SYNC_WORKERS', '1')),
+    'poll_interval': 2.0,       # seconds between checks for new jobs
+    'heartbeat_timeout': 120,   # a running job without heartbeat for this long has failed
+}
+
+# Sharded syncs (sync_worker.py --leases): every worker on the same plan claims work units
+# (rosters, season schedules, game id ranges) through leases in the sync_leases table
+LEASES = {
+    'plan': os.getenv('LEASE_PLAN') or None,
+    'seasons': os.getenv('LEASE_SEASONS', ''),
+    'sync': os.getenv('LEASE_SYNC', 'all'),
+    'lease_seconds': int(os.getenv('LEASE_SECONDS', '300')),
+    'games_per_unit': int(os.getenv('LEASE_GAMES_PER_UNIT', '100')),
+    'poll_interval': 5.0,       # seconds between claim attempts while other workers hold the rest
+}
+
 # Logging configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-LOG_FILE = os.getenv('LOG_FILE', 'nhl_sync.log')
\ No newline at end of file
+LOG_FILE = os.getenv('LOG_FILE', 'nhl_sync.log')
+
+# Options for lib.logging_setup.setup_logging
+LOGGING = {
+    'level': LOG_LEVEL,
+    'log_file': LOG_FILE,
+    'json_console': os.getenv('LOG_JSON_CONSOLE', 'false').lower() == 'true',
+    # Per-module levels, e.g. "nhl_sync.api=WARNING,nhl_sync.database=DEBUG"
+    'module_levels': parse_levels(os.getenv('LOG_MODULE_LEVELS', '')),
+    # Keep one in N per-item messages, e.g. "schedule_date=10,boxscore=50"
+    'sample_rates': parse_rates(os.getenv('LOG_SAMPLE_RATES', '')),
+    'default_sample_rate': int(os.getenv('LOG_SAMPLE_RATE', '10')),
+    'max_bytes': int(os.getenv('LOG_MAX_BYTES', '10485760')),  # 10 MB
+    'backup_count': int(os.getenv('LOG_BACKUP_COUNT', '5')),
+}
\ No newline at end of file
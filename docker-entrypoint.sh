@@ -7,6 +7,9 @@ if [ "$INIT_DB" = "true" ]; then
   python nhl_sync.py --init
 fi
 
-# Start the web server
+# Start the web server (with its own sync worker unless one runs in another container)
 echo "Starting NHL MySQL Sync web server on port 7443..."
+if [ "$START_WORKER" = "false" ]; then
+  exec python web_server.py --host 0.0.0.0 --port 7443 --no-worker
+fi
 exec python web_server.py --host 0.0.0.0 --port 7443
\ No newline at end of file
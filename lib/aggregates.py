@@ -0,0 +1,97 @@
+"""
+Season aggregates for NHL MySQL Sync.
+Maintains per-player season totals derived from the per-game stats tables.
+"""
+
+import logging
+
+# Player ids recomputed per statement during incremental refreshes
+REFRESH_CHUNK_SIZE = 1000
+
+# Key of the totals tables
+TOTALS_KEY_FIELDS = ('season', 'player_id')
+
+PLAYER_TOTALS_COLUMNS = ('season', 'player_id', 'games_played', 'goals', 'assists', 'points', 'shots', 'hits',
+                         'blocked_shots', 'penalty_minutes', 'toi_seconds')
+
+# {toi_seconds} is the backend's conversion of the 'MM:SS' time_on_ice column
+PLAYER_TOTALS_SELECT = """
+    SELECT season, player_id, COUNT(*), SUM(goals), SUM(assists), SUM(goals + assists),
+           SUM(shots), SUM(hits), SUM(blocked_shots), SUM(penalty_minutes), SUM({toi_seconds})
+    FROM player_stats
+    {where}
+    GROUP BY season, player_id
+"""
+
+GOALIE_TOTALS_COLUMNS = ('season', 'player_id', 'games_played', 'wins', 'losses', 'ot_losses', 'shots_against',
+                         'saves', 'goals_against', 'toi_seconds', 'save_percentage')
+
+GOALIE_TOTALS_SELECT = """
+    SELECT season, player_id, COUNT(*),
+           SUM(CASE WHEN decision = 'W' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN decision = 'L' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN decision = 'O' THEN 1 ELSE 0 END),
+           SUM(shots_against), SUM(saves), SUM(goals_against), SUM({toi_seconds}),
+           CASE WHEN SUM(shots_against) > 0
+                THEN SUM(shots_against - goals_against) * 1.0 / SUM(shots_against) ELSE 0 END
+    FROM goalie_stats
+    {where}
+    GROUP BY season, player_id
+"""
+
+# Aggregate table, its columns and the SELECT that fills it, per stats table
+TOTALS = {
+    'player_stats': ('player_season_totals', PLAYER_TOTALS_COLUMNS, PLAYER_TOTALS_SELECT),
+    'goalie_stats': ('goalie_season_totals', GOALIE_TOTALS_COLUMNS, GOALIE_TOTALS_SELECT),
+}
+
+
+class SeasonTotals:
+    """Keeps the season totals tables in step with the stats tables."""
+
+    def __init__(self, db_manager):
+        """Initialize with the database manager used for the aggregate queries."""
+        self.db = db_manager
+        self.logger = logging.getLogger('nhl_sync.aggregates')
+        # Upserts of the totals in the backend's dialect, with a {where} left to fill in
+        toi_seconds = db_manager.backend.toi_seconds_sql('time_on_ice')
+        self.statements = {
+            stats_table: (totals_table, db_manager.backend.upsert_sql(
+                totals_table, columns, TOTALS_KEY_FIELDS,
+                source=select.format(toi_seconds=toi_seconds, where='{where}')))
+            for stats_table, (totals_table, columns, select) in TOTALS.items()
+        }
+
+    def refresh(self, stats_table, season, player_ids):
+        """Recompute the totals of the given players for one season.
+
+        Only the touched players are regrouped, which keeps each refresh
+        proportional to the size of the sync batch.
+        """
+        _, totals_sql = self.statements[stats_table]
+        player_ids = sorted(set(player_ids))
+        for start in range(0, len(player_ids), REFRESH_CHUNK_SIZE):
+            chunk = player_ids[start:start + REFRESH_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            where = f"WHERE season = %s AND player_id IN ({placeholders})"
+            self.db.execute_query(totals_sql.format(where=where), (int(season), *chunk))
+        if player_ids:
+            self.logger.info(f"Refreshed {stats_table} season totals for {len(player_ids)} players in {season}")
+
+    def rebuild(self, season=None):
+        """Rebuild the totals from scratch for one season, or for all seasons."""
+        for totals_table, totals_sql in self.statements.values():
+            if season is None:
+                statements = [
+                    (f"DELETE FROM {totals_table}", ()),
+                    # SQLite needs a WHERE before an upsert's ON CONFLICT clause
+                    (totals_sql.format(where='WHERE 1 = 1'), ()),
+                ]
+            else:
+                statements = [
+                    (f"DELETE FROM {totals_table} WHERE season = %s", (int(season),)),
+                    (totals_sql.format(where='WHERE season = %s'), (int(season),)),
+                ]
+            self.db.execute_transaction(statements)
+            scope = f"season {season}" if season is not None else "all seasons"
+            self.logger.info(f"Rebuilt {totals_table} for {scope}")
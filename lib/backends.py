@@ -0,0 +1,883 @@
+"""
+Storage backends for NHL MySQL Sync.
+Connections and SQL dialects of the databases the synced data can be stored in.
+"""
+
+import logging
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+# Tables whose last_updated column MySQL maintains with ON UPDATE CURRENT_TIMESTAMP;
+# the other backends set it in their upserts instead
+TIMESTAMPED_TABLES = {
+    'teams', 'players', 'games', 'player_stats', 'goalie_stats',
+    'player_season_totals', 'goalie_season_totals',
+}
+
+# Query placeholders written for mysql.connector, translated for the file backends
+PLACEHOLDER_PATTERN = re.compile(r'%s')
+
+# First season that gets its own partition in season-partitioned tables
+FIRST_PARTITIONED_SEASON = 2010
+
+# MySQL schema, created in this order; {partitions} is the season partitioning clause
+MYSQL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS teams (
+        id INT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        abbreviation VARCHAR(10) NOT NULL,
+        team_name VARCHAR(100) NOT NULL,
+        location_name VARCHAR(100) NOT NULL,
+        division_id INT,
+        division_name VARCHAR(100),
+        conference_id INT,
+        conference_name VARCHAR(100),
+        active BOOLEAN DEFAULT TRUE,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    # team_identity: the stable id of every team abbreviation (see lib.teams)
+    """
+    CREATE TABLE IF NOT EXISTS team_identity (
+        abbreviation VARCHAR(10) PRIMARY KEY,
+        team_id INT NOT NULL,
+        name VARCHAR(100),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY team_idx (team_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        id INT PRIMARY KEY,
+        full_name VARCHAR(100) NOT NULL,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        primary_number VARCHAR(10),
+        birth_date DATE,
+        current_team_id INT,
+        position VARCHAR(50),
+        shooter VARCHAR(10),
+        height VARCHAR(10),
+        weight INT,
+        nationality VARCHAR(50),
+        active BOOLEAN DEFAULT TRUE,
+        rookie BOOLEAN DEFAULT FALSE,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (current_team_id) REFERENCES teams(id)
+    )
+    """,
+    # The season-scoped tables are partitioned by season so a season
+    # can be reloaded by swapping one partition; InnoDB does not
+    # allow foreign keys on partitioned tables, so these have none.
+    """
+    CREATE TABLE IF NOT EXISTS games (
+        id INT NOT NULL,
+        season INT NOT NULL,
+        game_type VARCHAR(10) NOT NULL,
+        date_time DATETIME NOT NULL,
+        away_team_id INT NOT NULL,
+        home_team_id INT NOT NULL,
+        venue VARCHAR(100),
+        status VARCHAR(50) NOT NULL,
+        away_score INT DEFAULT 0,
+        home_score INT DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, season),
+        KEY away_team_idx (away_team_id),
+        KEY home_team_idx (home_team_id)
+    )
+    {partitions}
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_stats (
+        id INT AUTO_INCREMENT,
+        player_id INT NOT NULL,
+        game_id INT NOT NULL,
+        season INT NOT NULL,
+        team_id INT NOT NULL,
+        position VARCHAR(10),
+        goals INT DEFAULT 0,
+        assists INT DEFAULT 0,
+        shots INT DEFAULT 0,
+        hits INT DEFAULT 0,
+        blocked_shots INT DEFAULT 0,
+        penalty_minutes INT DEFAULT 0,
+        time_on_ice VARCHAR(10),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, season),
+        UNIQUE KEY player_game (player_id, game_id, season),
+        KEY game_idx (game_id)
+    )
+    {partitions}
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS goalie_stats (
+        id INT AUTO_INCREMENT,
+        player_id INT NOT NULL,
+        game_id INT NOT NULL,
+        season INT NOT NULL,
+        team_id INT NOT NULL,
+        shots_against INT DEFAULT 0,
+        saves INT DEFAULT 0,
+        goals_against INT DEFAULT 0,
+        time_on_ice VARCHAR(10),
+        decision VARCHAR(10),
+        save_percentage DECIMAL(5,3),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, season),
+        UNIQUE KEY goalie_game (player_id, game_id, season),
+        KEY game_idx (game_id)
+    )
+    {partitions}
+    """,
+    # Play-by-play tables. Events are integer coded and keyed by
+    # season first so each season lives in its own partition; InnoDB
+    # does not allow foreign keys on partitioned tables.
+    """
+    CREATE TABLE IF NOT EXISTS event_types (
+        code TINYINT UNSIGNED PRIMARY KEY,
+        name VARCHAR(50) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS game_events (
+        season INT NOT NULL,
+        game_id INT NOT NULL,
+        event_idx SMALLINT UNSIGNED NOT NULL,
+        event_id INT,
+        event_type TINYINT UNSIGNED NOT NULL,
+        period TINYINT UNSIGNED NOT NULL,
+        period_seconds SMALLINT UNSIGNED,
+        x_coord SMALLINT,
+        y_coord SMALLINT,
+        team_id INT,
+        player1_id INT,
+        player2_id INT,
+        player3_id INT,
+        PRIMARY KEY (season, game_id, event_idx),
+        KEY event_type_idx (season, event_type)
+    )
+    {partitions}
+    """,
+    # Season totals tables, maintained from the stats tables
+    """
+    CREATE TABLE IF NOT EXISTS player_season_totals (
+        season INT NOT NULL,
+        player_id INT NOT NULL,
+        games_played INT DEFAULT 0,
+        goals INT DEFAULT 0,
+        assists INT DEFAULT 0,
+        points INT DEFAULT 0,
+        shots INT DEFAULT 0,
+        hits INT DEFAULT 0,
+        blocked_shots INT DEFAULT 0,
+        penalty_minutes INT DEFAULT 0,
+        toi_seconds INT DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (season, player_id),
+        KEY player_idx (player_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS goalie_season_totals (
+        season INT NOT NULL,
+        player_id INT NOT NULL,
+        games_played INT DEFAULT 0,
+        wins INT DEFAULT 0,
+        losses INT DEFAULT 0,
+        ot_losses INT DEFAULT 0,
+        shots_against INT DEFAULT 0,
+        saves INT DEFAULT 0,
+        goals_against INT DEFAULT 0,
+        toi_seconds INT DEFAULT 0,
+        save_percentage DECIMAL(5,3),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (season, player_id),
+        KEY player_idx (player_id)
+    )
+    """,
+    # Sync run history, one row per sync (see lib.runs)
+    """
+    CREATE TABLE IF NOT EXISTS sync_runs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        job_type VARCHAR(20) NOT NULL,
+        season INT,
+        status VARCHAR(20) NOT NULL,
+        started_at DATETIME NOT NULL,
+        finished_at DATETIME,
+        duration_seconds DECIMAL(10,3),
+        requests INT DEFAULT 0,
+        bytes_downloaded BIGINT DEFAULT 0,
+        rows_inserted INT DEFAULT 0,
+        rows_updated INT DEFAULT 0,
+        rows_unchanged INT DEFAULT 0,
+        errors INT DEFAULT 0,
+        peak_memory_kb INT,
+        KEY started_idx (started_at),
+        KEY job_type_idx (job_type, started_at)
+    )
+    """,
+    # Sync leases: work units of sharded syncs and who holds them (see lib.leases)
+    """
+    CREATE TABLE IF NOT EXISTS sync_leases (
+        plan_id VARCHAR(64) NOT NULL,
+        unit VARCHAR(64) NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        season INT,
+        first_id INT,
+        last_id INT,
+        priority INT NOT NULL DEFAULT 0,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        owner VARCHAR(100),
+        expires_at DOUBLE,
+        attempts INT NOT NULL DEFAULT 0,
+        error TEXT,
+        finished_at DOUBLE,
+        PRIMARY KEY (plan_id, unit),
+        KEY claim_idx (plan_id, status, priority)
+    )
+    """,
+]
+
+# Schema of the file backends: the MySQL schema without partitions, foreign keys
+# and unsigned types. games is keyed by id alone, as upserts name their conflict
+# columns and games are written with key_fields ['id'].
+PORTABLE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS teams (
+        id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        abbreviation VARCHAR(10) NOT NULL,
+        team_name VARCHAR(100) NOT NULL,
+        location_name VARCHAR(100) NOT NULL,
+        division_id INTEGER,
+        division_name VARCHAR(100),
+        conference_id INTEGER,
+        conference_name VARCHAR(100),
+        active BOOLEAN DEFAULT TRUE,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS team_identity (
+        abbreviation VARCHAR(10) PRIMARY KEY,
+        team_id INTEGER NOT NULL UNIQUE,
+        name VARCHAR(100),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        id INTEGER PRIMARY KEY,
+        full_name VARCHAR(100) NOT NULL,
+        first_name VARCHAR(50) NOT NULL,
+        last_name VARCHAR(50) NOT NULL,
+        primary_number VARCHAR(10),
+        birth_date DATE,
+        current_team_id INTEGER,
+        position VARCHAR(50),
+        shooter VARCHAR(10),
+        height VARCHAR(10),
+        weight INTEGER,
+        nationality VARCHAR(50),
+        active BOOLEAN DEFAULT TRUE,
+        rookie BOOLEAN DEFAULT FALSE,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY,
+        season INTEGER NOT NULL,
+        game_type VARCHAR(10) NOT NULL,
+        date_time TIMESTAMP NOT NULL,
+        away_team_id INTEGER NOT NULL,
+        home_team_id INTEGER NOT NULL,
+        venue VARCHAR(100),
+        status VARCHAR(50) NOT NULL,
+        away_score INTEGER DEFAULT 0,
+        home_score INTEGER DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS games_season_idx ON games (season)",
+    """
+    CREATE TABLE IF NOT EXISTS player_stats (
+        player_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        season INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        position VARCHAR(10),
+        goals INTEGER DEFAULT 0,
+        assists INTEGER DEFAULT 0,
+        shots INTEGER DEFAULT 0,
+        hits INTEGER DEFAULT 0,
+        blocked_shots INTEGER DEFAULT 0,
+        penalty_minutes INTEGER DEFAULT 0,
+        time_on_ice VARCHAR(10),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (player_id, game_id, season)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS player_stats_game_idx ON player_stats (game_id)",
+    "CREATE INDEX IF NOT EXISTS player_stats_season_idx ON player_stats (season)",
+    """
+    CREATE TABLE IF NOT EXISTS goalie_stats (
+        player_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        season INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        shots_against INTEGER DEFAULT 0,
+        saves INTEGER DEFAULT 0,
+        goals_against INTEGER DEFAULT 0,
+        time_on_ice VARCHAR(10),
+        decision VARCHAR(10),
+        save_percentage DECIMAL(5,3),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (player_id, game_id, season)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS goalie_stats_game_idx ON goalie_stats (game_id)",
+    "CREATE INDEX IF NOT EXISTS goalie_stats_season_idx ON goalie_stats (season)",
+    """
+    CREATE TABLE IF NOT EXISTS event_types (
+        code SMALLINT PRIMARY KEY,
+        name VARCHAR(50) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS game_events (
+        season INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        event_idx INTEGER NOT NULL,
+        event_id INTEGER,
+        event_type SMALLINT NOT NULL,
+        period SMALLINT NOT NULL,
+        period_seconds INTEGER,
+        x_coord SMALLINT,
+        y_coord SMALLINT,
+        team_id INTEGER,
+        player1_id INTEGER,
+        player2_id INTEGER,
+        player3_id INTEGER,
+        PRIMARY KEY (season, game_id, event_idx)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS game_events_type_idx ON game_events (season, event_type)",
+    """
+    CREATE TABLE IF NOT EXISTS player_season_totals (
+        season INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        games_played INTEGER DEFAULT 0,
+        goals INTEGER DEFAULT 0,
+        assists INTEGER DEFAULT 0,
+        points INTEGER DEFAULT 0,
+        shots INTEGER DEFAULT 0,
+        hits INTEGER DEFAULT 0,
+        blocked_shots INTEGER DEFAULT 0,
+        penalty_minutes INTEGER DEFAULT 0,
+        toi_seconds INTEGER DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (season, player_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS player_season_totals_player_idx ON player_season_totals (player_id)",
+    """
+    CREATE TABLE IF NOT EXISTS goalie_season_totals (
+        season INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        games_played INTEGER DEFAULT 0,
+        wins INTEGER DEFAULT 0,
+        losses INTEGER DEFAULT 0,
+        ot_losses INTEGER DEFAULT 0,
+        shots_against INTEGER DEFAULT 0,
+        saves INTEGER DEFAULT 0,
+        goals_against INTEGER DEFAULT 0,
+        toi_seconds INTEGER DEFAULT 0,
+        save_percentage DECIMAL(5,3),
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (season, player_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS goalie_season_totals_player_idx ON goalie_season_totals (player_id)",
+    """
+    CREATE TABLE IF NOT EXISTS sync_runs (
+        id {auto_id},
+        job_type VARCHAR(20) NOT NULL,
+        season INTEGER,
+        status VARCHAR(20) NOT NULL,
+        started_at TIMESTAMP NOT NULL,
+        finished_at TIMESTAMP,
+        duration_seconds DECIMAL(10,3),
+        requests INTEGER DEFAULT 0,
+        bytes_downloaded BIGINT DEFAULT 0,
+        rows_inserted INTEGER DEFAULT 0,
+        rows_updated INTEGER DEFAULT 0,
+        rows_unchanged INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        peak_memory_kb INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS sync_runs_started_idx ON sync_runs (started_at)",
+    "CREATE INDEX IF NOT EXISTS sync_runs_job_type_idx ON sync_runs (job_type, started_at)",
+    """
+    CREATE TABLE IF NOT EXISTS sync_leases (
+        plan_id VARCHAR(64) NOT NULL,
+        unit VARCHAR(64) NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        season INTEGER,
+        first_id INTEGER,
+        last_id INTEGER,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        owner VARCHAR(100),
+        expires_at DOUBLE,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        finished_at DOUBLE,
+        PRIMARY KEY (plan_id, unit)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS sync_leases_claim_idx ON sync_leases (plan_id, status, priority)",
+]
+
+
+def season_partitions_sql(column='season'):
+    """Build a PARTITION BY RANGE clause with one partition per season.
+    
+    Seasons are stored as integers like 20232024; later seasons land in
+    the catch-all p_future partition until it is reorganized.
+    """
+    partitions = [f"PARTITION p_before VALUES LESS THAN ({FIRST_PARTITIONED_SEASON}{FIRST_PARTITIONED_SEASON + 1})"]
+    for year in range(FIRST_PARTITIONED_SEASON, datetime.now().year + 1):
+        next_season = f"{year + 1}{year + 2}"
+        partitions.append(f"PARTITION p{year}{year + 1} VALUES LESS THAN ({next_season})")
+    partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return f"PARTITION BY RANGE ({column}) (\n    " + ",\n    ".join(partitions) + "\n)"
+
+
+class StorageBackend(ABC):
+    """A database the synced data can be stored in.
+
+    Opens connections that behave like mysql.connector's (%s placeholders,
+    cursor(dictionary=True), is_connected()) and supplies the SQL that
+    differs between databases: upserts, insert-ignores, the schema and
+    bulk loads. DatabaseManager does the rest the same way everywhere.
+    """
+
+    name = None
+    # Season-scoped tables are partitioned by season (MySQL only)
+    partitioned = False
+    # Exception type of the driver
+    errors = Exception
+    # Affected rows upsert_sql reports per updated row (inserts count 1, unchanged rows 0)
+    affected_per_update = 1
+
+    def __init__(self):
+        self.logger = logging.getLogger('nhl_sync.database')
+
+    @abstractmethod
+    def connect(self, **options):
+        """Open a new connection."""
+
+    @abstractmethod
+    def upsert_sql(self, table, columns, key_fields, source=None):
+        """Return an INSERT that updates the non-key columns of rows whose key exists.
+
+        The rows come from source, a SELECT, or else from one row of
+        placeholders (for executemany).
+        """
+
+    @abstractmethod
+    def insert_ignore_sql(self, table, columns):
+        """Return an INSERT of one row of placeholders that skips rows whose key exists."""
+
+    @abstractmethod
+    def toi_seconds_sql(self, column):
+        """Return an expression converting an 'MM:SS' column into seconds."""
+
+    @abstractmethod
+    def create_schema(self, cursor):
+        """Create the tables that do not exist yet."""
+
+    @abstractmethod
+    def column_types(self, cursor, table):
+        """Return {column: lower-case declared type} of a table."""
+
+    def bulk_load(self, db, table, columns, rows, key_fields):
+        """Insert or update a large batch of rows; plain batched upserts by default."""
+        return db.insert_rows(table, columns, rows, key_fields)
+
+    @staticmethod
+    def _values(columns, source):
+        """Return the row source of an INSERT: source, or one row of placeholders."""
+        return source or f"VALUES ({', '.join(['%s'] * len(columns))})"
+
+
+class MySQLBackend(StorageBackend):
+    """MySQL through mysql.connector, with season-partitioned tables.
+
+    Schema migrations, partition swaps and LOAD DATA bulk loads live in
+    DatabaseManager, which predates the other backends.
+    """
+
+    name = 'mysql'
+    partitioned = True
+    affected_per_update = 2
+
+    def __init__(self, db_config):
+        super().__init__()
+        self.db_config = db_config
+
+    @property
+    def errors(self):
+        import mysql.connector
+        return mysql.connector.Error
+
+    def connect(self, **options):
+        # Imported here so the file backends start without loading the MySQL driver
+        import mysql.connector
+        return mysql.connector.connect(**self.db_config, **options)
+
+    def upsert_sql(self, table, columns, key_fields, source=None):
+        update_stmt = ', '.join(f"{field} = VALUES({field})" for field in columns if field not in key_fields)
+        return f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            {self._values(columns, source)}
+            ON DUPLICATE KEY UPDATE {update_stmt}
+        """
+
+    def insert_ignore_sql(self, table, columns):
+        return f"INSERT IGNORE INTO {table} ({', '.join(columns)}) {self._values(columns, None)}"
+
+    def toi_seconds_sql(self, column):
+        return (f"CAST(SUBSTRING_INDEX({column}, ':', 1) AS UNSIGNED) * 60"
+                f" + CAST(SUBSTRING_INDEX({column}, ':', -1) AS UNSIGNED)")
+
+    def create_schema(self, cursor):
+        partitions = season_partitions_sql()
+        for statement in MYSQL_SCHEMA:
+            cursor.execute(statement.format(partitions=partitions))
+
+    def column_types(self, cursor, table):
+        cursor.execute("""
+            SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        return {name: data_type.lower() for name, data_type in cursor.fetchall()}
+
+
+class FileBackend(StorageBackend):
+    """Base of the single-file backends (SQLite, DuckDB): no server to run.
+
+    Both speak the same upsert dialect (INSERT ... ON CONFLICT DO UPDATE)
+    and share PORTABLE_SCHEMA. As on MySQL, an upsert leaves rows whose
+    values are unchanged alone and does not count them as affected.
+    """
+
+    # Column definition of an auto-numbered id, formatted into PORTABLE_SCHEMA
+    auto_id = None
+    # Expression for the current time in an upsert's SET list
+    now_sql = 'CURRENT_TIMESTAMP'
+    # Null-safe inequality operator
+    distinct_sql = 'IS NOT'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def upsert_sql(self, table, columns, key_fields, source=None):
+        fields = [field for field in columns if field not in key_fields]
+        updates = [f"{field} = excluded.{field}" for field in fields]
+        if updates and table in TIMESTAMPED_TABLES and 'last_updated' not in columns:
+            updates.append(f"last_updated = {self.now_sql}")
+        changed = ' OR '.join(f"{table}.{field} {self.distinct_sql} excluded.{field}" for field in fields)
+        action = f"DO UPDATE SET {', '.join(updates)} WHERE {changed}" if updates else "DO NOTHING"
+        return f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            {self._values(columns, source)}
+            ON CONFLICT ({', '.join(key_fields)}) {action}
+        """
+
+    def insert_ignore_sql(self, table, columns):
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) {self._values(columns, None)}"
+
+    def toi_seconds_sql(self, column):
+        return (f"CAST(substr({column}, 1, instr({column}, ':') - 1) AS INTEGER) * 60"
+                f" + CAST(substr({column}, instr({column}, ':') + 1) AS INTEGER)")
+
+    def create_schema(self, cursor):
+        for statement in PORTABLE_SCHEMA:
+            cursor.execute(statement.format(auto_id=self.auto_id))
+
+
+class SQLiteBackend(FileBackend):
+    """SQLite database file, for offline use, tests and benchmarks."""
+
+    name = 'sqlite'
+    errors = sqlite3.Error
+    auto_id = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    # Seconds a writer waits for another process's write lock
+    timeout = 30.0
+
+    def connect(self, **options):
+        connection = sqlite3.connect(self.path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES)
+        # WAL lets the web interface read while a sync writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        return _Connection(connection)
+
+    def column_types(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1]: row[2].lower() for row in cursor.fetchall()}
+
+
+class DuckDBBackend(FileBackend):
+    """DuckDB database file, a columnar local copy for analytical queries.
+
+    Only one process can open a DuckDB file for writing, so it suits CLI
+    syncs rather than the web interface plus a separate sync worker.
+    Needs the duckdb package.
+    """
+
+    name = 'duckdb'
+    auto_id = "INTEGER PRIMARY KEY DEFAULT nextval('sync_runs_id_seq')"
+    # DuckDB binds a bare CURRENT_TIMESTAMP in SET as a column name
+    now_sql = 'now()'
+    distinct_sql = 'IS DISTINCT FROM'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._duckdb = None
+
+    @property
+    def errors(self):
+        return self._module().Error
+
+    def _module(self):
+        """Import duckdb on first use, so it stays optional."""
+        if self._duckdb is None:
+            try:
+                import duckdb
+            except ImportError:
+                raise RuntimeError("The duckdb storage backend needs the duckdb package (pip install duckdb)")
+            self._duckdb = duckdb
+        return self._duckdb
+
+    def connect(self, **options):
+        return _DuckDBConnection(self._module().connect(self.path))
+
+    def create_schema(self, cursor):
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS sync_runs_id_seq")
+        super().create_schema(cursor)
+
+    def column_types(self, cursor, table):
+        cursor.execute("""
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+        """, (table,))
+        return {name: data_type.lower() for name, data_type in cursor.fetchall()}
+
+    def bulk_load(self, db, table, columns, rows, key_fields):
+        """Upsert the rows in one statement from a registered DataFrame instead of row by row."""
+        import pandas as pd
+
+        columns = list(columns)
+        # object dtype keeps Python values as they are (no NaN for missing ints)
+        frame = pd.DataFrame(list(rows), columns=columns, dtype=object)
+        if frame.empty:
+            return 0
+        connection = db.get_connection()
+        try:
+            connection.raw.register('bulk_rows', frame)
+            cursor = connection.cursor()
+            cursor.execute(self.upsert_sql(table, columns, key_fields,
+                                           source=f"SELECT {', '.join(columns)} FROM bulk_rows"))
+            connection.commit()
+            self.logger.info(f"Bulk loaded {len(frame)} rows into {table}")
+            return cursor.rowcount
+        except self.errors:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+
+class _Connection:
+    """mysql.connector style wrapper of a DB-API connection using ? placeholders."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._open = True
+
+    def cursor(self, dictionary=False, **options):
+        return _Cursor(self.raw.cursor(), dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+        self._open = False
+
+    def is_connected(self):
+        return self._open
+
+
+class _DuckDBConnection(_Connection):
+    """DuckDB connection kept in an explicit transaction, like a MySQL connection.
+
+    DuckDB autocommits unless a transaction is begun, and its cursor()
+    opens a separate connection with its own transactions, so statements
+    run on the connection itself.
+    """
+
+    def __init__(self, raw):
+        super().__init__(raw)
+        self.raw.begin()
+
+    def cursor(self, dictionary=False, **options):
+        return _DuckDBCursor(self.raw, dictionary)
+
+    def commit(self):
+        self.raw.commit()
+        self.raw.begin()
+
+    def rollback(self):
+        self.raw.rollback()
+        self.raw.begin()
+
+    def close(self):
+        # Uncommitted work is discarded, as when a MySQL connection closes
+        self.raw.rollback()
+        super().close()
+
+
+class _Cursor:
+    """mysql.connector style cursor: %s placeholders and optional dict rows."""
+
+    def __init__(self, raw, dictionary=False):
+        self.raw = raw
+        self.dictionary = dictionary
+        self.rowcount = -1
+
+    @property
+    def description(self):
+        return self.raw.description
+
+    @property
+    def lastrowid(self):
+        return self.raw.lastrowid
+
+    def execute(self, query, params=()):
+        self.raw.execute(PLACEHOLDER_PATTERN.sub('?', query), tuple(params or ()))
+        self.rowcount = self.raw.rowcount
+
+    def executemany(self, query, rows):
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            self.rowcount = 0
+            return
+        self.raw.executemany(PLACEHOLDER_PATTERN.sub('?', query), rows)
+        self.rowcount = self.raw.rowcount if self.raw.rowcount >= 0 else len(rows)
+
+    def fetchall(self):
+        return self._rows(self.raw.fetchall())
+
+    def fetchmany(self, size):
+        return self._rows(self.raw.fetchmany(size))
+
+    def fetchone(self):
+        row = self.raw.fetchone()
+        return None if row is None else self._rows([row])[0]
+
+    def close(self):
+        pass
+
+    def _rows(self, rows):
+        if not self.dictionary:
+            return [tuple(row) for row in rows]
+        names = [column[0] for column in self.raw.description]
+        return [dict(zip(names, row)) for row in rows]
+
+
+class _DuckDBCursor(_Cursor):
+    """Cursor over a DuckDB connection; DML row counts come back as a 'Count' result."""
+
+    @property
+    def lastrowid(self):
+        return None
+
+    def execute(self, query, params=()):
+        super().execute(query, params)
+        description = self.raw.description
+        if self.rowcount < 0 and description and len(description) == 1 and description[0][0] == 'Count':
+            row = self.raw.fetchone()
+            if row is not None:
+                self.rowcount = row[0]
+
+    def executemany(self, query, rows):
+        # DuckDB's executemany only reports the last statement's count; it runs row by row anyway
+        total = 0
+        for row in rows:
+            self.execute(query, row)
+            total += max(self.rowcount, 0)
+        self.rowcount = total
+
+
+def _adapt_timestamp(value):
+    """Store datetimes as 'YYYY-MM-DD HH:MM:SS' text, the format the converter reads back."""
+    return value.isoformat(' ')
+
+
+def _convert_timestamp(value):
+    """Read a TIMESTAMP/DATETIME column back as a naive (UTC if zoned) datetime."""
+    text = value.decode('utf-8')
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _convert_date(value):
+    """Read a DATE column back as a date."""
+    text = value.decode('utf-8')
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+# sqlite3's default date adapters are deprecated; register explicit ones
+sqlite3.register_adapter(datetime, _adapt_timestamp)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+sqlite3.register_converter('DATETIME', _convert_timestamp)
+sqlite3.register_converter('DATE', _convert_date)
+sqlite3.register_converter('BOOLEAN', lambda value: value not in (b'0', b''))
+
+# Backends selectable with DB_BACKEND
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+    'duckdb': DuckDBBackend,
+}
+
+
+def create_backend(name, db_config=None, path=None):
+    """Return the storage backend called name: MySQL uses db_config, the file backends path."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {name!r}, expected one of {sorted(BACKENDS)}")
+    if name == 'mysql':
+        return MySQLBackend(db_config)
+    return BACKENDS[name](path)
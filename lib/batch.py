@@ -0,0 +1,167 @@
+"""
+Transactional batch coordinator for NHL MySQL Sync.
+Writes related rows across tables as units that commit together or not at all.
+"""
+
+import logging
+
+# Rows written per transaction; units are never split across transactions
+COMMIT_ROWS = 5000
+
+# Parent rows each table refers to, as (column, parent table), parents first
+PARENT_KEYS = {
+    'player_stats': (('team_id', 'teams'), ('player_id', 'players')),
+    'goalie_stats': (('team_id', 'teams'), ('player_id', 'players')),
+}
+
+# Placeholder parent rows created for ids that have not been synced yet;
+# a later teams/players sync overwrites them with the real records
+STUB_PARENTS = {
+    'teams': (('id', 'name', 'abbreviation', 'team_name', 'location_name', 'active'),
+              lambda team_id: (team_id, f'Team {team_id}', '', '', '', False)),
+    'players': (('id', 'full_name', 'first_name', 'last_name', 'active'),
+                lambda player_id: (player_id, f'Player {player_id}', '', '', False)),
+}
+
+
+def group_units(key_column, tables):
+    """Group rows of several tables into units by a shared key column.
+
+    tables is an iterable of (table, columns, rows); the result is a list of
+    (key, {table: (columns, rows)}) in first-seen key order, e.g. one unit
+    per game holding its skater and goalie lines.
+    """
+    units = {}
+    for table, columns, rows in tables:
+        index = list(columns).index(key_column)
+        for row in rows:
+            unit = units.setdefault(row[index], {})
+            unit.setdefault(table, (columns, []))[1].append(row)
+    return list(units.items())
+
+
+class BatchCoordinator:
+    """Commits units of related rows in size-bounded transactions.
+
+    Every table of a unit is written on one connection and committed
+    together, so a game never ends up with its skater lines but not its
+    goalie lines. Parent rows the unit refers to (see PARENT_KEYS) are
+    created as stubs in the same transaction when they do not exist yet,
+    instead of failing on an unknown player. If a transaction fails, its
+    units are retried one by one, so a bad unit only costs itself.
+    """
+
+    def __init__(self, db_manager, commit_rows=COMMIT_ROWS):
+        """Initialize with the database manager and the rows per transaction."""
+        self.db = db_manager
+        self.commit_rows = commit_rows
+        self.logger = logging.getLogger('nhl_sync.batch')
+
+    def write_units(self, units, key_fields, on_commit=None):
+        """Write (key, {table: (columns, rows)}) units and return a UnitResult.
+
+        on_commit is called as on_commit(table, columns, rows, rows_affected,
+        existing_rows) for every table of a transaction once it has been
+        committed, existing_rows being how many of the rows' keys were
+        stored before.
+        Units that could not be written are logged and their keys listed in
+        the result's failed attribute.
+        """
+        result = UnitResult()
+        group = []
+        group_rows = 0
+        for unit in units:
+            group.append(unit)
+            group_rows += sum(len(rows) for _, rows in unit[1].values())
+            if group_rows >= self.commit_rows:
+                self._write_group(group, key_fields, on_commit, result)
+                group = []
+                group_rows = 0
+        if group:
+            self._write_group(group, key_fields, on_commit, result)
+        if result.stubs:
+            self.logger.warning(f"Created {result.stubs} placeholder parent rows; "
+                                f"the next teams/players sync fills them in")
+        return result
+
+    def _write_group(self, group, key_fields, on_commit, result):
+        """Write a group of units in one transaction, falling back to one unit at a time."""
+        try:
+            self._commit(group, key_fields, on_commit, result)
+            return
+        except self.db.errors as e:
+            if len(group) == 1:
+                self.logger.error(f"Error writing unit {group[0][0]}, skipping it: {e}")
+                result.failed.append(group[0][0])
+                return
+            self.logger.warning(f"Error writing {len(group)} units, retrying them one by one: {e}")
+        for unit in group:
+            self._write_group([unit], key_fields, on_commit, result)
+
+    def _commit(self, group, key_fields, on_commit, result):
+        """Write the stub parents and every table of the group, then commit."""
+        tables = {}
+        for _, unit in group:
+            for table, (columns, rows) in unit.items():
+                tables.setdefault((table, tuple(columns)), []).extend(rows)
+
+        connection = self.db.get_connection()
+        try:
+            stubs = self._insert_stub_parents(connection, tables)
+            written = []
+            for (table, columns), rows in tables.items():
+                existing_rows = self.db.count_existing(table, columns, rows, key_fields, connection=connection)
+                rows_affected = self.db.insert_rows(table, columns, rows, key_fields, connection=connection)
+                written.append((table, columns, rows, rows_affected, existing_rows))
+            connection.commit()
+        except self.db.errors:
+            connection.rollback()
+            raise
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+        result.stubs += stubs
+        for table, columns, rows, rows_affected, existing_rows in written:
+            result.rows_affected += rows_affected or 0
+            result.tables[table] = result.tables.get(table, 0) + (rows_affected or 0)
+            if on_commit is not None:
+                on_commit(table, list(columns), rows, rows_affected, existing_rows)
+
+    def _insert_stub_parents(self, connection, tables):
+        """Create stub rows for parents the rows refer to; returns how many were created."""
+        parent_ids = {}
+        for (table, columns), rows in tables.items():
+            for column, parent in PARENT_KEYS.get(table, ()):
+                if column in columns:
+                    index = columns.index(column)
+                    parent_ids.setdefault(parent, set()).update(
+                        row[index] for row in rows if row[index] is not None)
+
+        created = 0
+        cursor = connection.cursor()
+        try:
+            # Teams first, in the order of PARENT_KEYS
+            for parent in ('teams', 'players'):
+                ids = parent_ids.get(parent)
+                if not ids:
+                    continue
+                columns, stub = STUB_PARENTS[parent]
+                # An insert-ignore leaves existing parents untouched
+                cursor.executemany(self.db.backend.insert_ignore_sql(parent, columns),
+                                   [stub(parent_id) for parent_id in sorted(ids)])
+                created += max(cursor.rowcount, 0)
+        finally:
+            cursor.close()
+        return created
+
+
+class UnitResult:
+    """Outcome of BatchCoordinator.write_units."""
+
+    def __init__(self):
+        self.rows_affected = 0
+        # Rows affected per table
+        self.tables = {}
+        self.stubs = 0
+        self.failed = []
@@ -0,0 +1,177 @@
+"""
+Query cache for NHL MySQL Sync.
+Read-through cache for the JSON API, invalidated by key when the sync writes rows.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# Cache keys touched by a write, per table: (key prefix, key column) pairs
+INVALIDATION_KEYS = {
+    'teams': (('team', 'id'),),
+    'players': (('player', 'id'), ('team', 'current_team_id')),
+    'games': (('game', 'id'),),
+    'player_stats': (('game', 'game_id'), ('player', 'player_id'), ('leaders', 'season')),
+    'goalie_stats': (('game', 'game_id'), ('player', 'player_id'), ('leaders', 'season')),
+}
+
+
+def cache_key(kind, identifier):
+    """Build the cache key of one API resource."""
+    return f"{kind}:{identifier}"
+
+
+def keys_for_rows(table, columns, rows):
+    """Return the cache keys made stale by writing rows to a table."""
+    keys = set()
+    for kind, column in INVALIDATION_KEYS.get(table, ()):
+        if column not in columns:
+            continue
+        index = list(columns).index(column)
+        keys.update(cache_key(kind, row[index]) for row in rows if row[index] is not None)
+    return keys
+
+
+class QueryCache:
+    """LRU cache of serialized API responses with a time-to-live.
+
+    Entries live in process memory by default. When a redis_url is given
+    (and the redis package is installed) entries are shared through Redis,
+    so every web worker sees the same invalidations.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60, redis_url=None, namespace='nhl_sync:'):
+        """Initialize the cache.
+
+        max_entries bounds the in-process LRU and ttl is how long (in
+        seconds) an entry is served before it is reloaded.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self.logger = logging.getLogger('nhl_sync.cache')
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so loads that raced a write are not cached
+        self._generation = 0
+        self._redis = self._connect_redis(redis_url) if redis_url else None
+
+    def _connect_redis(self, redis_url):
+        """Connect the shared backend, falling back to the local LRU."""
+        try:
+            import redis
+        except ImportError:
+            self.logger.warning("redis package not installed, using in-process query cache")
+            return None
+        try:
+            client = redis.Redis.from_url(redis_url)
+            client.ping()
+            return client
+        except Exception as e:
+            self.logger.warning(f"Could not connect to Redis at {redis_url}, using in-process query cache: {e}")
+            return None
+
+    def get(self, key):
+        """Return the cached (body, etag) pair for a key, or None."""
+        if self._redis is not None:
+            try:
+                body = self._redis.get(self.namespace + key)
+            except Exception as e:
+                self.logger.warning(f"Query cache read failed for {key}: {e}")
+                return None
+            return (body, self._etag(body)) if body is not None else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, body, etag = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def set(self, key, value):
+        """Serialize and store a value. Returns the (body, etag) pair."""
+        body = self._serialize(value)
+        etag = self._etag(body)
+
+        if self._redis is not None:
+            try:
+                self._redis.setex(self.namespace + key, self.ttl, body)
+            except Exception as e:
+                self.logger.warning(f"Query cache write failed for {key}: {e}")
+            return body, etag
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def get_or_load(self, key, loader):
+        """Return the (body, etag) pair for a key, calling loader() on a miss.
+
+        A loader returning None is not cached and yields None.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        generation = self._generation
+        value = loader()
+        if value is None:
+            return None
+        if generation != self._generation:
+            # A write landed while loading; serve the result but do not cache it
+            body = self._serialize(value)
+            return body, self._etag(body)
+        return self.set(key, value)
+
+    def invalidate(self, keys):
+        """Drop the given keys."""
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+        if self._redis is not None:
+            try:
+                self._redis.delete(*(self.namespace + key for key in keys))
+            except Exception as e:
+                self.logger.warning(f"Query cache invalidation failed: {e}")
+            return
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate_rows(self, table, columns, rows):
+        """Drop the keys made stale by a write. Usable as a SyncManager write listener."""
+        self.invalidate(keys_for_rows(table, columns, rows))
+
+    def clear(self):
+        """Drop every entry held in process memory."""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _serialize(value):
+        """Encode a value as a JSON response body."""
+        return json.dumps(value, default=str, sort_keys=True).encode('utf-8')
+
+    @staticmethod
+    def _etag(body):
+        """Strong validator for a serialized body."""
+        return hashlib.sha1(body).hexdigest()
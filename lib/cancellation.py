@@ -0,0 +1,39 @@
+"""
+Cooperative cancellation for NHL MySQL Sync.
+"""
+
+import threading
+
+
+class SyncCancelled(BaseException):
+    """Raised inside a sync when its cancellation token has been cancelled.
+
+    Like KeyboardInterrupt it derives from BaseException, so the per-item
+    `except Exception` handlers in the fetch loops let it through instead
+    of logging it and moving on to the next item.
+    """
+
+
+class CancellationToken:
+    """Thread-safe flag checked by long-running syncs.
+
+    One thread calls cancel(); the sync checks the token between items and
+    while response bodies stream in, and stops by raising SyncCancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Ask the sync using this token to stop."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """True once cancel() has been called."""
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Raise SyncCancelled if the token has been cancelled."""
+        if self._event.is_set():
+            raise SyncCancelled()
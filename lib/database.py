@@ -4,86 +4,81 @@ Handles database connections and schema management.
 """
 
 import logging
-import mysql.connector
-from mysql.connector import Error
+import os
+import re
+import tempfile
+from datetime import date, datetime
 
-class MockCursor:
-    """Mock cursor for development/testing without a real database."""
-    
-    def __init__(self, dictionary=False):
-        self.dictionary = dictionary
-        self.rowcount = 0
-    
-    def execute(self, query, params=None):
-        """Mock execute method."""
-        return 0
-    
-    def executemany(self, query, params=None):
-        """Mock executemany method."""
-        self.rowcount = len(params) if params else 0
-        return 0
-    
-    def fetchall(self):
-        """Mock fetchall method."""
-        return []
-    
-    def close(self):
-        """Mock close method."""
-        pass
+from lib.backends import FIRST_PARTITIONED_SEASON, create_backend, season_partitions_sql
+from lib.teams import SEED_TEAMS
+from lib.transform import EVENT_TYPE_CODES, UNKNOWN_EVENT_TYPE
 
-class MockConnection:
-    """Mock connection for development/testing without a real database."""
-    
-    def __init__(self):
-        pass
-    
-    def cursor(self, dictionary=False):
-        """Return a mock cursor."""
-        return MockCursor(dictionary=dictionary)
-    
-    def commit(self):
-        """Mock commit method."""
-        pass
-    
-    def rollback(self):
-        """Mock rollback method."""
-        pass
-    
-    def close(self):
-        """Mock close method."""
-        pass
-    
-    def is_connected(self):
-        """Mock is_connected method."""
-        return True
+# Escapes applied to text values written to LOAD DATA files
+TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+TSV_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+TSV_ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+# Keys looked up per query when counting the stored rows an upsert will update
+KEY_LOOKUP_SIZE = 500
+
+# Schema migrations applied by init_schema, in order: (version, name)
+SCHEMA_MIGRATIONS = [
+    (1, 'partition_stats_by_season'),
+    (2, 'remap_hashed_team_ids'),
+]
+
+# Columns that hold a team id, as (table, column)
+TEAM_REFERENCES = [
+    ('players', 'current_team_id'),
+    ('games', 'away_team_id'),
+    ('games', 'home_team_id'),
+    ('player_stats', 'team_id'),
+    ('goalie_stats', 'team_id'),
+    ('game_events', 'team_id'),
+]
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when no connection to the database can be opened."""
+
+class PartitionError(Exception):
+    """Raised when a season cannot be given a partition of its own."""
 
 class DatabaseManager:
-    """Manages database connections and operations."""
+    """Manages database connections and operations.
+    
+    The database is MySQL by default; backend 'sqlite' or 'duckdb' stores
+    everything in the database file at path instead (see lib.backends).
+    """
     
-    def __init__(self, db_config):
+    def __init__(self, db_config, backend='mysql', path=None):
         """Initialize the database manager with configuration."""
         self.db_config = db_config
+        self.backend = create_backend(backend, db_config, path)
         self.logger = logging.getLogger('nhl_sync.database')
-        # Ensure logger is configured with at least INFO level
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
     
-    def get_connection(self):
-        """Create and return a database connection."""
+    @property
+    def errors(self):
+        """Exception type raised by the backend's driver."""
+        return self.backend.errors
+    
+    def get_connection(self, **options):
+        """Create and return a database connection.
+        
+        Extra keyword options are passed to mysql.connector.connect.
+        Raises DatabaseUnavailable if the database cannot be reached, so a
+        sync fails before fetching anything or spools its writes (see
+        lib.spool) instead of losing them.
+        """
         try:
-            connection = mysql.connector.connect(**self.db_config)
-            if connection.is_connected():
-                self.logger.info("Connected to MySQL database")
-                return connection
-        except Error as e:
-            self.logger.error(f"Error connecting to MySQL database: {e}")
-            # Create a mock connection for development/testing
-            self.logger.warning("Using mock database connection for development")
-            return MockConnection()
+            connection = self.backend.connect(**options)
+        except self.errors as e:
+            self.logger.error(f"Error connecting to {self.backend.name} database: {e}")
+            raise DatabaseUnavailable(f"Cannot connect to the {self.backend.name} database: {e}") from e
+        if not connection.is_connected():
+            raise DatabaseUnavailable(f"Cannot connect to the {self.backend.name} database")
+        self.logger.info(f"Connected to {self.backend.name} database", extra={'sample': 'connection'})
+        return connection
     
     def init_schema(self):
         """Initialize the database schema."""
@@ -91,119 +86,232 @@ class DatabaseManager:
         cursor = connection.cursor()
         
         try:
-            # Create teams table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS teams (
-                    id INT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    abbreviation VARCHAR(10) NOT NULL,
-                    team_name VARCHAR(100) NOT NULL,
-                    location_name VARCHAR(100) NOT NULL,
-                    division_id INT,
-                    division_name VARCHAR(100),
-                    conference_id INT,
-                    conference_name VARCHAR(100),
-                    active BOOLEAN DEFAULT TRUE,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create players table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS players (
-                    id INT PRIMARY KEY,
-                    full_name VARCHAR(100) NOT NULL,
-                    first_name VARCHAR(50) NOT NULL,
-                    last_name VARCHAR(50) NOT NULL,
-                    primary_number VARCHAR(10),
-                    birth_date DATE,
-                    current_team_id INT,
-                    position VARCHAR(50),
-                    shooter VARCHAR(10),
-                    height VARCHAR(10),
-                    weight INT,
-                    nationality VARCHAR(50),
-                    active BOOLEAN DEFAULT TRUE,
-                    rookie BOOLEAN DEFAULT FALSE,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (current_team_id) REFERENCES teams(id)
-                )
-            """)
+            self.backend.create_schema(cursor)
+            cursor.executemany(
+                self.backend.insert_ignore_sql('team_identity', ('abbreviation', 'team_id', 'name')),
+                [(abbreviation, team_id, name) for team_id, abbreviation, name in SEED_TEAMS])
+            cursor.executemany(
+                self.backend.insert_ignore_sql('event_types', ('code', 'name')),
+                [(code, name) for name, code in EVENT_TYPE_CODES.items()] + [(UNKNOWN_EVENT_TYPE, 'unknown')])
+            connection.commit()
             
-            # Create games table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS games (
-                    id INT PRIMARY KEY,
-                    season VARCHAR(10) NOT NULL,
-                    game_type VARCHAR(10) NOT NULL,
-                    date_time DATETIME NOT NULL,
-                    away_team_id INT NOT NULL,
-                    home_team_id INT NOT NULL,
-                    venue VARCHAR(100),
-                    status VARCHAR(50) NOT NULL,
-                    away_score INT DEFAULT 0,
-                    home_score INT DEFAULT 0,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (away_team_id) REFERENCES teams(id),
-                    FOREIGN KEY (home_team_id) REFERENCES teams(id)
-                )
-            """)
+            if self.backend.partitioned:
+                # Bring tables created by older versions up to date
+                self.migrate(cursor)
+                connection.commit()
+            self.logger.info(f"Database schema initialized successfully ({self.backend.name})")
             
-            # Create player_stats table
+        except self.errors as e:
+            self.logger.error(f"Error initializing database schema: {e}")
+            raise
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+    
+    def migrate(self, cursor):
+        """Apply schema migrations that have not been recorded yet."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        
+        for version, name in SCHEMA_MIGRATIONS:
+            if version in applied:
+                continue
+            self.logger.info(f"Applying schema migration {version}: {name}")
+            getattr(self, f"_migration_{name}")(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    
+    def _migration_partition_stats_by_season(self, cursor):
+        """Partition games, player_stats and goalie_stats by season.
+        
+        Tables created before partitioning have foreign keys and no season
+        column on the stats tables. The foreign keys are dropped, season is
+        added and filled from games, and the keys are widened to include the
+        partitioning column.
+        """
+        for table in ('player_stats', 'goalie_stats', 'games'):
+            self._drop_foreign_keys(cursor, table)
+        
+        if not self._is_partitioned(cursor, 'games'):
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS player_stats (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    player_id INT NOT NULL,
-                    game_id INT NOT NULL,
-                    team_id INT NOT NULL,
-                    position VARCHAR(10),
-                    goals INT DEFAULT 0,
-                    assists INT DEFAULT 0,
-                    shots INT DEFAULT 0,
-                    hits INT DEFAULT 0,
-                    blocked_shots INT DEFAULT 0,
-                    penalty_minutes INT DEFAULT 0,
-                    time_on_ice VARCHAR(10),
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (player_id) REFERENCES players(id),
-                    FOREIGN KEY (game_id) REFERENCES games(id),
-                    FOREIGN KEY (team_id) REFERENCES teams(id),
-                    UNIQUE KEY player_game (player_id, game_id)
-                )
+                ALTER TABLE games
+                MODIFY season INT NOT NULL,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id, season)
             """)
-            
-            # Create goalie_stats table
+            cursor.execute(f"ALTER TABLE games {season_partitions_sql()}")
+        
+        for table, unique_key in (('player_stats', 'player_game'), ('goalie_stats', 'goalie_game')):
+            if not self._has_column(cursor, table, 'season'):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN season INT NOT NULL DEFAULT 0 AFTER game_id")
+                cursor.execute(f"""
+                    UPDATE {table} JOIN games ON games.id = {table}.game_id
+                    SET {table}.season = games.season
+                """)
+            if not self._is_partitioned(cursor, table):
+                cursor.execute(f"""
+                    ALTER TABLE {table}
+                    DROP PRIMARY KEY,
+                    ADD PRIMARY KEY (id, season),
+                    DROP INDEX {unique_key},
+                    ADD UNIQUE KEY {unique_key} (player_id, game_id, season)
+                """)
+                cursor.execute(f"ALTER TABLE {table} {season_partitions_sql()}")
+    
+    def _migration_remap_hashed_team_ids(self, cursor):
+        """Move teams stored under hash()-derived ids to their team_identity ids.
+        
+        Older versions derived team ids from hash(abbreviation), which differs
+        between processes, so every run could store the teams (and the games
+        and stats referring to them) under new ids. Each such team is copied
+        to its registered id, the references are moved over and the stray
+        rows deleted.
+        """
+        cursor.execute("""
+            SELECT teams.id, team_identity.team_id FROM teams
+            JOIN team_identity ON team_identity.abbreviation = teams.abbreviation
+            WHERE teams.id <> team_identity.team_id
+        """)
+        for old_id, new_id in cursor.fetchall():
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS goalie_stats (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    player_id INT NOT NULL,
-                    game_id INT NOT NULL,
-                    team_id INT NOT NULL,
-                    shots_against INT DEFAULT 0,
-                    saves INT DEFAULT 0,
-                    goals_against INT DEFAULT 0,
-                    time_on_ice VARCHAR(10),
-                    decision VARCHAR(10),
-                    save_percentage DECIMAL(5,3),
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (player_id) REFERENCES players(id),
-                    FOREIGN KEY (game_id) REFERENCES games(id),
-                    FOREIGN KEY (team_id) REFERENCES teams(id),
-                    UNIQUE KEY goalie_game (player_id, game_id)
-                )
-            """)
-            
+                INSERT IGNORE INTO teams (id, name, abbreviation, team_name, location_name, division_id,
+                                          division_name, conference_id, conference_name, active)
+                SELECT %s, name, abbreviation, team_name, location_name, division_id,
+                       division_name, conference_id, conference_name, active
+                FROM teams WHERE id = %s
+            """, (new_id, old_id))
+            for table, column in TEAM_REFERENCES:
+                cursor.execute(f"UPDATE {table} SET {column} = %s WHERE {column} = %s", (new_id, old_id))
+            cursor.execute("DELETE FROM teams WHERE id = %s", (old_id,))
+            self.logger.info(f"Moved team {old_id} to its registered id {new_id}")
+    
+    def _drop_foreign_keys(self, cursor, table):
+        """Drop every foreign key defined on a table."""
+        cursor.execute("""
+            SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+            WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        for (constraint,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {constraint}")
+    
+    def _is_partitioned(self, cursor, table):
+        """Return True if a table is partitioned."""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        """, (table,))
+        rows = cursor.fetchall()
+        return bool(rows) and rows[0][0] > 0
+    
+    def _has_column(self, cursor, table, column):
+        """Return True if a table has the given column."""
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column))
+        rows = cursor.fetchall()
+        return bool(rows) and rows[0][0] > 0
+    
+    def ensure_season_partition(self, table, season):
+        """Make sure a season has its own partition in a season-partitioned table.
+        
+        Seasons newer than the table definition live in p_future; this splits
+        the season out of it so the partition can be exchanged. Seasons
+        before FIRST_PARTITIONED_SEASON share p_before and raise
+        PartitionError, as does a table that is not partitioned.
+        """
+        season = int(season)
+        partition = f"p{season}"
+        start_year = season // 10000
+        if start_year < FIRST_PARTITIONED_SEASON:
+            raise PartitionError(f"Season {season} is stored in {table}'s p_before partition with every "
+                                 f"season before {FIRST_PARTITIONED_SEASON}, not in one of its own")
+        existing = self.execute_query("""
+            SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        """, (table,), fetch=True)
+        names = {row['name'] for row in existing}
+        if partition in names:
+            return partition
+        if 'p_future' not in names:
+            raise PartitionError(f"Table {table} is not partitioned by season")
+        
+        next_season = f"{start_year + 1}{start_year + 2}"
+        self.logger.info(f"Adding partition {partition} to {table}")
+        self.execute_query(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION p_future INTO (
+                PARTITION {partition} VALUES LESS THAN ({next_season}),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+        """)
+        return partition
+    
+    def replace_season_partition(self, table, season, columns, rows, key_fields, bulk=False):
+        """Atomically replace one season of a partitioned table.
+        
+        The rows are loaded into an unpartitioned copy of the table which is
+        then swapped in with ALTER TABLE ... EXCHANGE PARTITION, so readers
+        see either the old season or the new one, never a mix. Backends
+        without partitions, and seasons before FIRST_PARTITIONED_SEASON
+        (which share the p_before partition), delete and reinsert the
+        season in one transaction instead.
+        """
+        if not self.backend.partitioned or int(season) // 10000 < FIRST_PARTITIONED_SEASON:
+            self._replace_season_rows(table, season, columns, rows, key_fields)
+            return
+        
+        partition = self.ensure_season_partition(table, season)
+        swap_table = f"{table}_swap_{int(season)}"
+        
+        self.execute_query(f"DROP TABLE IF EXISTS {swap_table}")
+        self.execute_query(f"CREATE TABLE {swap_table} LIKE {table}")
+        self.execute_query(f"ALTER TABLE {swap_table} REMOVE PARTITIONING")
+        try:
+            if bulk:
+                self.bulk_load(swap_table, columns, rows, key_fields)
+            else:
+                self.insert_rows(swap_table, columns, rows, key_fields)
+            self.execute_query(f"ALTER TABLE {table} EXCHANGE PARTITION {partition} WITH TABLE {swap_table}")
+            self.logger.info(f"Replaced partition {partition} of {table}")
+        finally:
+            # After the exchange the swap table holds the previous season data
+            self.execute_query(f"DROP TABLE IF EXISTS {swap_table}")
+    
+    def _replace_season_rows(self, table, season, columns, rows, key_fields):
+        """Replace one season of a table by deleting and reinserting it in one transaction."""
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DELETE FROM {table} WHERE season = %s", (int(season),))
+            self.insert_rows(table, columns, rows, key_fields, connection=connection)
             connection.commit()
-            self.logger.info("Database schema initialized successfully")
-            
-        except Error as e:
-            self.logger.error(f"Error initializing database schema: {e}")
+            self.logger.info(f"Replaced season {season} of {table}")
+        except self.errors:
+            connection.rollback()
             raise
         finally:
             if connection.is_connected():
                 cursor.close()
                 connection.close()
     
+    def column_types(self, table):
+        """Return {column: lower-case declared type} of a table."""
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            return self.backend.column_types(cursor, table)
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+    
     def execute_query(self, query, params=None, fetch=False):
         """Execute a SQL query and optionally fetch results."""
         connection = self.get_connection()
@@ -220,7 +328,7 @@ class DatabaseManager:
                 result = cursor.rowcount
                 
             return result
-        except Error as e:
+        except self.errors as e:
             self.logger.error(f"Error executing query: {e}")
             connection.rollback()
             raise
@@ -229,40 +337,36 @@ class DatabaseManager:
                 cursor.close()
                 connection.close()
     
+    def execute_transaction(self, statements):
+        """Execute (query, params) pairs in a single transaction."""
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        
+        try:
+            for query, params in statements:
+                cursor.execute(query, params or ())
+            connection.commit()
+        except self.errors as e:
+            self.logger.error(f"Error executing transaction: {e}")
+            connection.rollback()
+            raise
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+    
     def insert_or_update(self, table, data, key_fields):
         """Insert or update records in a table."""
         if not data:
             return 0
-        print("insert or update before set fields")    
-        # Debug logging
-        print("Data type:", type(data))
-        print("First record type:", type(data[0]))
-        print("First record:", data[0])
         
         # Extract field names from the first record
         fields = list(data[0].keys())
-        print("Fields:", fields)
+        self.logger.debug(f"Writing {len(data)} records to {table}: {fields}")
         
-        # Prepare the base INSERT statement
-        placeholders = ', '.join(['%s'] * len(fields))
-        columns = ', '.join(fields)
-        print("Columns:", columns)
-        print("IOU1")
-        # Prepare the ON DUPLICATE KEY UPDATE part
-        update_stmt = ', '.join([f"{field} = VALUES({field})" for field in fields 
-                                if field not in key_fields])
-        print("IOU2")
-        # Construct the full query
-        query = f"""
-            INSERT INTO {table} ({columns}) 
-            VALUES ({placeholders})
-            ON DUPLICATE KEY UPDATE {update_stmt}
-        """
-        print("IOU3")
         # Prepare the values
         values = []
         for record in data:
-            print("IOUforloop1")
             # Convert values to basic Python types that MySQL connector can handle
             row = []
             for field in fields:
@@ -283,34 +387,172 @@ class DatabaseManager:
                         pass
                 row.append(value)
             values.append(tuple(row))
-            print("Record values:", row)
-        print("IOU4")
+        
         # Execute the query
-        connection = self.get_connection()
-        cursor = connection.cursor()
-        print("IOU5")
         try:
-            print("IOU6")
-            cursor.executemany(query, values)
-            connection.commit()
-            print("IOU7")
-            return cursor.rowcount
-        except Error as e:
-            print("IOU8")
+            return self.insert_rows(table, fields, values, key_fields)
+        except self.errors as e:
             if "foreign key constraint fails" in str(e).lower():
                 # Extract the missing team ID from the data
                 team_ids = set(record.get('current_team_id') for record in data if record.get('current_team_id'))
                 error_msg = f"Error: Cannot insert players because team(s) {team_ids} do not exist in the teams table. Please ensure teams are synchronized first."
                 self.logger.error(error_msg)
-                connection.rollback()
-                raise Error(error_msg)
-            else:
-                self.logger.error(f"Error in insert_or_update: {e}")
-                connection.rollback()
-                raise
+                raise self.errors(error_msg)
+            raise
+    
+    def insert_rows(self, table, columns, rows, key_fields, connection=None):
+        """Insert or update pre-built row tuples in a table.
+        
+        Each row must hold its values in the same order as columns.
+        When a connection is given the rows are written as part of the
+        caller's transaction, which the caller commits and closes.
+        """
+        if not rows:
+            return 0
+        
+        columns = list(columns)
+        query = self.backend.upsert_sql(table, columns, key_fields)
+        
+        if connection is not None:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(query, rows)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+        
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(query, rows)
+            connection.commit()
+            return cursor.rowcount
+        except self.errors as e:
+            self.logger.error(f"Error in insert_rows for {table}: {e}")
+            connection.rollback()
+            raise
         finally:
-            print("IOU9")
             if connection.is_connected():
-                print("IOU10")
                 cursor.close()
                 connection.close()
+    
+    def count_existing(self, table, columns, rows, key_fields, connection=None):
+        """Return how many distinct keys of the rows are stored in a table already.
+        
+        The affected-row count of an upsert cannot tell inserts from
+        updates; this is counted before the write to split them. With a
+        connection the lookup runs in the caller's transaction.
+        """
+        if not rows:
+            return 0
+        columns = list(columns)
+        key_index = [columns.index(field) for field in key_fields]
+        keys = list({tuple(row[i] for i in key_index) for row in rows})
+        placeholder = f"({', '.join(['%s'] * len(key_index))})"
+        
+        own_connection = connection is None
+        if own_connection:
+            connection = self.get_connection()
+        cursor = connection.cursor()
+        try:
+            existing = 0
+            for start in range(0, len(keys), KEY_LOOKUP_SIZE):
+                chunk = keys[start:start + KEY_LOOKUP_SIZE]
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE ({', '.join(key_fields)}) IN "
+                    f"({', '.join([placeholder] * len(chunk))})",
+                    [value for key in chunk for value in key])
+                existing += cursor.fetchall()[0][0]
+            return existing
+        finally:
+            cursor.close()
+            if own_connection and connection.is_connected():
+                connection.close()
+    
+    def bulk_load(self, table, columns, rows, key_fields):
+        """Insert or update row tuples through LOAD DATA LOCAL INFILE.
+        
+        Rows are streamed to a temporary tab-separated file, loaded into a
+        temporary staging table and merged into the target with a single
+        INSERT ... SELECT ... ON DUPLICATE KEY UPDATE. Falls back to
+        insert_rows if the server does not allow local infile. Other
+        backends load the rows their own way.
+        """
+        if self.backend.name != 'mysql':
+            return self.backend.bulk_load(self, table, columns, rows, key_fields)
+        
+        columns = list(columns)
+        column_list = ', '.join(columns)
+        staging = f"{table}_staging"
+        
+        # Stream the rows to disk so the whole batch is never held as text
+        fd, path = tempfile.mkstemp(prefix=f"nhl_{table}_", suffix='.tsv')
+        row_count = 0
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as tsv:
+                for row in rows:
+                    tsv.write('\t'.join(self._tsv_value(value) for value in row))
+                    tsv.write('\n')
+                    row_count += 1
+            if not row_count:
+                return 0
+            
+            connection = self.get_connection(allow_local_infile=True)
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {staging} AS SELECT {column_list} FROM {table} WHERE 1 = 0")
+                cursor.execute(f"""
+                    LOAD DATA LOCAL INFILE %s INTO TABLE {staging}
+                    CHARACTER SET utf8mb4
+                    FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                    LINES TERMINATED BY '\\n'
+                    ({column_list})
+                """, (path,))
+                cursor.execute(self.backend.upsert_sql(
+                    table, columns, key_fields, source=f"SELECT {column_list} FROM {staging}"))
+                rows_affected = cursor.rowcount
+                connection.commit()
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+                self.logger.info(f"Bulk loaded {row_count} rows into {table}")
+                return rows_affected
+            except self.errors as e:
+                connection.rollback()
+                # 1148/3948: disabled on the server, 2068: rejected by the client
+                if e.errno in (1148, 2068, 3948):
+                    self.logger.warning(f"LOAD DATA LOCAL INFILE unavailable ({e}), falling back to batched inserts")
+                    with open(path, encoding='utf-8', newline='') as tsv:
+                        fallback_rows = [tuple(self._tsv_parse(value) for value in line.rstrip('\n').split('\t'))
+                                         for line in tsv]
+                    return self.insert_rows(table, columns, fallback_rows, key_fields)
+                self.logger.error(f"Error in bulk_load for {table}: {e}")
+                raise
+            finally:
+                if connection.is_connected():
+                    cursor.close()
+                    connection.close()
+        finally:
+            os.remove(path)
+    
+    @staticmethod
+    def _tsv_value(value):
+        """Encode a single value for a LOAD DATA file."""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, dict) and 'default' in value:
+            value = value['default']
+        return str(value).translate(TSV_ESCAPES)
+    
+    @staticmethod
+    def _tsv_parse(value):
+        """Decode a value written by _tsv_value (used by the insert fallback)."""
+        if value == '\\N':
+            return None
+        return TSV_ESCAPE_PATTERN.sub(lambda m: TSV_UNESCAPES.get(m.group(1), m.group(1)), value)
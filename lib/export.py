@@ -0,0 +1,217 @@
+"""
+Snapshot export for NHL MySQL Sync.
+Streams synced tables into per-season Parquet files for analytics.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+
+# Exported tables and the column their files are split by (None: one file)
+EXPORT_TABLES = {
+    'games': 'season',
+    'players': None,
+    'player_stats': 'season',
+    'goalie_stats': 'season',
+}
+
+# Rows fetched from the server-side cursor and converted at a time
+EXPORT_CHUNK_ROWS = 50000
+
+# Export state: what each file was written from, so unchanged seasons are skipped
+MANIFEST_FILE = 'manifest.json'
+
+# Arrow type per declared column type, matched by substring in this order
+# (e.g. 'tinyint', 'decimal(5,3)'); anything else is exported as a string
+ARROW_TYPES = (
+    ('int', 'int64'),
+    ('bool', 'bool'),
+    ('decimal', 'float64'),
+    ('double', 'float64'),
+    ('float', 'float64'),
+    ('real', 'float64'),
+    ('numeric', 'float64'),
+    ('timestamp', 'timestamp'),
+    ('datetime', 'timestamp'),
+    ('date', 'date32'),
+)
+
+
+class ExportError(Exception):
+    """Raised when snapshots cannot be written."""
+
+
+class SnapshotExporter:
+    """Writes Parquet snapshots of the synced tables.
+
+    Each table is read through an unbuffered (server-side) cursor and
+    converted in chunks of EXPORT_CHUNK_ROWS, so memory use does not grow
+    with the table. Season-scoped tables get one file per season; a file
+    is only rewritten when its row count or latest last_updated changed
+    since the previous export, as recorded in the manifest.
+    """
+
+    def __init__(self, db_manager, export_dir, chunk_rows=EXPORT_CHUNK_ROWS, compression='zstd'):
+        """Initialize the exporter writing to export_dir."""
+        self.db = db_manager
+        self.export_dir = export_dir
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.logger = logging.getLogger('nhl_sync.export')
+        self.manifest_path = os.path.join(export_dir, MANIFEST_FILE)
+
+    def export(self, tables=None, seasons=None, force=False, cancel_token=None, progress=None):
+        """Export changed tables/seasons and return the list of files written.
+
+        tables and seasons limit the export (all of them by default); force
+        rewrites files even if their source has not changed. progress is
+        called as progress('files', done, total).
+        """
+        try:
+            import pyarrow  # noqa: F401 - imported here so only exports pay for it
+        except ImportError:
+            raise ExportError("Snapshot export needs the pyarrow package (pip install -r requirements.txt)")
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        manifest = self._load_manifest()
+        seasons = {int(season) for season in seasons} if seasons else None
+
+        pending = []
+        for table in tables or EXPORT_TABLES:
+            if table not in EXPORT_TABLES:
+                raise ExportError(f"Unknown export table {table!r}, expected one of {sorted(EXPORT_TABLES)}")
+            for season, signature in self._sources(table).items():
+                if seasons is not None and season is not None and season not in seasons:
+                    continue
+                entry = manifest.get(table, {}).get(str(season))
+                if not force and entry is not None and entry['source'] == signature:
+                    continue
+                pending.append((table, season, signature))
+
+        self.logger.info(f"Exporting {len(pending)} snapshot files to {self.export_dir}")
+        written = []
+        for index, (table, season, signature) in enumerate(pending):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if progress is not None:
+                progress('files', index, len(pending))
+            path, rows = self._write(table, season)
+            manifest.setdefault(table, {})[str(season)] = {
+                'file': os.path.basename(path),
+                'rows': rows,
+                'source': signature,
+                'exported_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            # Saved after every file so an interrupted export resumes where it stopped
+            self._save_manifest(manifest)
+            written.append(path)
+        if progress is not None:
+            progress('files', len(pending), len(pending))
+        self.logger.info(f"Snapshot export completed: {len(written)} files written")
+        return written
+
+    def _sources(self, table):
+        """Return {season (None for unsplit tables): [row count, latest last_updated]}."""
+        season_column = EXPORT_TABLES[table]
+        if season_column is None:
+            rows = self.db.execute_query(
+                f"SELECT NULL AS season, COUNT(*) AS row_count, MAX(last_updated) AS last_updated FROM {table}",
+                fetch=True)
+        else:
+            rows = self.db.execute_query(f"""
+                SELECT {season_column} AS season, COUNT(*) AS row_count, MAX(last_updated) AS last_updated
+                FROM {table} GROUP BY {season_column}
+            """, fetch=True)
+        # SQLite returns aggregates of timestamps as text
+        return {
+            row['season']: [row['row_count'], row['last_updated'].isoformat()
+                            if isinstance(row['last_updated'], datetime) else row['last_updated']]
+            for row in rows or [] if row['row_count']
+        }
+
+    def _write(self, table, season):
+        """Stream one table (or one season of it) into a Parquet file; returns (path, rows)."""
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        name = table if season is None else f"{table}_{season}"
+        path = os.path.join(self.export_dir, f"{name}.parquet")
+        temp_path = f"{path}.tmp"
+        query = f"SELECT * FROM {table}"
+        params = ()
+        if season is not None:
+            query += f" WHERE {EXPORT_TABLES[table]} = %s"
+            params = (season,)
+
+        column_types = self.db.column_types(table)
+        rows_written = 0
+        writer = None
+        connection = self.db.get_connection()
+        # The default cursor is unbuffered: rows stay on the MySQL server until fetched
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, params)
+            schema = self._arrow_schema(pa, cursor.description, column_types)
+            columns = schema.names
+            writer = pq.ParquetWriter(temp_path, schema, compression=self.compression)
+            while True:
+                rows = cursor.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                frame = pd.DataFrame.from_records(rows, columns=columns)
+                for field in schema:
+                    if pa.types.is_floating(field.type):
+                        # DECIMAL columns arrive as Decimal objects
+                        frame[field.name] = frame[field.name].astype('float64')
+                writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+                rows_written += len(rows)
+            writer.close()
+            writer = None
+            os.replace(temp_path, path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            cursor.close()
+            connection.close()
+        self.logger.info(f"Exported {rows_written} rows of {name} to {path}")
+        return path, rows_written
+
+    @staticmethod
+    def _arrow_schema(pa, description, column_types):
+        """Build the Arrow schema of a result set from its columns' declared types."""
+        arrow_types = {
+            'int64': pa.int64(),
+            'bool': pa.bool_(),
+            'float64': pa.float64(),
+            'timestamp': pa.timestamp('us'),
+            'date32': pa.date32(),
+        }
+        fields = []
+        for column in description:
+            declared = column_types.get(column[0], '')
+            arrow_type = next((arrow_types[name] for pattern, name in ARROW_TYPES if pattern in declared),
+                              pa.string())
+            fields.append(pa.field(column[0], arrow_type))
+        return pa.schema(fields)
+
+    def _load_manifest(self):
+        """Return the manifest of the previous export (empty if there is none)."""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read export manifest {self.manifest_path}, exporting everything: {e}")
+            return {}
+
+    def _save_manifest(self, manifest):
+        """Write the manifest atomically."""
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
@@ -0,0 +1,92 @@
+"""
+HTTP validator cache for NHL MySQL Sync.
+Remembers ETag / Last-Modified / content hash per URL for conditional requests.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+class ValidatorCache:
+    """Per-URL validators and last body, persisted to a JSON file.
+
+    Validators of a fresh response are staged first and only committed
+    (and saved) once the caller has written the payload to the database.
+    Conditional requests always use committed validators, so "unchanged"
+    means "identical to what was last stored", even after a failed write.
+    """
+
+    def __init__(self, path=None):
+        """Initialize the cache, loading committed validators from path if it exists."""
+        self.path = path
+        self.logger = logging.getLogger('nhl_sync.http_cache')
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Could not load validator cache {path}, starting empty: {e}")
+
+    def headers(self, url):
+        """Return the conditional request headers for url."""
+        with self._lock:
+            entry = self._entries.get(url)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body(self, url):
+        """Return the committed body of url (for a 304 response), or None."""
+        with self._lock:
+            entry = self._entries.get(url)
+        return entry['body'].encode('utf-8') if entry else None
+
+    def stage(self, url, body, etag=None, last_modified=None):
+        """Stage a fresh response; returns True if its body matches the committed one."""
+        content_hash = self.content_hash(body)
+        with self._lock:
+            entry = self._entries.get(url)
+            self._pending[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'hash': content_hash,
+                'body': body.decode('utf-8'),
+            }
+        return entry is not None and entry['hash'] == content_hash
+
+    def commit(self, prefix=''):
+        """Commit staged validators of URLs starting with prefix and save the file."""
+        with self._lock:
+            urls = [url for url in self._pending if url.startswith(prefix)]
+            for url in urls:
+                self._entries[url] = self._pending.pop(url)
+            entries = dict(self._entries)
+        if urls and self.path:
+            self._save(entries)
+
+    def _save(self, entries):
+        """Write the committed validators atomically."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not save validator cache {self.path}: {e}")
+
+    @staticmethod
+    def content_hash(body):
+        """Return the SHA-1 of a response body."""
+        return hashlib.sha1(body).hexdigest()
@@ -0,0 +1,316 @@
+"""
+Job queue for NHL MySQL Sync.
+SQLite-backed queue shared by the web interface and the sync worker processes.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from lib.cache import keys_for_rows
+
+# Statuses of a job that has not finished yet
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Seconds published cache invalidations are kept for the web process to pick up
+INVALIDATION_RETENTION = 3600
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        params TEXT NOT NULL DEFAULT '{}',
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress INTEGER NOT NULL DEFAULT 0,
+        current_task TEXT,
+        stats TEXT NOT NULL DEFAULT '{}',
+        error TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat REAL
+    );
+    -- Only one unfinished job per type
+    CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_type
+        ON jobs (job_type) WHERE status IN ('queued', 'running');
+    CREATE TABLE IF NOT EXISTS job_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        level TEXT NOT NULL,
+        message TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id);
+    -- Query cache keys made stale by sync writes, dropped by the web process
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cache_key TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS cache_invalidations_created ON cache_invalidations (created_at);
+"""
+
+# Changes to existing queue files, applied once each in order: (version, statement);
+# the version reached is kept in the file's user_version
+MIGRATIONS = [
+    # Jobs queued by older versions carried the database credentials
+    (1, "UPDATE jobs SET params = json_remove(params, '$.db_config', '$.api_url') "
+        "WHERE params LIKE '%db_config%' OR params LIKE '%api_url%'"),
+]
+
+
+class JobConflict(Exception):
+    """Raised when a job of the same type is already queued or running."""
+
+
+class JobQueue:
+    """Persistent sync job queue.
+
+    The web process enqueues jobs and reads their state; worker processes
+    claim queued jobs, report progress and log lines, and finish them.
+    Every sync process also publishes the query cache keys its writes made
+    stale, which the web process drops from its cache.
+    Every call opens its own short-lived connection, so one JobQueue can
+    be used from several threads and every process sees the same queue.
+    """
+
+    def __init__(self, path, timeout=30):
+        """Initialize the queue stored in the SQLite file at path."""
+        self.path = path
+        self.timeout = timeout
+        self.logger = logging.getLogger('nhl_sync.jobs')
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            # WAL lets the web process read while a worker writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._migrate(connection)
+
+    def _migrate(self, connection):
+        """Apply the migrations the queue file has not had yet."""
+        if connection.execute("PRAGMA user_version").fetchone()[0] >= MIGRATIONS[-1][0]:
+            return
+        # The write lock keeps two processes from migrating at once
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            for migration, statement in MIGRATIONS:
+                if migration > version:
+                    self.logger.info(f"Applying job queue migration {migration}")
+                    connection.execute(statement)
+                    connection.execute(f"PRAGMA user_version = {migration}")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _connect(self):
+        """Open a connection; autocommit mode, transactions are explicit."""
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return _Closing(connection)
+
+    def enqueue(self, job_type, params=None):
+        """Queue a job and return its id. Raises JobConflict if one of the type is active."""
+        try:
+            with self._connect() as connection:
+                cursor = connection.execute(
+                    "INSERT INTO jobs (job_type, params, created_at) VALUES (?, ?, ?)",
+                    (job_type, json.dumps(params or {}), time.time()))
+                job_id = cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise JobConflict(f"A {job_type} sync is already queued or running")
+        self.logger.info(f"Queued {job_type} job {job_id}")
+        return job_id
+
+    def claim(self, worker):
+        """Atomically take the oldest queued job. Returns the job dict or None."""
+        with self._connect() as connection:
+            # BEGIN IMMEDIATE takes the write lock, so two workers cannot claim the same job
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                now = time.time()
+                connection.execute("""
+                    UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat = ?
+                    WHERE id = ?
+                """, (worker, now, now, row['id']))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        return self.get(row['id'])
+
+    def update(self, job_id, progress=None, current_task=None, stats=None):
+        """Record a running job's progress; also refreshes its heartbeat."""
+        assignments = ['heartbeat = ?']
+        params = [time.time()]
+        if progress is not None:
+            assignments.append('progress = ?')
+            params.append(int(progress))
+        if current_task is not None:
+            assignments.append('current_task = ?')
+            params.append(current_task)
+        if stats is not None:
+            assignments.append('stats = ?')
+            params.append(json.dumps(stats))
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?", (*params, job_id))
+
+    def log(self, job_id, level, message):
+        """Append a log line to a job."""
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO job_events (job_id, created_at, level, message) VALUES (?, ?, ?, ?)",
+                (job_id, time.time(), level, message))
+
+    def log_many(self, job_id, entries):
+        """Append (created_at, level, message) log lines to a job in one transaction."""
+        with self._connect() as connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO job_events (job_id, created_at, level, message) VALUES (?, ?, ?, ?)",
+                [(job_id, created_at, level, message) for created_at, level, message in entries])
+            connection.execute("COMMIT")
+
+    def finish(self, job_id, status, error=None):
+        """Mark a job as done, failed or cancelled."""
+        with self._connect() as connection:
+            connection.execute("""
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?,
+                    progress = CASE WHEN ? = 'done' THEN 100 ELSE progress END
+                WHERE id = ?
+            """, (status, error, time.time(), status, job_id))
+        self.logger.info(f"Job {job_id} {status}")
+
+    def request_cancel(self, job_id=None):
+        """Ask a job (or every unfinished job) to stop. Queued jobs are cancelled at once.
+
+        Returns the number of jobs affected.
+        """
+        where = "id = ? AND " if job_id is not None else ""
+        params = (job_id,) if job_id is not None else ()
+        now = time.time()
+        with self._connect() as connection:
+            cancelled = connection.execute(
+                f"UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE {where}status = 'queued'",
+                (now, *params)).rowcount
+            flagged = connection.execute(
+                f"UPDATE jobs SET cancel_requested = 1 WHERE {where}status = 'running'",
+                params).rowcount
+        return cancelled + flagged
+
+    def cancel_requested(self, job_id):
+        """Return True once a cancel has been requested for a job."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def get(self, job_id):
+        """Return a job as a dict, or None."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row)
+
+    def latest(self):
+        """Return the running job if there is one, otherwise the most recent job."""
+        with self._connect() as connection:
+            row = connection.execute("""
+                SELECT * FROM jobs
+                ORDER BY status = 'running' DESC, id DESC
+                LIMIT 1
+            """).fetchone()
+        return self._job(row)
+
+    def last_finished_at(self):
+        """Return when the last successful job finished (epoch seconds), or None."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT MAX(finished_at) AS finished_at FROM jobs WHERE status = 'done'").fetchone()
+        return row['finished_at']
+
+    def events(self, job_id, after_id=0, limit=500):
+        """Return a job's log lines with an id greater than after_id."""
+        with self._connect() as connection:
+            rows = connection.execute("""
+                SELECT id, level, message, created_at FROM job_events
+                WHERE job_id = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (job_id, after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def fail_stale(self, max_age):
+        """Fail running jobs whose worker stopped sending heartbeats (e.g. it crashed)."""
+        with self._connect() as connection:
+            count = connection.execute("""
+                UPDATE jobs SET status = 'failed', error = 'Worker stopped responding', finished_at = ?
+                WHERE status = 'running' AND heartbeat < ?
+            """, (time.time(), time.time() - max_age)).rowcount
+        if count:
+            self.logger.warning(f"Marked {count} stale jobs as failed")
+        return count
+
+    def invalidate_rows(self, table, columns, rows):
+        """Publish the query cache keys made stale by a write. Usable as a SyncManager write listener."""
+        self.publish_invalidations(keys_for_rows(table, columns, rows))
+
+    def publish_invalidations(self, keys):
+        """Record cache keys for the web process to drop, pruning those older than INVALIDATION_RETENTION."""
+        keys = sorted(keys)
+        if not keys:
+            return
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN")
+            connection.execute("DELETE FROM cache_invalidations WHERE created_at < ?",
+                               (now - INVALIDATION_RETENTION,))
+            connection.executemany("INSERT INTO cache_invalidations (cache_key, created_at) VALUES (?, ?)",
+                                   [(key, now) for key in keys])
+            connection.execute("COMMIT")
+
+    def invalidations(self, after_id=0, limit=5000):
+        """Return the published cache invalidations with an id greater than after_id."""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, cache_key FROM cache_invalidations WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_invalidation_id(self):
+        """Return the id of the newest published cache invalidation (0 if there is none)."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT MAX(id) AS id FROM cache_invalidations").fetchone()
+        return row['id'] or 0
+
+    @staticmethod
+    def _job(row):
+        """Decode a jobs row."""
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['stats'] = json.loads(job['stats'])
+        return job
+
+
+class _Closing:
+    """Context manager that closes a sqlite3 connection on exit."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.close()
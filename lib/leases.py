@@ -0,0 +1,312 @@
+"""
+Lease-based work partitioning for NHL MySQL Sync.
+Splits a sync into units that any number of worker processes claim through the sync_leases table.
+"""
+
+import logging
+import threading
+import time
+
+from lib.cancellation import CancellationToken, SyncCancelled
+
+# Seconds a claimed unit stays leased without being renewed
+LEASE_SECONDS = 300
+
+# Attempts (failed or abandoned by a dead worker) after which a unit is given up
+MAX_ATTEMPTS = 3
+
+# Games per stats or play-by-play unit
+GAMES_PER_UNIT = 100
+
+# Claimable units read per claim attempt; the rest are tried on the next one
+CLAIM_CANDIDATES = 10
+
+# Claim order of the unit kinds, lowest first
+UNIT_PRIORITIES = {'teams': 0, 'roster': 1, 'games': 1, 'stats': 2, 'events': 3}
+
+# Columns describing a unit
+UNIT_COLUMNS = ('unit', 'kind', 'season', 'first_id', 'last_id', 'priority')
+
+# A unit that can be claimed: never claimed, released, or held under an expired lease
+CLAIMABLE = "(status = 'pending' OR (status = 'leased' AND expires_at < %s))"
+
+
+class LeaseLost(Exception):
+    """Raised when a unit's lease has expired and may be held by another worker."""
+
+
+def work_unit(kind, season=None, first_id=None, last_id=None):
+    """Return the description of one unit, named e.g. 'stats:20222023:2022020001-2022020100'."""
+    parts = [kind]
+    if season is not None:
+        parts.append(str(season))
+    if first_id is not None:
+        parts.append(str(first_id) if last_id in (None, first_id) else f"{first_id}-{last_id}")
+    return {
+        'unit': ':'.join(parts),
+        'kind': kind,
+        'season': int(season) if season is not None else None,
+        'first_id': first_id,
+        'last_id': last_id if last_id is not None else first_id,
+        'priority': UNIT_PRIORITIES[kind],
+    }
+
+
+class LeaseBoard:
+    """The work units of one plan and the leases held on them.
+
+    Units are added idempotently, so every worker can seed the same plan.
+    claim() takes the first claimable unit with a compare-and-set update,
+    so two workers never hold the same unit; a unit whose worker died or
+    hung becomes claimable again once its lease expires. The holder
+    renews the lease while it works, then completes or releases the unit.
+    Lease times are the workers' wall clocks, which are assumed to be
+    roughly in sync (NTP).
+    """
+
+    def __init__(self, db_manager, plan_id, owner, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """Initialize the board of plan_id for the worker named owner."""
+        self.db = db_manager
+        self.plan_id = plan_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger('nhl_sync.leases')
+
+    def add(self, units):
+        """Add units (see work_unit) to the plan; units it already has are left as they are."""
+        if not units:
+            return
+        query = self.db.backend.insert_ignore_sql('sync_leases', ('plan_id',) + UNIT_COLUMNS)
+        self.db.execute_transaction([
+            (query, (self.plan_id, *(unit[column] for column in UNIT_COLUMNS))) for unit in units
+        ])
+
+    def claim(self):
+        """Lease the next claimable unit to this worker; returns its row, or None if there is none."""
+        now = time.time()
+        candidates = self.db.execute_query(f"""
+            SELECT unit, kind, season, first_id, last_id, attempts FROM sync_leases
+            WHERE plan_id = %s AND {CLAIMABLE}
+            ORDER BY priority, unit
+            LIMIT %s
+        """, (self.plan_id, now, CLAIM_CANDIDATES), fetch=True)
+        for unit in candidates or []:
+            if unit['attempts'] >= self.max_attempts:
+                # Its last holder died with the lease
+                self._give_up(unit, now)
+                continue
+            claimed = self.db.execute_query(f"""
+                UPDATE sync_leases SET status = 'leased', owner = %s, expires_at = %s, attempts = attempts + 1
+                WHERE plan_id = %s AND unit = %s AND {CLAIMABLE}
+            """, (self.owner, now + self.lease_seconds, self.plan_id, unit['unit'], now))
+            if claimed == 1:
+                unit['attempts'] += 1
+                return unit
+        return None
+
+    def renew(self, unit):
+        """Extend the lease on a unit; raises LeaseLost if this worker no longer holds it."""
+        renewed = self.db.execute_query("""
+            UPDATE sync_leases SET expires_at = %s
+            WHERE plan_id = %s AND unit = %s AND owner = %s AND status = 'leased'
+        """, (time.time() + self.lease_seconds, self.plan_id, unit['unit'], self.owner))
+        if renewed != 1:
+            raise LeaseLost(f"Lease on {unit['unit']} has expired")
+
+    def complete(self, unit):
+        """Mark a held unit done; returns False if the lease had been lost in the meantime."""
+        completed = self.db.execute_query("""
+            UPDATE sync_leases SET status = 'done', finished_at = %s, expires_at = NULL, error = NULL
+            WHERE plan_id = %s AND unit = %s AND owner = %s AND status = 'leased'
+        """, (time.time(), self.plan_id, unit['unit'], self.owner))
+        return completed == 1
+
+    def release(self, unit, error=None):
+        """Give a held unit back to the plan.
+
+        With an error the attempt counts, and the unit is marked failed once
+        it has used max_attempts; without one (e.g. the worker is stopping)
+        the attempt is returned.
+        """
+        status = 'failed' if error and unit['attempts'] >= self.max_attempts else 'pending'
+        self.db.execute_query("""
+            UPDATE sync_leases SET status = %s, attempts = attempts - %s, owner = NULL, expires_at = NULL, error = %s
+            WHERE plan_id = %s AND unit = %s AND owner = %s AND status = 'leased'
+        """, (status, 0 if error else 1, error, self.plan_id, unit['unit'], self.owner))
+
+    def counts(self):
+        """Return {status: number of units} of the plan."""
+        rows = self.db.execute_query(
+            "SELECT status, COUNT(*) AS units FROM sync_leases WHERE plan_id = %s GROUP BY status",
+            (self.plan_id,), fetch=True)
+        return {row['status']: row['units'] for row in rows or []}
+
+    def _give_up(self, unit, now):
+        """Mark a unit failed after its last lease expired."""
+        self.logger.error(f"Giving up on {unit['unit']} after {unit['attempts']} attempts")
+        self.db.execute_query(f"""
+            UPDATE sync_leases SET status = 'failed', owner = NULL, expires_at = NULL,
+                error = COALESCE(error, 'lease expired')
+            WHERE plan_id = %s AND unit = %s AND {CLAIMABLE}
+        """, (self.plan_id, unit['unit'], now))
+
+
+class ShardedSync:
+    """Works through the units of a plan together with the other workers on it.
+
+    The units are the teams, one roster per team (the players sync), one
+    schedule per season (the games sync) and ranges of games_per_unit game
+    ids per season for stats and play-by-play. Game ranges come from the
+    stored schedule, so the worker completing a season's games unit adds
+    its stats and events units; the roster units likewise follow the teams
+    unit. Steps left out of the plan are assumed to have been synced
+    before, and their follow-up units are added right away.
+    """
+
+    def __init__(self, sync_manager, board, seasons, data_type='all', games_per_unit=GAMES_PER_UNIT):
+        """Initialize the sync of data_type ('teams', 'players', 'games', 'stats', 'events' or 'all')."""
+        self.sync = sync_manager
+        self.board = board
+        self.seasons = [str(season) for season in seasons]
+        self.games_per_unit = games_per_unit
+        self.include_teams = data_type in ('teams', 'all')
+        self.include_players = data_type in ('players', 'all')
+        self.include_games = data_type in ('games', 'all')
+        self.include_stats = data_type in ('stats', 'all')
+        self.include_events = data_type == 'events'
+        self.logger = logging.getLogger('nhl_sync.leases')
+
+    def seed(self):
+        """Add the plan's initial units; safe to call from every worker."""
+        units = []
+        if self.include_teams:
+            units.append(work_unit('teams'))
+        elif self.include_players:
+            units.extend(self._roster_units())
+        for season in self.seasons:
+            if self.include_games:
+                units.append(work_unit('games', season))
+            else:
+                units.extend(self._range_units(season))
+        self.board.add(units)
+
+    def run(self, cancel_token=None, poll_interval=5.0):
+        """Claim and run units until none are pending or leased; returns the plan's unit counts."""
+        self.logger.info(f"Worker {self.board.owner} joining plan {self.board.plan_id}")
+        ran = 0
+        while cancel_token is None or not cancel_token.cancelled:
+            unit = self.board.claim()
+            if unit is None:
+                counts = self.board.counts()
+                if not counts.get('pending') and not counts.get('leased'):
+                    break
+                # Other workers hold the rest, and may still add follow-up units
+                time.sleep(poll_interval)
+                continue
+            self._run_unit(unit, cancel_token)
+            ran += 1
+        counts = self.board.counts()
+        self.logger.info(f"Worker {self.board.owner} ran {ran} units of plan {self.board.plan_id}: "
+                         + ', '.join(f"{units} {status}" for status, units in sorted(counts.items())))
+        if counts.get('failed'):
+            self.logger.error(f"{counts['failed']} units of plan {self.board.plan_id} failed; "
+                              f"see the error column of sync_leases")
+        return counts
+
+    def _run_unit(self, unit, cancel_token):
+        """Run one claimed unit while a thread keeps its lease fresh."""
+        self.logger.info(f"Running {unit['unit']} (attempt {unit['attempts']})")
+        token = CancellationToken()
+        lost = threading.Event()
+        done = threading.Event()
+        keeper = threading.Thread(target=self._keep_lease, args=(unit, token, cancel_token, lost, done),
+                                  name='nhl-lease', daemon=True)
+        keeper.start()
+        try:
+            try:
+                self._execute(unit, token)
+                # Added before completing, so no worker sees the plan finished in between
+                self.board.add(self._follow_ups(unit))
+            finally:
+                done.set()
+                keeper.join()
+        except SyncCancelled:
+            if lost.is_set():
+                self.logger.warning(f"Abandoned {unit['unit']}: its lease expired")
+            else:
+                self.board.release(unit)
+            return
+        except Exception as e:
+            self.logger.error(f"Unit {unit['unit']} failed: {e}", exc_info=True)
+            self.board.release(unit, str(e))
+            return
+        if not self.board.complete(unit):
+            self.logger.warning(f"Lease on {unit['unit']} expired before it completed; it may run again")
+
+    def _keep_lease(self, unit, token, cancel_token, lost, done):
+        """Renew the lease on unit until done is set, cancelling token if it is lost or cancel_token fires."""
+        renew_at = time.monotonic() + self.board.lease_seconds / 3
+        while not done.wait(1.0):
+            if cancel_token is not None and cancel_token.cancelled:
+                token.cancel()
+            if time.monotonic() < renew_at:
+                continue
+            try:
+                self.board.renew(unit)
+                renew_at = time.monotonic() + self.board.lease_seconds / 3
+            except LeaseLost as e:
+                self.logger.warning(f"{e}, stopping it")
+                lost.set()
+                token.cancel()
+                return
+            except Exception as e:
+                # Retried every second until the lease expires
+                self.logger.warning(f"Could not renew the lease on {unit['unit']}: {e}")
+
+    def _execute(self, unit, token):
+        """Run the sync a unit stands for."""
+        kind = unit['kind']
+        season = str(unit['season']) if unit['season'] is not None else None
+        if kind == 'teams':
+            self.sync.sync_teams(cancel_token=token)
+        elif kind == 'roster':
+            self.sync.sync_players(cancel_token=token, team_ids=[unit['first_id']])
+        elif kind == 'games':
+            self.sync.sync_games(season, cancel_token=token)
+        elif kind == 'stats':
+            self.sync.sync_stats(season, cancel_token=token, strategy='boxscore',
+                                 game_range=(unit['first_id'], unit['last_id']))
+        elif kind == 'events':
+            self.sync.sync_events(season, cancel_token=token, game_range=(unit['first_id'], unit['last_id']))
+        else:
+            raise ValueError(f"Unknown unit kind {kind!r}")
+
+    def _follow_ups(self, unit):
+        """Return the units that can be planned once unit is done."""
+        if unit['kind'] == 'teams' and self.include_players:
+            return self._roster_units()
+        if unit['kind'] == 'games':
+            return self._range_units(str(unit['season']))
+        return []
+
+    def _roster_units(self):
+        """Return one unit per team of the current standings."""
+        teams = self.sync.api.get_teams()
+        return [work_unit('roster', first_id=team['id'])
+                for team in teams if isinstance(team, dict) and team.get('id') is not None]
+
+    def _range_units(self, season):
+        """Return the stats and events units of a season's stored games."""
+        kinds = [kind for kind, included in (('stats', self.include_stats), ('events', self.include_events))
+                 if included]
+        if not kinds:
+            return []
+        rows = self.sync.db.execute_query("SELECT id FROM games WHERE season = %s ORDER BY id",
+                                          (season,), fetch=True)
+        game_ids = [row['id'] for row in rows or []]
+        units = []
+        for start in range(0, len(game_ids), self.games_per_unit):
+            chunk = game_ids[start:start + self.games_per_unit]
+            units.extend(work_unit(kind, season, chunk[0], chunk[-1]) for kind in kinds)
+        return units
@@ -0,0 +1,162 @@
+"""
+Logging setup for NHL MySQL Sync.
+Queue-based logging pipeline with structured JSON output, sampling and per-module levels.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# Listener of the current process, replaced when setup_logging is called again
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        # Structured fields passed as logger.info(..., extra={...})
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in every N records of high-volume, per-item messages.
+
+    Only records logged with extra={'sample': '<key>'} are sampled, and
+    warnings and errors always pass. rates maps a sample key to N; keys
+    without an entry use default_rate.
+    """
+
+    def __init__(self, rates=None, default_rate=1):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(key, self.default_rate)
+        if rate <= 1:
+            return True
+        with self._lock:
+            count = self._counts[key]
+            self._counts[key] = count + 1
+        return count % rate == 0
+
+
+def parse_levels(spec):
+    """Parse 'nhl_sync.api=WARNING,nhl_sync.sync=DEBUG' into a {logger: level} dict."""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_rates(spec):
+    """Parse 'schedule_date=10,game=50' into a {sample key: N} dict."""
+    return {name: int(rate) for name, rate in parse_levels(spec).items()}
+
+
+def process_log_file(log_file, name):
+    """Return a per-process variant of log_file, e.g. nhl_sync.worker-1.log.
+
+    Rotating file handlers cannot share a file between processes, so each
+    process that logs to disk gets its own file.
+    """
+    if not log_file:
+        return log_file
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{name}{ext or '.log'}"
+
+
+def setup_logging(level='INFO', log_file=None, json_console=False, module_levels=None,
+                  sample_rates=None, default_sample_rate=1, max_bytes=10485760, backup_count=5):
+    """Configure the 'nhl_sync' loggers for this process and return the root one.
+
+    Records are put on an in-memory queue by a QueueHandler and written by
+    a QueueListener thread, so logging never blocks the caller on I/O.
+    The console gets text (or JSON with json_console); log_file, if given,
+    gets JSON lines and is rotated at max_bytes. Calling it again (for
+    example in a forked worker process) replaces the previous setup.
+    """
+    global _listener, _listener_pid
+
+    logger = logging.getLogger('nhl_sync')
+    _stop_listener()
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if json_console else logging.Formatter(TEXT_FORMAT))
+    handlers = [console]
+    if log_file:
+        directory = os.path.dirname(os.path.abspath(log_file))
+        os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates, default_sample_rate))
+    logger.addHandler(queue_handler)
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    # Records stop here; the root logger would print them a second time
+    logger.propagate = False
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(getattr(logging, str(module_level).upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if _listener_pid is None:
+        atexit.register(_stop_listener)
+    _listener_pid = os.getpid()
+    return logger
+
+
+def _stop_listener():
+    """Drain the queue and close the handlers of this process's listener.
+
+    A listener inherited through fork has no running thread in this
+    process and is simply dropped.
+    """
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
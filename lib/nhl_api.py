@@ -3,29 +3,92 @@ NHL API client for NHL MySQL Sync.
 Handles fetching data from the NHL API using the new api-web.nhle.com/v1 endpoint.
 """
 
+import json
 import logging
+import threading
 import requests
-from datetime import datetime
+from datetime import date, datetime, timedelta
+
+from lib.teams import SEED_TEAMS, TeamRegistry
+from lib.transform import play_by_play_rows
+
+# Bytes read from a response between cancellation checks
+STREAM_CHUNK_SIZE = 65536
+
+# Endpoints that change a few times a day at most; fetched with conditional requests
+CONDITIONAL_ENDPOINTS = ('standings/', 'roster/')
+
+# NHL game types (gameType in the API)
+PRESEASON = 1
+REGULAR_SEASON = 2
+PLAYOFFS = 3
+GAME_TYPES = {PRESEASON: 'preseason', REGULAR_SEASON: 'regular', PLAYOFFS: 'playoffs'}
+
+# Values games.game_type may hold per type; rows written by older versions used letters
+GAME_TYPE_VALUES = {PRESEASON: ('1', 'PR'), REGULAR_SEASON: ('2', 'R'), PLAYOFFS: ('3', 'P')}
+
+# Usual window of each game type as ((year offset, month, day), (year offset, month, day))
+# from the season's first year; narrowed by the dates the schedule endpoint reports
+GAME_TYPE_WINDOWS = {
+    PRESEASON: ((0, 9, 1), (0, 10, 15)),
+    REGULAR_SEASON: ((0, 10, 1), (1, 4, 30)),
+    PLAYOFFS: ((1, 4, 1), (1, 6, 30)),
+}
+
+
+def parse_game_types(spec):
+    """Parse '2,3' or 'regular,playoffs' into a list of game type codes (None for all)."""
+    if not spec:
+        return None
+    codes = {name: code for code, name in GAME_TYPES.items()}
+    game_types = []
+    for item in str(spec).split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        code = codes.get(item) or (int(item) if item.isdigit() else None)
+        if code not in GAME_TYPES:
+            raise ValueError(f"Unknown game type {item!r}, expected one of {sorted(GAME_TYPES.values())}")
+        game_types.append(code)
+    return sorted(set(game_types)) or None
+
+
+def game_type_values(game_types):
+    """Return the games.game_type values matching game type codes."""
+    return [value for game_type in game_types for value in GAME_TYPE_VALUES[game_type]]
 
 class NHLApiClient:
     """Client for interacting with the NHL API."""
     
-    def __init__(self, base_url):
-        """Initialize the NHL API client with the base URL."""
+    def __init__(self, base_url, validator_cache=None, team_registry=None):
+        """Initialize the NHL API client with the base URL.
+        
+        validator_cache is an optional lib.http_cache.ValidatorCache; with
+        one, standings and rosters are fetched with If-None-Match /
+        If-Modified-Since and unchanged payloads are reported as such.
+        team_registry is the lib.teams.TeamRegistry that assigns team ids
+        (one without a database, i.e. the built-in list, by default).
+        """
         self.base_url = base_url
+        self.validators = validator_cache
+        self.teams = team_registry or TeamRegistry()
         self.logger = logging.getLogger('nhl_sync.api')
-        # Ensure logger is configured
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
         
         # Map team IDs to team codes for the new API
         self.team_id_to_code = {}
         self.team_code_to_id = {}
         self._initialize_team_mappings()
+        
+        # CancellationToken of the running sync, checked while responses stream in
+        self.cancel_token = None
+        
+        # URL -> whether its last conditional fetch matched the committed payload
+        self._unchanged = {}
+        
+        # Totals for sync run history; requests may come from several season threads
+        self.requests_made = 0
+        self.bytes_downloaded = 0
+        self._counter_lock = threading.Lock()
     
     def _initialize_team_mappings(self):
         """Initialize team ID to team code mappings."""
@@ -35,12 +98,10 @@ class NHLApiClient:
     def _make_request(self, endpoint, params=None):
         """Make a request to the NHL API."""
         url = f"{self.base_url}/{endpoint}"
+        conditional = self.validators is not None and params is None and endpoint.startswith(CONDITIONAL_ENDPOINTS)
         try:
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
             # Get the JSON response
-            json_data = response.json()
+            json_data = json.loads(self._fetch(url, params, conditional=conditional))
             
             # Log the response for debugging
             self.logger.debug(f"API Response from {url}: {json_data}")
@@ -66,7 +127,7 @@ class NHLApiClient:
             
             return json_data
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             self.logger.error(f"Error making request to {url}: {e}")
             # Return empty data structure instead of raising exception
             if 'standings' in endpoint:
@@ -84,12 +145,88 @@ class NHLApiClient:
             else:
                 return {}
     
+    def _make_raw_request(self, endpoint, params=None):
+        """Make a request to the NHL API and return the undecoded response body."""
+        url = f"{self.base_url}/{endpoint}"
+        try:
+            return self._fetch(url, params)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Error making request to {url}: {e}")
+            return None
+    
+    def _fetch(self, url, params=None, conditional=False):
+        """GET a URL and return the body.
+        
+        The body is streamed in chunks so a cancelled sync abandons the
+        download right away instead of waiting for the whole payload.
+        A conditional fetch sends the committed validators of the URL; on
+        304 the committed body is returned, and either way the URL is
+        recorded as unchanged when the payload matches what was committed.
+        """
+        token = self.cancel_token
+        if token is not None:
+            token.raise_if_cancelled()
+        
+        headers = None
+        if conditional:
+            self._unchanged[url] = False
+            headers = self.validators.headers(url)
+        
+        with requests.get(url, params=params, headers=headers, timeout=30, stream=True) as response:
+            self._count_request(0)
+            if conditional and response.status_code == 304:
+                body = self.validators.body(url)
+                if body is not None:
+                    self.logger.debug(f"Not modified: {url}")
+                    self._unchanged[url] = True
+                    return body
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if token is not None:
+                    token.raise_if_cancelled()
+                chunks.append(chunk)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        
+        body = b''.join(chunks)
+        self._count_request(len(body), requests_made=0)
+        if conditional:
+            self._unchanged[url] = self.validators.stage(url, body, etag, last_modified)
+        return body
+    
+    def _count_request(self, body_bytes, requests_made=1):
+        """Add to the request and byte totals."""
+        with self._counter_lock:
+            self.requests_made += requests_made
+            self.bytes_downloaded += body_bytes
+    
+    def teams_unchanged(self):
+        """True if the last get_teams() payload is the one last committed (304 or same hash)."""
+        return self._unchanged.get(f"{self.base_url}/standings/now", False)
+    
+    def roster_unchanged(self, team_id):
+        """True if the last get_team_roster(team_id) payload is the one last committed."""
+        team_code = self.team_id_to_code.get(team_id)
+        return self._unchanged.get(f"{self.base_url}/roster/{team_code}/current", False)
+    
+    def commit_validators(self, endpoint_prefix=''):
+        """Commit the validators of fetched payloads once they have been stored.
+        
+        endpoint_prefix limits the commit to e.g. 'standings/' or 'roster/',
+        so a failed write of one kind does not mark the other as stored.
+        """
+        if self.validators is not None:
+            self.validators.commit(f"{self.base_url}/{endpoint_prefix}")
+    
     def get_teams(self):
         """Get all NHL teams."""
         self.logger.info("Fetching teams from NHL API")
         # The new API doesn't have a direct endpoint for all teams
         # We'll use the standings endpoint which includes all teams
         data = self._make_request('standings/now')
+        # Pick up teams registered by other processes
+        self.teams.load()
         
         # Debug log the response structure
         self.logger.debug(f"API Response structure: {type(data)}")
@@ -110,14 +247,9 @@ class NHLApiClient:
                     team_abbrev = division.get('teamAbbrev', {}).get('default', '')
                     team_id = None
                     
-                    # Try to extract team ID from various fields
-                    if 'id' in division:
-                        team_id = division.get('id')
-                    
-                    # If we couldn't find an ID, generate one based on the team abbreviation
-                    if not team_id and team_abbrev:
-                        # Use a simple hash of the team abbreviation as the ID
-                        team_id = hash(team_abbrev) % 1000 + 1000  # Ensure positive and unique
+                    # Standings carry no team ids; the registry keeps them stable across runs
+                    if team_abbrev:
+                        team_id = self.teams.team_id(team_abbrev, team_name, division.get('id'))
                     
                     if team_id and team_abbrev and team_name:
                         # Map team ID to team code for future use
@@ -147,48 +279,10 @@ class NHLApiClient:
             # use a hardcoded list of teams as a fallback
             if len(teams) < 30:
                 self.logger.warning(f"Only found {len(teams)} teams in API response, using hardcoded list as fallback")
-                hardcoded_teams = [
-                    {'id': 1, 'abbrev': 'NJD', 'name': 'New Jersey Devils'},
-                    {'id': 2, 'abbrev': 'NYI', 'name': 'New York Islanders'},
-                    {'id': 3, 'abbrev': 'NYR', 'name': 'New York Rangers'},
-                    {'id': 4, 'abbrev': 'PHI', 'name': 'Philadelphia Flyers'},
-                    {'id': 5, 'abbrev': 'PIT', 'name': 'Pittsburgh Penguins'},
-                    {'id': 6, 'abbrev': 'BOS', 'name': 'Boston Bruins'},
-                    {'id': 7, 'abbrev': 'BUF', 'name': 'Buffalo Sabres'},
-                    {'id': 8, 'abbrev': 'MTL', 'name': 'Montreal Canadiens'},
-                    {'id': 9, 'abbrev': 'OTT', 'name': 'Ottawa Senators'},
-                    {'id': 10, 'abbrev': 'TOR', 'name': 'Toronto Maple Leafs'},
-                    {'id': 12, 'abbrev': 'CAR', 'name': 'Carolina Hurricanes'},
-                    {'id': 13, 'abbrev': 'FLA', 'name': 'Florida Panthers'},
-                    {'id': 14, 'abbrev': 'TBL', 'name': 'Tampa Bay Lightning'},
-                    {'id': 15, 'abbrev': 'WSH', 'name': 'Washington Capitals'},
-                    {'id': 16, 'abbrev': 'CHI', 'name': 'Chicago Blackhawks'},
-                    {'id': 17, 'abbrev': 'DET', 'name': 'Detroit Red Wings'},
-                    {'id': 18, 'abbrev': 'NSH', 'name': 'Nashville Predators'},
-                    {'id': 19, 'abbrev': 'STL', 'name': 'St. Louis Blues'},
-                    {'id': 20, 'abbrev': 'CGY', 'name': 'Calgary Flames'},
-                    {'id': 21, 'abbrev': 'COL', 'name': 'Colorado Avalanche'},
-                    {'id': 22, 'abbrev': 'EDM', 'name': 'Edmonton Oilers'},
-                    {'id': 23, 'abbrev': 'VAN', 'name': 'Vancouver Canucks'},
-                    {'id': 24, 'abbrev': 'ANA', 'name': 'Anaheim Ducks'},
-                    {'id': 25, 'abbrev': 'DAL', 'name': 'Dallas Stars'},
-                    {'id': 26, 'abbrev': 'LAK', 'name': 'Los Angeles Kings'},
-                    {'id': 28, 'abbrev': 'SJS', 'name': 'San Jose Sharks'},
-                    {'id': 29, 'abbrev': 'CBJ', 'name': 'Columbus Blue Jackets'},
-                    {'id': 30, 'abbrev': 'MIN', 'name': 'Minnesota Wild'},
-                    {'id': 52, 'abbrev': 'WPG', 'name': 'Winnipeg Jets'},
-                    {'id': 53, 'abbrev': 'ARI', 'name': 'Arizona Coyotes'},
-                    {'id': 54, 'abbrev': 'VGK', 'name': 'Vegas Golden Knights'},
-                    {'id': 55, 'abbrev': 'SEA', 'name': 'Seattle Kraken'},
-                    {'id': 56, 'abbrev': 'UTA', 'name': 'Utah Hockey Club'}
-                ]
-                
                 teams = []  # Reset teams list to use only hardcoded teams
                 
-                for team in hardcoded_teams:
-                    team_id = team['id']
-                    team_code = team['abbrev']
-                    team_name = team['name']
+                for _, team_code, team_name in SEED_TEAMS:
+                    team_id = self.teams.team_id(team_code, team_name)
                     
                     # Map team ID to team code for future use
                     self.team_id_to_code[team_id] = team_code
@@ -221,7 +315,7 @@ class NHLApiClient:
     
     def get_team(self, team_id):
         """Get a specific NHL team."""
-        self.logger.info(f"Fetching team {team_id} from NHL API")
+        self.logger.info(f"Fetching team {team_id} from NHL API", extra={'sample': 'team'})
         
         # Convert team_id to team code if we have the mapping
         team_code = self.team_id_to_code.get(team_id)
@@ -263,7 +357,7 @@ class NHLApiClient:
     
     def get_team_roster(self, team_id):
         """Get the roster for a specific team."""
-        self.logger.info(f"Fetching roster for team {team_id} from NHL API")
+        self.logger.info(f"Fetching roster for team {team_id} from NHL API", extra={'sample': 'roster'})
         
         # Convert team_id to team code if we have the mapping
         team_code = self.team_id_to_code.get(team_id)
@@ -301,7 +395,7 @@ class NHLApiClient:
     
     def get_player(self, player_id):
         """Get details for a specific player."""
-        self.logger.info(f"Fetching player {player_id} from NHL API")
+        self.logger.info(f"Fetching player {player_id} from NHL API", extra={'sample': 'player'})
         
         # Get player details
         data = self._make_request(f'player/{player_id}/landing')
@@ -332,10 +426,26 @@ class NHLApiClient:
         
         return {}
     
-    def get_schedule(self, start_date=None, end_date=None, team_id=None, season=None):
-        """Get the NHL schedule for a given date range, team, or season."""
-        params = {}
+    def get_schedule(self, start_date=None, end_date=None, team_id=None, season=None, game_types=None):
+        """Get the NHL schedule for a given date range, team, or season.
         
+        Returns [{'date': ..., 'games': [...]}] per game date; see
+        iter_schedule() for the game format and a streaming alternative.
+        """
+        games_by_date = {}
+        for game in self.iter_schedule(team_id=team_id, season=season, game_types=game_types):
+            game_date = (game.get('gameDate') or '').split('T')[0]
+            games_by_date.setdefault(game_date, []).append(game)
+        return [{'date': game_date, 'games': games} for game_date, games in games_by_date.items()]
+    
+    def iter_schedule(self, team_id=None, season=None, game_types=None):
+        """Yield the games of the current schedule, a team or a season one at a time.
+        
+        game_types is an optional list of game type codes (PRESEASON,
+        REGULAR_SEASON, PLAYOFFS); by default every type is returned. For a
+        league-wide season only the weeks in which those types are played
+        are fetched, and each week is yielded before the next is requested.
+        """
         if team_id:
             # Convert team_id to team code if we have the mapping
             team_code = self.team_id_to_code.get(team_id)
@@ -346,7 +456,7 @@ class NHLApiClient:
             
             if not team_code:
                 self.logger.error(f"Could not find team code for team ID {team_id}")
-                return []
+                return
             
             if season:
                 # Format: YYYYYYYY (e.g., 20222023)
@@ -355,119 +465,131 @@ class NHLApiClient:
             else:
                 self.logger.info(f"Fetching current schedule for team {team_code}")
                 data = self._make_request(f'club-schedule-season/{team_code}/now')
+            games = data.get('games', [])
+        elif season:
+            games = self._iter_season_games(season, game_types)
         else:
-            if season:
-                # For league-wide schedule, we need to fetch multiple dates
-                # to get all games for the season
-                current_year = int(season[:4])
-                next_year = int(season[4:])
-                
-                # NHL season typically runs from October to April
-                # We'll fetch data for specific dates throughout the season
-                # to ensure we get complete coverage
-                
-                # Generate a list of dates to check (one per week)
-                import datetime
-                
-                # Start date: October 1st of the first year
-                start_date = datetime.date(current_year, 10, 1)
-                # End date: April 30th of the next year
-                end_date = datetime.date(next_year, 4, 30)
-                
-                # Generate dates at weekly intervals
-                dates = []
-                current_date = start_date
-                while current_date <= end_date:
-                    dates.append(current_date.strftime("%Y-%m-%d"))
-                    current_date += datetime.timedelta(days=7)
-                
-                self.logger.info(f"Fetching schedule for season {season} using {len(dates)} weekly dates")
-                
-                # Initialize with empty games array
-                data = {"games": []}
-                
-                # Track game IDs to avoid duplicates
-                game_ids = set()
-                
-                # Fetch data for each date
-                for date in dates:
-                    try:
-                        self.logger.info(f"Fetching games for date {date}")
-                        
-                        # Use the date endpoint
-                        date_data = self._make_request(f'schedule/{date}')
-                        
-                        # If we have games, add them to our collection (avoiding duplicates)
-                        if 'games' in date_data and date_data['games']:
-                            new_games = 0
-                            for game in date_data['games']:
-                                if 'id' in game and game['id'] not in game_ids:
-                                    game_ids.add(game['id'])
-                                    data['games'].append(game)
-                                    new_games += 1
-                            
-                            self.logger.info(f"Found {new_games} new games for {date}")
-                        else:
-                            self.logger.info(f"No games found for {date}")
-                    except Exception as e:
-                        self.logger.error(f"Error fetching games for {date}: {e}")
-                        continue
-                
-                self.logger.info(f"Found {len(data['games'])} games for season {season}")
-            else:
-                self.logger.info("Fetching current schedule")
-                data = self._make_request('schedule/now')
-        
-        # Transform the data to match the expected format
-        dates = []
-        if 'games' in data:
-            # Group games by date
-            games_by_date = {}
-            for game in data.get('games', []):
-                game_date = game.get('startTimeUTC', '').split('T')[0]
-                if game_date not in games_by_date:
-                    games_by_date[game_date] = []
-                
-                # Transform game data to match expected format
-                transformed_game = {
-                    'gamePk': game.get('id'),
-                    'gameType': game.get('gameType', '2'),  # Default to regular season
-                    'gameDate': game.get('startTimeUTC'),
-                    'teams': {
-                        'away': {
-                            'team': {
-                                'id': self.team_code_to_id.get(game.get('awayTeam', {}).get('abbrev'))
-                            },
-                            'score': game.get('awayTeam', {}).get('score', 0)
+            self.logger.info("Fetching current schedule")
+            data = self._make_request('schedule/now')
+            games = (game for day in data.get('gameWeek', []) for game in day.get('games', []))
+        
+        for game in games:
+            if game_types and game.get('gameType') not in game_types:
+                continue
+            # Transform game data to match the format expected by the sync manager
+            yield {
+                'gamePk': game.get('id'),
+                'gameType': game.get('gameType', REGULAR_SEASON),
+                'gameDate': game.get('startTimeUTC'),
+                'teams': {
+                    'away': {
+                        'team': {
+                            'id': self.team_code_to_id.get(game.get('awayTeam', {}).get('abbrev'))
                         },
-                        'home': {
-                            'team': {
-                                'id': self.team_code_to_id.get(game.get('homeTeam', {}).get('abbrev'))
-                            },
-                            'score': game.get('homeTeam', {}).get('score', 0)
-                        }
+                        'score': game.get('awayTeam', {}).get('score', 0)
                     },
-                    'venue': {
-                        'name': game.get('venue', {}).get('default')
-                    },
-                    'status': {
-                        'detailedState': game.get('gameState')
+                    'home': {
+                        'team': {
+                            'id': self.team_code_to_id.get(game.get('homeTeam', {}).get('abbrev'))
+                        },
+                        'score': game.get('homeTeam', {}).get('score', 0)
                     }
+                },
+                'venue': {
+                    'name': game.get('venue', {}).get('default')
+                },
+                'status': {
+                    'detailedState': game.get('gameState')
                 }
-                games_by_date[game_date].append(transformed_game)
+            }
+    
+    def _iter_season_games(self, season, game_types=None):
+        """Yield a season's games week by week from the league schedule.
+        
+        Each schedule/{date} response holds a gameWeek of seven days plus
+        the season's key dates and the start of the next week, which are
+        used to narrow the scan to the requested game types.
+        """
+        game_types = game_types or list(GAME_TYPES)
+        first_date, last_date = self._schedule_window(season, game_types)
+        self.logger.info(f"Fetching schedule for season {season} "
+                         f"({', '.join(GAME_TYPES[game_type] for game_type in game_types)}) "
+                         f"from {first_date} to {last_date}")
+        
+        game_ids = set()
+        week_start = first_date
+        narrowed = False
+        while week_start <= last_date:
+            self.logger.info(f"Fetching games for week of {week_start}", extra={'sample': 'schedule_date'})
+            data = self._make_request(f'schedule/{week_start.isoformat()}')
+            
+            if not narrowed:
+                narrowed = True
+                window = self._reported_window(season, game_types, data)
+                if window is not None:
+                    first_date, last_date = window
+                    if not first_date - timedelta(days=6) <= week_start <= first_date:
+                        # The requested types start in another week; jump there
+                        week_start = first_date
+                        continue
             
-            # Create dates array
-            for date, games in games_by_date.items():
-                dates.append({
-                    'date': date,
-                    'games': games
-                })
-        
-        return dates
+            next_start = self._parse_date(data.get('nextStartDate'))
+            week = [game for day in data.get('gameWeek', []) for game in day.get('games', [])]
+            for game in week:
+                if game.get('season') not in (None, int(season)) or game.get('id') in game_ids:
+                    continue
+                game_ids.add(game.get('id'))
+                yield game
+            
+            week_start = next_start if next_start and next_start > week_start else week_start + timedelta(days=7)
+        
+        self.logger.info(f"Found {len(game_ids)} games for season {season}")
+    
+    @staticmethod
+    def _schedule_window(season, game_types):
+        """Return the usual (first, last) date of the game types of a season."""
+        first_year = int(str(season)[:4])
+        starts = []
+        ends = []
+        for game_type in game_types:
+            (start_offset, start_month, start_day), (end_offset, end_month, end_day) = GAME_TYPE_WINDOWS[game_type]
+            starts.append(date(first_year + start_offset, start_month, start_day))
+            ends.append(date(first_year + end_offset, end_month, end_day))
+        return min(starts), max(ends)
+    
+    def _reported_window(self, season, game_types, data):
+        """Return the (first, last) date of the game types from a schedule response's key dates.
+        
+        Returns None when the response does not describe this season, so
+        the usual windows are kept (e.g. for seasons played off-calendar).
+        """
+        preseason_start = self._parse_date(data.get('preSeasonStartDate'))
+        regular_start = self._parse_date(data.get('regularSeasonStartDate'))
+        regular_end = self._parse_date(data.get('regularSeasonEndDate'))
+        playoff_end = self._parse_date(data.get('playoffEndDate'))
+        first_year = int(str(season)[:4])
+        if not regular_start or not regular_end or regular_start.year not in (first_year, first_year + 1):
+            return None
+        
+        windows = {
+            PRESEASON: (preseason_start or regular_start - timedelta(days=30), regular_start - timedelta(days=1)),
+            REGULAR_SEASON: (regular_start, regular_end),
+            PLAYOFFS: (regular_end + timedelta(days=1), playoff_end or regular_end + timedelta(days=75)),
+        }
+        return (min(windows[game_type][0] for game_type in game_types),
+                max(windows[game_type][1] for game_type in game_types))
+    
+    @staticmethod
+    def _parse_date(value):
+        """Parse a 'YYYY-MM-DD' date from the API, or return None."""
+        try:
+            return date.fromisoformat(str(value)[:10]) if value else None
+        except ValueError:
+            return None
     
     def get_game(self, game_id):
         """Get details for a specific game."""
-        self.logger.info(f"Fetching game {game_id} from NHL API")
+        self.logger.info(f"Fetching game {game_id} from NHL API", extra={'sample': 'game'})
         
         # Get game landing data
         data = self._make_request(f'gamecenter/{game_id}/landing')
@@ -522,7 +644,7 @@ class NHLApiClient:
     
     def get_game_boxscore(self, game_id):
         """Get boxscore for a specific game."""
-        self.logger.info(f"Fetching boxscore for game {game_id} from NHL API")
+        self.logger.info(f"Fetching boxscore for game {game_id} from NHL API", extra={'sample': 'boxscore'})
         
         # Get game boxscore data
         data = self._make_request(f'gamecenter/{game_id}/boxscore')
@@ -623,13 +745,43 @@ class NHLApiClient:
         
         return transformed_data
     
-    def get_player_stats(self, player_id, season=None):
-        """Get stats for a specific player."""
-        self.logger.info(f"Fetching stats for player {player_id} from NHL API")
+    def get_game_boxscore_raw(self, game_id):
+        """Get the undecoded boxscore payload for a specific game.
+        
+        Decoding and transformation are left to the caller so they can be
+        done in a separate process (see lib.transform).
+        """
+        self.logger.info(f"Fetching boxscore for game {game_id} from NHL API", extra={'sample': 'boxscore'})
+        return self._make_raw_request(f'gamecenter/{game_id}/boxscore')
+    
+    def get_play_by_play(self, game_id, season):
+        """Stream the play-by-play events of a game as compact row tuples.
+        
+        Rows follow lib.transform.GAME_EVENT_COLUMNS.
+        """
+        self.logger.info(f"Fetching play-by-play for game {game_id} from NHL API", extra={'sample': 'play_by_play'})
+        
+        data = self._make_request(f'gamecenter/{game_id}/play-by-play')
+        if not isinstance(data, dict):
+            return
+        yield from play_by_play_rows(game_id, int(season), data, self.team_code_to_id)
+    
+    def get_player_game_log(self, player_id, season, game_type=REGULAR_SEASON):
+        """Get a player's game log entries for a season and game type.
+        
+        Entries are returned as the API sends them; see lib.transform.game_log_rows.
+        """
+        self.logger.info(f"Fetching game log for player {player_id} from NHL API", extra={'sample': 'game_log'})
+        data = self._make_request(f'player/{player_id}/game-log/{season}/{game_type}')
+        return data.get('gameLog', []) if isinstance(data, dict) else []
+    
+    def get_player_stats(self, player_id, season=None, game_type=REGULAR_SEASON):
+        """Get stats for a specific player (for a season, of one game type)."""
+        self.logger.info(f"Fetching stats for player {player_id} from NHL API", extra={'sample': 'player_stats'})
         
         if season:
             # Get player game log for the season
-            data = self._make_request(f'player/{player_id}/game-log/{season}/2')  # 2 is for regular season
+            data = self._make_request(f'player/{player_id}/game-log/{season}/{game_type}')
         else:
             # Get current player game log
             data = self._make_request(f'player/{player_id}/game-log/now')
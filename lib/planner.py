@@ -0,0 +1,131 @@
+"""
+Stats sync planner for NHL MySQL Sync.
+Chooses between per-game boxscores and per-player game logs for a stats sync.
+"""
+
+import logging
+from collections import namedtuple
+
+from lib.nhl_api import GAME_TYPES, game_type_values
+
+# Stats sync strategies; 'auto' lets the planner choose
+STATS_STRATEGIES = ('auto', 'boxscore', 'gamelog')
+
+# Game states that mean a game is over and its boxscore is final
+COMPLETED_GAME_STATES = ('Final', 'Official', 'OFF', 'FINAL')
+
+# strategy is 'boxscore' or 'gamelog'; game_ids / player_ids is what gets fetched
+# (one request per game, or per player and game type); requests is the estimate
+# the choice was based on
+StatsPlan = namedtuple('StatsPlan', ['strategy', 'game_ids', 'player_ids', 'game_types', 'requests'])
+
+
+class StatsPlanner:
+    """Plans a stats sync for a season, optionally scoped to a few players.
+
+    A boxscore covers every player of one game, a game log every game of
+    one player. Game logs do not report hits or blocked shots, so a
+    season-wide sync (and any rebuild) always uses boxscores; 'auto' picks
+    game logs for a player-scoped refresh when that needs fewer requests,
+    e.g. reloading a traded player's season instead of every boxscore of
+    the teams they played for.
+    """
+
+    def __init__(self, db_manager):
+        """Initialize with the database manager used to size the scope."""
+        self.db = db_manager
+        self.logger = logging.getLogger('nhl_sync.planner')
+
+    def plan(self, season, strategy='auto', player_ids=None, missing_only=False, rebuild=False,
+             game_types=None, game_range=None):
+        """Return the StatsPlan for one season (game_types None covers every type).
+
+        game_range (first id, last id) limits a boxscore plan to the games in
+        that id range, e.g. one shard of a leased backfill.
+        """
+        if strategy not in STATS_STRATEGIES:
+            raise ValueError(f"Unknown stats strategy {strategy!r}, expected one of {STATS_STRATEGIES}")
+        if rebuild and strategy == 'gamelog':
+            raise ValueError("A rebuild needs complete stat lines and cannot use game logs")
+        player_ids = sorted(set(player_ids)) if player_ids else None
+        # A game log covers one game type, so every type costs a request per player
+        log_types = sorted(game_types or GAME_TYPES)
+
+        if strategy == 'gamelog' or (strategy == 'auto' and player_ids and not rebuild):
+            players = player_ids or self.season_players(season)
+            requests = len(players) * len(log_types)
+            if strategy == 'gamelog':
+                return StatsPlan('gamelog', [], players, log_types, requests)
+            # Only worth it if it beats fetching the boxscores of the players' games
+            games = self.completed_games(season, missing_only, player_ids, game_types, game_range)
+            if requests < len(games):
+                self.logger.info(f"Planned game logs for season {season}: "
+                                 f"{requests} requests instead of {len(games)} boxscores")
+                return StatsPlan('gamelog', [], players, log_types, requests)
+            return StatsPlan('boxscore', games, player_ids, game_types, len(games))
+
+        games = self.completed_games(season, missing_only and not rebuild, player_ids, game_types, game_range)
+        return StatsPlan('boxscore', games, player_ids, game_types, len(games))
+
+    def completed_games(self, season, missing_only=False, player_ids=None, game_types=None, game_range=None):
+        """Return the ids of completed games, optionally only those of some game types, players' teams or id range."""
+        placeholders = ', '.join(['%s'] * len(COMPLETED_GAME_STATES))
+        query = f"""
+            SELECT id FROM games
+            WHERE season = %s
+            AND status IN ({placeholders})
+        """
+        params = (season, *COMPLETED_GAME_STATES)
+        if game_types:
+            values = game_type_values(game_types)
+            query += f"""
+            AND game_type IN ({', '.join(['%s'] * len(values))})
+        """
+            params += tuple(values)
+        if game_range:
+            query += """
+            AND id BETWEEN %s AND %s
+        """
+            params += tuple(game_range)
+        if missing_only:
+            query += """
+            AND NOT EXISTS (
+                SELECT 1 FROM player_stats
+                WHERE player_stats.season = %s AND player_stats.game_id = games.id
+            )
+        """
+            params += (season,)
+        if player_ids:
+            team_ids = self.player_teams(season, player_ids)
+            if not team_ids:
+                return []
+            team_placeholders = ', '.join(['%s'] * len(team_ids))
+            query += f"""
+            AND (home_team_id IN ({team_placeholders}) OR away_team_id IN ({team_placeholders}))
+        """
+            params += (*team_ids, *team_ids)
+        rows = self.db.execute_query(query + " ORDER BY id", params, fetch=True)
+        return [row['id'] for row in rows or []]
+
+    def player_teams(self, season, player_ids):
+        """Return the teams the players played for in a season, plus their current teams."""
+        placeholders = ', '.join(['%s'] * len(player_ids))
+        rows = self.db.execute_query(f"""
+            SELECT team_id FROM player_stats WHERE season = %s AND player_id IN ({placeholders})
+            UNION
+            SELECT team_id FROM goalie_stats WHERE season = %s AND player_id IN ({placeholders})
+            UNION
+            SELECT current_team_id FROM players WHERE id IN ({placeholders})
+        """, (season, *player_ids, season, *player_ids, *player_ids), fetch=True)
+        return sorted({row['team_id'] for row in rows or [] if row['team_id'] is not None})
+
+    def season_players(self, season):
+        """Return every player with stats in a season, plus every rostered player."""
+        rows = self.db.execute_query("""
+            SELECT player_id FROM player_stats WHERE season = %s
+            UNION
+            SELECT player_id FROM goalie_stats WHERE season = %s
+            UNION
+            SELECT id FROM players WHERE current_team_id IS NOT NULL
+        """, (season, season), fetch=True)
+        return sorted(row['player_id'] for row in rows or [])
@@ -0,0 +1,160 @@
+"""
+Sync run history for NHL MySQL Sync.
+Records what each sync cost (time, requests, bytes, rows, memory) in the sync_runs table.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+INSERT_RUN_SQL = """
+    INSERT INTO sync_runs
+        (job_type, season, status, started_at, finished_at, duration_seconds, requests,
+         bytes_downloaded, rows_inserted, rows_updated, rows_unchanged, errors, peak_memory_kb)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+RECENT_RUNS_SQL = """
+    SELECT id, job_type, season, status, started_at, finished_at, duration_seconds, requests,
+           bytes_downloaded, rows_inserted, rows_updated, rows_unchanged, errors, peak_memory_kb
+    FROM sync_runs
+    {where}
+    ORDER BY started_at DESC
+    LIMIT %s
+"""
+
+
+def peak_memory_kb():
+    """Return the peak resident set size of this process and its children in KB, or None."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux; children covers the transform pool
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def split_affected_rows(rows_written, rows_affected, existing_rows=None, affected_per_update=2):
+    """Return (inserted, updated, unchanged) of an upsert of rows_written rows.
+
+    existing_rows is how many of the rows' keys were stored before the
+    write; the other rows were inserted. An upsert reports 1 affected row
+    per insert, affected_per_update per update (2 on MySQL's ON DUPLICATE
+    KEY UPDATE, 1 on the file backends) and 0 per row left as it was.
+    Without both counts every row is counted as inserted.
+    """
+    if rows_affected is None or existing_rows is None:
+        return rows_written, 0, 0
+    existing_rows = min(existing_rows, rows_written)
+    inserted = rows_written - existing_rows
+    updated = min(max(rows_affected - inserted, 0) // affected_per_update, existing_rows)
+    return inserted, updated, existing_rows - updated
+
+
+class SyncRun:
+    """Counters of one sync run, filled in while it runs.
+
+    Row counts arrive from the write path (possibly from several season
+    threads at once); requests and bytes are taken from the API client's
+    counters at the start and the end of the run; errors counts the ERROR
+    records logged under 'nhl_sync' in the meantime.
+    """
+
+    def __init__(self, job_type, season=None, api_client=None):
+        self.job_type = job_type
+        self.season = int(season) if season else None
+        self.status = 'running'
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.duration_seconds = None
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        self.errors = 0
+        self.peak_memory_kb = None
+
+        # Threads working for this run; only their errors are counted
+        self.threads = set()
+        
+        self._api = api_client
+        self._start_counters = self._api_counters()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_rows(self, rows_written, rows_affected=None, existing_rows=None, affected_per_update=2):
+        """Count a write of rows_written rows, existing_rows of them stored before, that reported rows_affected."""
+        inserted, updated, unchanged = split_affected_rows(rows_written, rows_affected, existing_rows,
+                                                           affected_per_update)
+        with self._lock:
+            self.rows_inserted += inserted
+            self.rows_updated += updated
+            self.rows_unchanged += unchanged
+
+    def add_error(self):
+        """Count one error."""
+        with self._lock:
+            self.errors += 1
+
+    def finish(self, status):
+        """Stop the clock and take the final request, byte and memory figures."""
+        self.status = status
+        self.finished_at = datetime.now()
+        self.duration_seconds = round(time.monotonic() - self._started, 3)
+        requests_made, bytes_downloaded = self._api_counters()
+        self.requests = requests_made - self._start_counters[0]
+        self.bytes_downloaded = bytes_downloaded - self._start_counters[1]
+        self.peak_memory_kb = peak_memory_kb()
+
+    def row(self):
+        """Return the values inserted into sync_runs."""
+        return (self.job_type, self.season, self.status, self.started_at, self.finished_at,
+                self.duration_seconds, self.requests, self.bytes_downloaded, self.rows_inserted,
+                self.rows_updated, self.rows_unchanged, self.errors, self.peak_memory_kb)
+
+    def _api_counters(self):
+        """Return the API client's (requests made, bytes downloaded)."""
+        if self._api is None:
+            return 0, 0
+        return getattr(self._api, 'requests_made', 0), getattr(self._api, 'bytes_downloaded', 0)
+
+
+class ErrorCounter(logging.Handler):
+    """Logging handler that counts ERROR records into a SyncRun."""
+
+    def __init__(self, run):
+        super().__init__(logging.ERROR)
+        self.run = run
+
+    def emit(self, record):
+        # Syncs running concurrently on other threads keep their own counts
+        if record.thread in self.run.threads:
+            self.run.add_error()
+
+
+class SyncRunHistory:
+    """Reads and writes the sync_runs table."""
+
+    def __init__(self, db_manager):
+        """Initialize with the database manager used for the sync_runs queries."""
+        self.db = db_manager
+        self.logger = logging.getLogger('nhl_sync.runs')
+
+    def record(self, run):
+        """Store a finished run. Failures are logged, never raised."""
+        try:
+            self.db.execute_query(INSERT_RUN_SQL, run.row())
+        except Exception as e:
+            self.logger.warning(f"Could not record {run.job_type} sync run: {e}")
+
+    def recent(self, limit=200, job_type=None):
+        """Return the most recent runs as dicts, newest first."""
+        where = "WHERE job_type = %s" if job_type else ""
+        params = (job_type, limit) if job_type else (limit,)
+        return self.db.execute_query(RECENT_RUNS_SQL.format(where=where), params, fetch=True) or []
@@ -0,0 +1,215 @@
+"""
+Scheduler for NHL MySQL Sync.
+Plans sync jobs around the game calendar and runs them on a worker pool.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from lib.nhl_api import GAME_TYPES
+
+# Longest the scheduler sleeps before re-planning, even with nothing due
+MAX_SLEEP = 3600
+
+# Next run of a job that is done for the season
+NEVER = datetime.max
+
+
+def _utcnow():
+    """Return the current UTC time as a naive datetime (games are stored in UTC)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SyncScheduler:
+    """Event-driven replacement for a fixed-interval polling loop.
+
+    Teams, players and games refresh on fixed intervals; with per game
+    type intervals each game type is its own job (e.g. playoffs every 15
+    minutes, preseason once per season). Stats are planned from the games
+    table: the stats job runs shortly after each game's expected end and
+    stays idle on days without games. Jobs run on a thread pool, a job
+    type never overlaps with itself, and next-run times are persisted so a
+    restart does not trigger a full resync.
+    """
+
+    def __init__(self, sync_manager, db_manager, season, intervals, state_file,
+                 workers=2, game_duration=10800, postgame_delay=900, idle_interval=86400,
+                 game_type_intervals=None):
+        """Initialize the scheduler.
+
+        intervals holds the refresh interval (in seconds) per job type.
+        game_type_intervals optionally maps game type codes to their games
+        refresh interval, None meaning once per season; without it a single
+        games job refreshes every type on intervals['games'].
+        game_duration and postgame_delay (in seconds) define when a game's
+        stats are expected to be final; idle_interval is how long the stats
+        job waits when no upcoming games are known.
+        """
+        self.sync_manager = sync_manager
+        self.db = db_manager
+        self.season = season
+        self.intervals = intervals
+        self.state_file = state_file
+        self.game_duration = timedelta(seconds=game_duration)
+        self.postgame_delay = timedelta(seconds=postgame_delay)
+        self.idle_interval = timedelta(seconds=idle_interval)
+        self.logger = logging.getLogger('nhl_sync.scheduler')
+
+        self.jobs = {
+            'teams': sync_manager.sync_teams,
+            'players': sync_manager.sync_players,
+        }
+        self.job_intervals = {'teams': intervals['teams'], 'players': intervals['players']}
+        if game_type_intervals:
+            for game_type, interval in sorted(game_type_intervals.items()):
+                job = f'games_{GAME_TYPES[game_type]}'
+                self.jobs[job] = lambda game_type=game_type: sync_manager.sync_games(
+                    self.season, game_types=[game_type])
+                self.job_intervals[job] = interval
+            # Types fetched once are left alone once their games are stored
+            self.recurring_game_types = [game_type for game_type, interval in game_type_intervals.items()
+                                         if interval is not None]
+        else:
+            self.jobs['games'] = lambda: sync_manager.sync_games(self.season)
+            self.job_intervals['games'] = intervals['games']
+            self.recurring_game_types = None
+        self.jobs['stats'] = self._run_postgame
+        self.state = self._load_state()
+        self.running = set()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nhl-scheduler')
+
+    def run_forever(self):
+        """Run due jobs until stop() is called."""
+        self.logger.info("Scheduler started")
+        for job in self.jobs:
+            self.logger.info(f"Next {job} run: {self._next_run(job):%Y-%m-%d %H:%M:%S} UTC")
+
+        while not self._stopped.is_set():
+            now = _utcnow()
+            next_wake = now + timedelta(seconds=MAX_SLEEP)
+
+            for job in self.jobs:
+                with self._lock:
+                    if job in self.running:
+                        continue
+                    due = self._next_run(job)
+                    if due <= now:
+                        self.running.add(job)
+                        self._pool.submit(self._run_job, job)
+                        continue
+                next_wake = min(next_wake, due)
+
+            # Sleep until the next job is due or a finished job asks to re-plan
+            self._wake.wait(max(0.0, (next_wake - _utcnow()).total_seconds()))
+            self._wake.clear()
+
+        self._pool.shutdown(wait=True)
+        self.logger.info("Scheduler stopped")
+
+    def stop(self):
+        """Stop the scheduler after the running jobs finish."""
+        self._stopped.set()
+        self._wake.set()
+
+    def _run_job(self, job):
+        """Run one job on a pool thread and plan its next run."""
+        started = _utcnow()
+        self.logger.info(f"Running scheduled {job} sync")
+        try:
+            self.jobs[job]()
+        except Exception as e:
+            self.logger.error(f"Scheduled {job} sync failed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self.running.discard(job)
+                self.state.setdefault(job, {})['last_run'] = started.isoformat()
+                self.state[job]['season'] = self.season
+                self.state[job].pop('next_run', None)
+                if job.startswith('games') and 'stats' not in self.running:
+                    # New or rescheduled games change when stats are due
+                    self.state.setdefault('stats', {}).pop('next_run', None)
+                next_run = self._next_run(job)
+                self._save_state()
+            self.logger.info(f"Next {job} run: {next_run:%Y-%m-%d %H:%M:%S} UTC")
+            self._wake.set()
+
+    def _run_postgame(self):
+        """Refresh game results, then pull stats for newly completed games."""
+        self.sync_manager.sync_games(self.season, game_types=self.recurring_game_types)
+        self.sync_manager.sync_stats(self.season, missing_only=True)
+
+    def _next_run(self, job):
+        """Return when a job should next run (UTC), planning it if needed."""
+        job_state = self.state.setdefault(job, {})
+        if job_state.get('next_run'):
+            return datetime.fromisoformat(job_state['next_run'])
+
+        last_run = job_state.get('last_run')
+        last_run = datetime.fromisoformat(last_run) if last_run else None
+        if job == 'stats':
+            next_run = self._plan_stats(last_run)
+        elif last_run is None:
+            next_run = _utcnow()
+        elif self.job_intervals[job] is None:
+            # Once per season: run again only when the season changes
+            next_run = NEVER if job_state.get('season') == self.season else _utcnow()
+        else:
+            next_run = last_run + timedelta(seconds=self.job_intervals[job])
+
+        job_state['next_run'] = next_run.isoformat()
+        return next_run
+
+    def _plan_stats(self, last_run):
+        """Plan the stats job from the expected end of scheduled games."""
+        now = _utcnow()
+        if last_run is None:
+            return now
+
+        ready_after = self.game_duration + self.postgame_delay
+        try:
+            games = self.db.execute_query("""
+                SELECT date_time FROM games
+                WHERE date_time > %s
+                ORDER BY date_time
+                LIMIT 1
+            """, (last_run - ready_after,), fetch=True)
+        except Exception as e:
+            self.logger.warning(f"Could not read game calendar, using fixed interval: {e}")
+            return last_run + timedelta(seconds=self.intervals['stats'])
+
+        if not games or not games[0]['date_time']:
+            # Nothing scheduled: check back once the idle interval has passed
+            return last_run + self.idle_interval
+
+        # Stats for the next game become final a little after it ends
+        return max(now, games[0]['date_time'] + ready_after)
+
+    def _load_state(self):
+        """Load persisted run times."""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read scheduler state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self):
+        """Persist run times so restarts resume the same plan."""
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            self.logger.warning(f"Could not write scheduler state {self.state_file}: {e}")
@@ -0,0 +1,227 @@
+"""
+Write-ahead spool for NHL MySQL Sync.
+Keeps write batches on disk while the database is unreachable and replays them once it is back.
+"""
+
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+# Total spool size at which further writes are refused (and the sync stops)
+SPOOL_MAX_BYTES = 2 * 1024 ** 3
+
+# Size at which a segment is sealed and a new one started
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Seconds between replay attempts after the database was found unavailable
+RETRY_INTERVAL = 30
+
+# Frame header: payload length (big-endian) and codec (b'm' msgpack, b'j' JSON)
+FRAME_HEADER = struct.Struct('>Ic')
+
+# Segment file suffixes: being appended to, ready for replay, being replayed
+OPEN_SUFFIX = '.open'
+SEALED_SUFFIX = '.spool'
+REPLAYING_SUFFIX = '.replaying'
+
+
+class SpoolFull(Exception):
+    """Raised when a write would grow the spool beyond its size limit."""
+
+
+def _encode_value(value):
+    """Encode the values the JSON and msgpack encoders do not know."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot spool a value of type {type(value).__name__}")
+
+
+def _pid_alive(pid):
+    """Return True if a process with this id is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteSpool:
+    """Append-only on-disk log of write batches.
+
+    Each record is one length-prefixed frame, msgpack encoded when the
+    msgpack package is installed and JSON otherwise. A process appends to
+    its own open segment; segments are sealed when they reach
+    segment_bytes or when a replay starts, and replayed oldest first by
+    whichever process claims them (by renaming). Records are upserts, so a
+    segment whose replay was interrupted is simply replayed again.
+
+    The spool is bounded: once it holds max_bytes, append raises
+    SpoolFull so the sync stops fetching data it has nowhere to put.
+    """
+
+    def __init__(self, path, max_bytes=SPOOL_MAX_BYTES, segment_bytes=SEGMENT_BYTES,
+                 retry_interval=RETRY_INTERVAL):
+        """Initialize the spool in directory path."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.retry_interval = retry_interval
+        self.logger = logging.getLogger('nhl_sync.spool')
+
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._segment = None
+        self._segment_size = 0
+        self._retry_at = 0.0
+        try:
+            import msgpack
+        except ImportError:
+            msgpack = None
+        self._msgpack = msgpack
+
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def append(self, record):
+        """Append a record (a dict of plain values) to the spool."""
+        payload, codec = self._encode(record)
+        frame = FRAME_HEADER.pack(len(payload), codec) + payload
+        with self._lock:
+            if self.size() + len(frame) > self.max_bytes:
+                raise SpoolFull(f"Write spool {self.path} is full ({self.max_bytes} bytes); "
+                                f"stopping until the database is available again")
+            if self._segment is None:
+                self._segment = os.path.join(self.path, f"{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}")
+                self._segment_size = 0
+            with open(self._segment, 'ab') as f:
+                f.write(frame)
+            self._segment_size += len(frame)
+            if self._segment_size >= self.segment_bytes:
+                self._seal()
+
+    def pending(self):
+        """Return True if the spool holds records that have not been replayed."""
+        with self._lock:
+            if self._segment is not None:
+                return True
+        return bool(self._segments(SEALED_SUFFIX) or self._segments(REPLAYING_SUFFIX + '.*'))
+
+    def size(self):
+        """Return the bytes currently held by the spool."""
+        total = 0
+        for path in glob.glob(os.path.join(self.path, '*')):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def replay(self, apply, force=False):
+        """Feed spooled records to apply(record), oldest first; returns True once the spool is empty.
+
+        apply raising stops the replay, keeping the remaining segments; the
+        next attempt is made no sooner than retry_interval seconds later
+        unless force is set. Returns False while another thread is replaying.
+        """
+        if not force and time.monotonic() < self._retry_at:
+            return False
+        if not self._replay_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                self._seal()
+            for segment in self._segments(SEALED_SUFFIX):
+                claimed = f"{segment[:-len(SEALED_SUFFIX)]}{REPLAYING_SUFFIX}.{os.getpid()}"
+                try:
+                    os.rename(segment, claimed)
+                except FileNotFoundError:
+                    continue  # Claimed by another process
+                try:
+                    records = self._replay_segment(claimed, apply)
+                except Exception as e:
+                    os.rename(claimed, segment)
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    self.logger.warning(f"Spool replay stopped, retrying in {self.retry_interval}s: {e}")
+                    return False
+                os.remove(claimed)
+                self.logger.info(f"Replayed {records} spooled writes from {os.path.basename(segment)}")
+            self._retry_at = 0.0
+            return not self.pending()
+        finally:
+            self._replay_lock.release()
+
+    def close(self):
+        """Seal this process's open segment so any process can replay it."""
+        with self._lock:
+            self._seal()
+
+    def _replay_segment(self, path, apply):
+        """Apply every complete record of a segment; returns how many were applied."""
+        count = 0
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(FRAME_HEADER.size)
+                if not header:
+                    break
+                length, codec = FRAME_HEADER.unpack(header) if len(header) == FRAME_HEADER.size else (-1, None)
+                payload = f.read(length) if length >= 0 else b''
+                if len(payload) != length:
+                    # The writing process died mid-append; everything before it is intact
+                    self.logger.warning(f"Ignoring a truncated record at the end of {os.path.basename(path)}")
+                    break
+                apply(self._decode(payload, codec))
+                count += 1
+        return count
+
+    def _seal(self):
+        """Make the open segment replayable; caller holds _lock."""
+        if self._segment is None:
+            return
+        os.rename(self._segment, self._segment[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        self._segment = None
+        self._segment_size = 0
+
+    def _segments(self, suffix):
+        """Return the segment files with a suffix (a glob pattern), oldest first."""
+        return sorted(glob.glob(os.path.join(self.path, f"*{suffix}")))
+
+    def _recover(self):
+        """Seal segments left open, and release claims held, by processes that have exited.
+
+        Open segments of this process belong to an earlier spool object
+        (e.g. of a previous worker job) and are sealed as well.
+        """
+        for path in self._segments(OPEN_SUFFIX):
+            pid = int(os.path.basename(path)[:-len(OPEN_SUFFIX)].rsplit('-', 1)[1])
+            if pid == os.getpid() or not _pid_alive(pid):
+                os.rename(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        for path in self._segments(REPLAYING_SUFFIX + '.*'):
+            base, pid = path.rsplit('.', 1)
+            if not _pid_alive(int(pid)):
+                os.rename(path, base[:-len(REPLAYING_SUFFIX)] + SEALED_SUFFIX)
+        if self.pending():
+            self.logger.warning(f"Write spool {self.path} holds {self.size()} bytes waiting to be replayed")
+
+    def _encode(self, record):
+        """Serialize a record; returns (payload, codec)."""
+        if self._msgpack is not None:
+            return self._msgpack.packb(record, default=_encode_value, use_bin_type=True), b'm'
+        return json.dumps(record, default=_encode_value, separators=(',', ':')).encode('utf-8'), b'j'
+
+    def _decode(self, payload, codec):
+        """Deserialize a record written by _encode."""
+        if codec == b'j':
+            return json.loads(payload)
+        if self._msgpack is None:
+            raise RuntimeError("Spooled records are msgpack encoded; install msgpack to replay them")
+        return self._msgpack.unpackb(payload, raw=False)
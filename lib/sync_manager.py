@@ -4,31 +4,111 @@ Handles synchronization between NHL API and MySQL database.
 """
 
 import logging
-from datetime import datetime
-from tqdm import tqdm
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from lib.transform import (
+    PLAYER_STATS_COLUMNS, GOALIE_STATS_COLUMNS, STATS_KEY_FIELDS, GAME_EVENT_COLUMNS,
+    GAME_LOG_PLAYER_COLUMNS, GAME_LOG_GOALIE_COLUMNS, game_log_rows, transform_boxscore_payloads
+)
+from lib.aggregates import SeasonTotals
+from lib.batch import BatchCoordinator, UnitResult, group_units
+from lib.cancellation import SyncCancelled
+from lib.database import DatabaseUnavailable
+from lib.nhl_api import REGULAR_SEASON
+from lib.planner import COMPLETED_GAME_STATES, StatsPlanner
+from lib.runs import ErrorCounter, SyncRun, SyncRunHistory
+from lib.writer import BatchWriter
+
+# Number of boxscores handed to a transform worker at a time
+TRANSFORM_BATCH_SIZE = 25
+
+# Player game logs downloaded concurrently by the game log stats strategy
+GAME_LOG_WORKERS = 8
+
+# Play-by-play rows buffered before a write (~300 events per game)
+EVENT_BATCH_SIZE = 10000
+
+# Games buffered before a write while the schedule streams in
+GAME_BATCH_SIZE = 1000
+
+# Stat rows buffered before a write (~40 per game); a rebuild keeps the whole season
+STATS_BATCH_SIZE = 20000
+
+# Player records buffered before a write during a players sync
+PLAYER_BATCH_SIZE = 500
+
+def _progress_bar(iterable, desc):
+    """Wrap iterable in a console progress bar; tqdm is only imported once a sync loop starts."""
+    from tqdm import tqdm
+    return tqdm(iterable, desc=desc)
 
 class SyncManager:
-    """Manages synchronization between NHL API and database."""
+    """Manages synchronization between NHL API and database.
+    
+    The sync_* methods accept an optional cancel_token (a CancellationToken)
+    and an optional progress callback, called as progress(unit, done, total)
+    where unit names what is counted ('teams', 'games', 'seasons').
+    A cancelled sync stops promptly by raising SyncCancelled.
+    Every sync is recorded in the sync_runs table (see lib.runs).
+    """
     
-    def __init__(self, db_manager, api_client):
-        """Initialize the sync manager with database and API clients."""
+    def __init__(self, db_manager, api_client, player_staleness=604800, transform_workers=0,
+                 bulk_load=False, spool=None):
+        """Initialize the sync manager with database and API clients.
+
+        player_staleness is the age (in seconds) after which a player's bio
+        fields are refetched even if their roster entry has not changed.
+        transform_workers is the default number of processes used to decode
+        boxscores in sync_stats (0 or 1 keeps everything in-process).
+        bulk_load writes games and stats through LOAD DATA LOCAL INFILE,
+        which is much faster for historical backfills.
+        spool is a WriteSpool that keeps writes while the database is
+        unreachable; without one such a write fails the sync.
+        """
         self.db = db_manager
         self.api = api_client
+        self.player_staleness = player_staleness
+        self.transform_workers = transform_workers
+        self.bulk_load = bulk_load
+        self.spool = spool
+        
+        self.totals = SeasonTotals(db_manager)
+        self.batches = BatchCoordinator(db_manager)
+        self.planner = StatsPlanner(db_manager)
+        self.runs = SyncRunHistory(db_manager)
+        
+        # Run being recorded by the sync on this thread (see _recording)
+        self._local = threading.local()
+        
+        # Shared writer used while sync_seasons is running, and the run its writes count towards
+        self._writer = None
+        self._writer_run = None
+        # Callables notified as listener(table, columns, rows) after each write
+        self._write_listeners = []
         self.logger = logging.getLogger('nhl_sync.sync')
-        # Ensure logger is configured
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.INFO)
-    
-    def sync_teams(self):
+    
+    def sync_teams(self, cancel_token=None, progress=None):
         """Synchronize teams data."""
+        with self._recording('teams'):
+            self._sync_teams(cancel_token, progress)
+    
+    def _sync_teams(self, cancel_token, progress):
+        """Fetch the teams and write them unless the standings are unchanged."""
         self.logger.info("Starting teams synchronization")
         
         # Fetch teams from API
-        teams_data = self.api.get_teams()
+        with self._cancellable(cancel_token):
+            teams_data = self.api.get_teams()
+        
+        # Standings identical to the last stored payload: nothing to transform or write
+        if self.api.teams_unchanged() and self._table_has_rows('teams'):
+            self._report(progress, 'teams', len(teams_data), len(teams_data))
+            self.logger.info("Teams synchronization completed: standings unchanged")
+            return
         
         # Check if teams_data is a dictionary with 'teams' key (old API format)
         if isinstance(teams_data, dict) and 'teams' in teams_data:
@@ -72,13 +152,20 @@ class SyncManager:
         
         # Insert or update in database
         if teams_to_insert:
-            rows_affected = self.db.insert_or_update('teams', teams_to_insert, ['id'])
+            rows_affected = self._upsert_records('teams', teams_to_insert, ['id'])
+            self.api.commit_validators('standings/')
+            self._report(progress, 'teams', len(teams_to_insert), len(teams_to_insert))
             self.logger.info(f"Teams synchronization completed: {rows_affected} rows affected")
         else:
             self.logger.warning("No teams data to synchronize")
     
-    def sync_players(self):
-        """Synchronize players data."""
+    def sync_players(self, cancel_token=None, progress=None, team_ids=None):
+        """Synchronize players data, optionally only of the rosters of some teams."""
+        with self._recording('players'), self._cancellable(cancel_token):
+            self._sync_players(cancel_token, progress, team_ids)
+    
+    def _sync_players(self, cancel_token, progress, team_ids=None):
+        """Fetch rosters and player details, then write the changed players."""
         self.logger.info("Starting players synchronization")
         
         # Get all teams
@@ -87,11 +174,33 @@ class SyncManager:
         # Check if teams_data is a dictionary with 'teams' key (old API format)
         if isinstance(teams_data, dict) and 'teams' in teams_data:
             teams_data = teams_data.get('teams', [])
+        if team_ids is not None:
+            teams_data = [team for team in teams_data if isinstance(team, dict) and team.get('id') in team_ids]
         
         players_to_insert = []
+        players_written = 0
+        rows_affected = 0
+        
+        # Load what we already know so only new, moved or stale players are fetched
+        known_players = self._load_known_players()
+        known_by_team = {}
+        for known in known_players.values():
+            known_by_team.setdefault(known['current_team_id'], []).append(known)
+        stale_before = datetime.now() - timedelta(seconds=self.player_staleness)
+        skipped_players = 0
+        unchanged_rosters = 0
         
         # For each team, get roster and player details
-        for team in tqdm(teams_data, desc="Fetching team rosters"):
+        for team_index, team in enumerate(_progress_bar(teams_data, desc="Fetching team rosters")):
+            self._checkpoint(cancel_token)
+            self._report(progress, 'teams', team_index, len(teams_data))
+            
+            # Write in batches so the records of every roster are never held at once
+            if len(players_to_insert) >= PLAYER_BATCH_SIZE:
+                rows_affected += self._write_players(players_to_insert)
+                players_written += len(players_to_insert)
+                players_to_insert = []
+            
             # Ensure team is a dictionary
             if not isinstance(team, dict):
                 self.logger.error(f"Team data is not a dictionary: {team}")
@@ -106,6 +215,15 @@ class SyncManager:
                     
                 # Get roster for the team
                 roster_data = self.api.get_team_roster(team_id)
+                if self.api.roster_unchanged(team_id):
+                    unchanged_rosters += 1
+                    # Same roster as last stored: nothing to transform or write unless a bio went stale
+                    team_players = known_by_team.get(team_id, [])
+                    if team_players and all(known['last_updated'] is not None
+                                            and known['last_updated'] >= stale_before
+                                            for known in team_players):
+                        skipped_players += len(team_players)
+                        continue
                 
                 # Check if roster_data is in the expected format
                 if isinstance(roster_data, dict) and 'roster' in roster_data:
@@ -148,6 +266,17 @@ class SyncManager:
                         if player_id is None:
                             self.logger.error(f"Player is missing required 'id' field: {player}")
                             continue
+                        
+                        self._checkpoint(cancel_token)
+                        
+                        # Skip the landing page when the stored record is current
+                        known = known_players.get(player_id)
+                        if (known is not None
+                                and known['current_team_id'] == team_id
+                                and known['last_updated'] is not None
+                                and known['last_updated'] >= stale_before):
+                            skipped_players += 1
+                            continue
                             
                         # Get detailed player info
                         player_data = self.api.get_player(player_id)
@@ -180,7 +309,9 @@ class SyncManager:
                                 'weight': player_data.get('weight', player_data.get('weightInPounds')),
                                 'nationality': player_data.get('nationality', player_data.get('birthCountry')),
                                 'active': player_data.get('active', True),
-                                'rookie': player_data.get('rookie', False)
+                                'rookie': player_data.get('rookie', False),
+                                # Set explicitly so unchanged bios still reset the staleness clock
+                                'last_updated': datetime.now()
                             }
                             
                             # Validate required fields
@@ -199,162 +330,781 @@ class SyncManager:
                 self.logger.error(f"Error processing team: {e}", exc_info=True)
                 continue
         
+        self._report(progress, 'teams', len(teams_data), len(teams_data))
+        self.logger.info(f"Skipped {skipped_players} players with current records "
+                         f"({unchanged_rosters} of {len(teams_data)} rosters unchanged)")
+        
         # Insert or update in database
         if players_to_insert:
-            rows_affected = self.db.insert_or_update('players', players_to_insert, ['id'])
+            rows_affected += self._write_players(players_to_insert)
+            players_written += len(players_to_insert)
+        if players_written:
             self.logger.info(f"Players synchronization completed: {rows_affected} rows affected")
+        elif skipped_players:
+            self.logger.info("Players synchronization completed: all players up to date")
         else:
             self.logger.warning("No players data to synchronize")
+        # Every rostered player is stored now, so these rosters count as written
+        if team_ids is None:
+            self.api.commit_validators('roster/')
+        else:
+            for team in teams_data:
+                self.api.commit_validators(f"roster/{self.api.team_id_to_code.get(team['id'])}/")
     
-    def sync_games(self, season):
-        """Synchronize games data for a specific season."""
-        self.logger.info(f"Starting games synchronization for season {season}")
+    def _write_players(self, players_to_insert):
+        """Upsert player records and return the rows affected."""
+        return self._upsert_records('players', players_to_insert, ['id']) or 0
+    
+    def _table_has_rows(self, table):
+        """Return True if table has at least one row (False if the query fails).
         
-        # Fetch schedule from API
-        schedule_data = self.api.get_schedule(season=season)
+        DatabaseUnavailable is raised rather than treated as an empty table.
+        """
+        try:
+            rows = self.db.execute_query(f"SELECT 1 FROM {table} LIMIT 1", fetch=True)
+        except self.db.errors as e:
+            self.logger.warning(f"Could not check {table}: {e}")
+            return False
+        return bool(rows)
+    
+    def _load_known_players(self):
+        """Return stored team and freshness for every player, keyed by player id.
         
-        if not schedule_data:
-            self.logger.warning(f"No schedule data returned for season {season}")
-            return
-            
-        self.logger.info(f"Retrieved {len(schedule_data)} date entries from schedule")
+        DatabaseUnavailable is raised: without the stored players every
+        landing page would be downloaded again.
+        """
+        try:
+            rows = self.db.execute_query(
+                "SELECT id, current_team_id, last_updated FROM players", fetch=True)
+        except self.db.errors as e:
+            # Without the current state every rostered player is treated as new
+            self.logger.warning(f"Could not load existing players, fetching all: {e}")
+            return {}
+        return {row['id']: row for row in rows or []}
+    
+    def sync_games(self, season, cancel_token=None, progress=None, game_types=None):
+        """Synchronize games data for a specific season.
+        
+        game_types limits the sync to some game types (lib.nhl_api PRESEASON,
+        REGULAR_SEASON, PLAYOFFS), and the schedule scan to their weeks.
+        """
+        with self._recording('games', season):
+            self._sync_games(season, cancel_token, progress, game_types)
+    
+    def _sync_games(self, season, cancel_token, progress, game_types=None):
+        """Fetch the schedule of one season and write its games."""
+        self.logger.info(f"Starting games synchronization for season {season}")
         
         games_to_insert = []
+        total_games = 0
+        rows_affected = 0
         
-        # Process each date in the schedule
-        for date_info in schedule_data:
-            games_in_date = date_info.get('games', [])
-            self.logger.info(f"Processing {len(games_in_date)} games for date {date_info.get('date', 'unknown')}")
-            
-            for game in games_in_date:
-                try:
-                    # Check for required fields
-                    if 'gamePk' not in game:
-                        self.logger.warning(f"Skipping game without gamePk: {game}")
-                        continue
-                        
-                    if 'teams' not in game or 'away' not in game['teams'] or 'home' not in game['teams']:
-                        self.logger.warning(f"Skipping game {game.get('gamePk')} without team data")
-                        continue
-                        
-                    # Get team IDs
-                    away_team_id = game['teams']['away']['team'].get('id')
-                    home_team_id = game['teams']['home']['team'].get('id')
-                    
-                    if not away_team_id or not home_team_id:
-                        self.logger.warning(f"Skipping game {game.get('gamePk')} with missing team IDs: away={away_team_id}, home={home_team_id}")
-                        continue
-                    
-                    # Transform data for database
-                    game_record = {
-                        'id': game['gamePk'],
-                        'season': season,
-                        'game_type': game.get('gameType', 'R'),  # Default to regular season if missing
-                        'date_time': game.get('gameDate'),
-                        'away_team_id': away_team_id,
-                        'home_team_id': home_team_id,
-                        'venue': game.get('venue', {}).get('name', 'Unknown'),
-                        'status': game.get('status', {}).get('detailedState', 'Unknown'),
-                        'away_score': game['teams']['away'].get('score', 0),
-                        'home_score': game['teams']['home'].get('score', 0)
-                    }
-                    games_to_insert.append(game_record)
-                except Exception as e:
-                    self.logger.error(f"Error processing game: {e}", exc_info=True)
+        # Games stream in week by week and are written in batches
+        with self._cancellable(cancel_token):
+            for game in self.api.iter_schedule(season=season, game_types=game_types):
+                game_record = self._game_record(game, season)
+                if game_record is None:
                     continue
+                games_to_insert.append(game_record)
+                if len(games_to_insert) >= GAME_BATCH_SIZE:
+                    rows_affected += self._write_records('games', games_to_insert, ['id']) or 0
+                    total_games += len(games_to_insert)
+                    games_to_insert = []
         
         # Insert or update in database
         if games_to_insert:
-            rows_affected = self.db.insert_or_update('games', games_to_insert, ['id'])
-            self.logger.info(f"Games synchronization completed: {rows_affected} rows affected")
+            rows_affected += self._write_records('games', games_to_insert, ['id']) or 0
+            total_games += len(games_to_insert)
+        if total_games:
+            self._report(progress, 'games', total_games, total_games)
+            self.logger.info(f"Games synchronization completed: {total_games} games, {rows_affected} rows affected")
         else:
             self.logger.warning(f"No games data to synchronize for season {season}")
     
-    def sync_stats(self, season):
-        """Synchronize player and goalie stats for a specific season."""
-        self.logger.info(f"Starting stats synchronization for season {season}")
+    def _game_record(self, game, season):
+        """Turn a schedule game into a games record, or None if it cannot be stored."""
+        try:
+            # Check for required fields
+            if not game.get('gamePk'):
+                self.logger.warning(f"Skipping game without gamePk: {game}")
+                return None
+                
+            if 'teams' not in game or 'away' not in game['teams'] or 'home' not in game['teams']:
+                self.logger.warning(f"Skipping game {game.get('gamePk')} without team data")
+                return None
+                
+            # Get team IDs
+            away_team_id = game['teams']['away']['team'].get('id')
+            home_team_id = game['teams']['home']['team'].get('id')
+            
+            if not away_team_id or not home_team_id:
+                self.logger.warning(f"Skipping game {game.get('gamePk')} with missing team IDs: away={away_team_id}, home={home_team_id}")
+                return None
+            
+            # Transform data for database
+            return {
+                'id': game['gamePk'],
+                'season': season,
+                'game_type': str(game.get('gameType') or REGULAR_SEASON),
+                'date_time': game.get('gameDate'),
+                'away_team_id': away_team_id,
+                'home_team_id': home_team_id,
+                'venue': game.get('venue', {}).get('name', 'Unknown'),
+                'status': game.get('status', {}).get('detailedState', 'Unknown'),
+                'away_score': game['teams']['away'].get('score', 0),
+                'home_score': game['teams']['home'].get('score', 0)
+            }
+        except Exception as e:
+            self.logger.error(f"Error processing game: {e}", exc_info=True)
+            return None
+    
+    def sync_stats(self, season, transform_workers=None, missing_only=False, rebuild=False,
+                   cancel_token=None, progress=None, strategy='auto', player_ids=None, game_types=None,
+                   game_range=None):
+        """Synchronize player and goalie stats for a specific season.
         
-        # Get completed games that need stats
-        games_query = """
-            SELECT id FROM games 
-            WHERE season = %s 
-            AND status IN ('Final', 'Official')
+        strategy is 'boxscore' (one request per completed game), 'gamelog'
+        (one request per player, downloaded concurrently) or 'auto', which
+        lets lib.planner.StatsPlanner pick the cheaper one for the scope.
+        player_ids limits the sync to a few players' season and game_types
+        to some game types (all of them by default), game_range (first id,
+        last id) to the games in an id range.
+        With more than one transform worker the boxscores are decoded and
+        transformed in a process pool while this thread keeps downloading.
+        missing_only restricts the sync to completed games without stats.
+        rebuild reloads the whole season and swaps it in as a fresh
+        partition instead of upserting row by row. When cancelled, the stats
+        fetched so far are still written (except for a rebuild).
         """
-        games = self.db.execute_query(games_query, (season,), fetch=True)
+        with self._recording('stats', season), self._cancellable(cancel_token):
+            self._sync_stats(season, transform_workers, missing_only, rebuild, cancel_token, progress,
+                             strategy, player_ids, game_types, game_range)
+    
+    def _sync_stats(self, season, transform_workers, missing_only, rebuild, cancel_token, progress,
+                    strategy='auto', player_ids=None, game_types=None, game_range=None):
+        """Fetch and write the stats of one season."""
+        workers = self.transform_workers if transform_workers is None else transform_workers
+        self.logger.info(f"Starting stats synchronization for season {season}")
+        
+        # Boxscores and game logs identify teams by abbreviation, so the mapping must be loaded
+        if not self.api.team_code_to_id:
+            self.api.get_teams()
+        
+        plan = self.planner.plan(season, strategy, player_ids, missing_only, rebuild, game_types, game_range)
+        self.logger.info(f"Stats for season {season} will be fetched from {plan.requests} {plan.strategy} requests")
+        if plan.strategy == 'gamelog':
+            self._sync_stats_from_game_logs(season, plan.player_ids, plan.game_types, cancel_token, progress)
+            return
+        games = [{'id': game_id} for game_id in plan.game_ids]
         
         player_stats_to_insert = []
         goalie_stats_to_insert = []
+        written = (set(), set())
+        # A rebuild swaps the whole season in at once, so only then are all rows kept
+        flush = None if rebuild else self._stats_flusher(
+            season, player_stats_to_insert, goalie_stats_to_insert, written)
+        try:
+            if workers and workers > 1:
+                self._transform_boxscores_in_pool(games, season, workers, player_stats_to_insert,
+                                                  goalie_stats_to_insert, cancel_token, progress, flush)
+            else:
+                # For each game, get boxscore and extract stats
+                for game_index, game in enumerate(_progress_bar(games, desc="Fetching game stats")):
+                    self._checkpoint(cancel_token)
+                    self._report(progress, 'games', game_index, len(games))
+                    raw = self.api.get_game_boxscore_raw(game['id'])
+                    if raw is None:
+                        continue
+                    player_rows, goalie_rows = transform_boxscore_payloads(
+                        [(game['id'], raw)], int(season), self.api.team_code_to_id)
+                    player_stats_to_insert.extend(player_rows)
+                    goalie_stats_to_insert.extend(goalie_rows)
+                    if flush is not None:
+                        flush()
+        except SyncCancelled:
+            if not rebuild:
+                # Keep what was already downloaded; the next run fetches the rest
+                self.logger.warning(f"Stats synchronization for season {season} cancelled, "
+                                    f"writing the stats fetched so far")
+                flush(force=True)
+                self._finish_stats(season, written)
+            raise
+        self._report(progress, 'games', len(games), len(games))
         
-        # For each game, get boxscore and extract stats
-        for game in tqdm(games, desc="Fetching game stats"):
-            game_id = game['id']
-            boxscore = self.api.get_game_boxscore(game_id)
-            
-            # Process home and away teams
-            for team_type in ['home', 'away']:
-                team_data = boxscore['teams'][team_type]
-                team_id = team_data['team']['id']
-                
-                # Process player stats
-                for player_id, player_data in team_data['players'].items():
-                    # Skip non-player entries
-                    if not player_id.startswith('ID'):
+        if rebuild:
+            self._replace_season(season, player_stats_to_insert, goalie_stats_to_insert)
+            self.totals.rebuild(season)
+            return
+        
+        flush(force=True)
+        self._finish_stats(season, written)
+    
+    def _sync_stats_from_game_logs(self, season, player_ids, game_types, cancel_token, progress):
+        """Fetch the players' season game logs concurrently and write their stats."""
+        player_stats_to_insert = []
+        goalie_stats_to_insert = []
+        written = (set(), set())
+        flush = self._stats_flusher(season, player_stats_to_insert, goalie_stats_to_insert, written,
+                                    GAME_LOG_PLAYER_COLUMNS, GAME_LOG_GOALIE_COLUMNS)
+        try:
+            self._fetch_game_logs(season, player_ids, game_types, player_stats_to_insert, goalie_stats_to_insert,
+                                  cancel_token, progress, flush)
+        except SyncCancelled:
+            self.logger.warning(f"Game log synchronization for season {season} cancelled, "
+                                f"writing the stats fetched so far")
+            flush(force=True)
+            self._finish_stats(season, written)
+            raise
+        flush(force=True)
+        self._finish_stats(season, written)
+    
+    def _fetch_game_logs(self, season, player_ids, game_types, player_stats, goalie_stats, cancel_token=None,
+                         progress=None, flush=None):
+        """Download game logs on a thread pool, appending rows to player_stats and goalie_stats.
+        
+        flush, if given, is called after each player's rows are appended.
+        """
+        def fetch(player_id):
+            return [game for game_type in game_types
+                    for game in self.api.get_player_game_log(player_id, season, game_type)]
+        
+        positions = self._player_positions(player_ids)
+        team_code_to_id = dict(self.api.team_code_to_id)
+        
+        with ThreadPoolExecutor(max_workers=GAME_LOG_WORKERS, thread_name_prefix='nhl-gamelog') as pool:
+            futures = {pool.submit(fetch, player_id): player_id
+                       for player_id in player_ids}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    self._checkpoint(cancel_token)
+                    self._report(progress, 'players', done, len(futures))
+                    player_id = futures[future]
+                    try:
+                        player_rows, goalie_rows = game_log_rows(
+                            player_id, int(season), positions.get(player_id), future.result(), team_code_to_id)
+                    except Exception as e:
+                        self.logger.error(f"Error processing game log of player {player_id}: {e}", exc_info=True)
                         continue
-                    
-                    player_id = int(player_id.replace('ID', ''))
-                    stats = player_data.get('stats', {})
-                    
-                    # Process skater stats
-                    if 'skaterStats' in stats:
-                        skater_stats = stats['skaterStats']
-                        player_stat_record = {
-                            'player_id': player_id,
-                            'game_id': game_id,
-                            'team_id': team_id,
-                            'position': player_data.get('position', {}).get('code'),
-                            'goals': skater_stats.get('goals', 0),
-                            'assists': skater_stats.get('assists', 0),
-                            'shots': skater_stats.get('shots', 0),
-                            'hits': skater_stats.get('hits', 0),
-                            'blocked_shots': skater_stats.get('blocked', 0),
-                            'penalty_minutes': skater_stats.get('penaltyMinutes', 0),
-                            'time_on_ice': skater_stats.get('timeOnIce')
-                        }
-                        player_stats_to_insert.append(player_stat_record)
-                    
-                    # Process goalie stats
-                    if 'goalieStats' in stats:
-                        goalie_stats = stats['goalieStats']
-                        save_pct = 0
-                        shots = goalie_stats.get('shots', 0)
-                        if shots > 0:
-                            save_pct = (shots - goalie_stats.get('goals', 0)) / shots
-                            
-                        goalie_stat_record = {
-                            'player_id': player_id,
-                            'game_id': game_id,
-                            'team_id': team_id,
-                            'shots_against': goalie_stats.get('shots', 0),
-                            'saves': goalie_stats.get('saves', 0),
-                            'goals_against': goalie_stats.get('goals', 0),
-                            'time_on_ice': goalie_stats.get('timeOnIce'),
-                            'decision': goalie_stats.get('decision'),
-                            'save_percentage': save_pct
-                        }
-                        goalie_stats_to_insert.append(goalie_stat_record)
-        
-        # Insert or update player stats in database
-        if player_stats_to_insert:
-            rows_affected = self.db.insert_or_update(
-                'player_stats', player_stats_to_insert, ['player_id', 'game_id'])
-            self.logger.info(f"Player stats synchronization completed: {rows_affected} rows affected")
-        else:
+                    player_stats.extend(player_rows)
+                    goalie_stats.extend(goalie_rows)
+                    if flush is not None:
+                        flush()
+            except SyncCancelled:
+                # Downloads already running stop on the API client's cancel token
+                for future in futures:
+                    future.cancel()
+                raise
+    
+    def _player_positions(self, player_ids):
+        """Return the stored position code of each player."""
+        if not player_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(player_ids))
+        try:
+            rows = self.db.execute_query(
+                f"SELECT id, position FROM players WHERE id IN ({placeholders})", tuple(player_ids), fetch=True)
+        except self.db.errors as e:
+            self.logger.warning(f"Could not load player positions: {e}")
+            return {}
+        return {row['id']: row['position'] for row in rows or []}
+    
+    def _stats_flusher(self, season, player_stats, goalie_stats, written,
+                       player_columns=PLAYER_STATS_COLUMNS, goalie_columns=GOALIE_STATS_COLUMNS):
+        """Return flush(force=False), which writes and empties the stat row buffers.
+        
+        Without force the rows are only written once STATS_BATCH_SIZE of them
+        are buffered, which keeps a season's memory use flat. The ids of the
+        players written are added to written, a (skater ids, goalie ids) pair.
+        """
+        def flush(force=False):
+            if len(player_stats) + len(goalie_stats) < (1 if force else STATS_BATCH_SIZE):
+                return
+            self._write_stats(season, player_stats, goalie_stats, player_columns, goalie_columns)
+            written[0].update(row[0] for row in player_stats)
+            written[1].update(row[0] for row in goalie_stats)
+            del player_stats[:]
+            del goalie_stats[:]
+        return flush
+    
+    def _write_stats(self, season, player_stats_to_insert, goalie_stats_to_insert,
+                     player_columns=PLAYER_STATS_COLUMNS, goalie_columns=GOALIE_STATS_COLUMNS):
+        """Upsert stat rows.
+        
+        Each game's skater and goalie lines are committed together (see
+        lib.batch); the bulk loader writes each table on its own.
+        """
+        if self.bulk_load:
+            for table, columns, rows in (('player_stats', player_columns, player_stats_to_insert),
+                                         ('goalie_stats', goalie_columns, goalie_stats_to_insert)):
+                if rows:
+                    rows_affected = self._write_rows(table, columns, rows, STATS_KEY_FIELDS)
+                    self.logger.info(f"{table} synchronization completed: {rows_affected} rows affected")
+        elif player_stats_to_insert or goalie_stats_to_insert:
+            units = group_units('game_id', (('player_stats', player_columns, player_stats_to_insert),
+                                            ('goalie_stats', goalie_columns, goalie_stats_to_insert)))
+            rows_affected = self._write_units(units, STATS_KEY_FIELDS)
+            self.logger.info(f"Stats synchronization completed: {rows_affected} rows affected "
+                             f"for {len(units)} games")
+    
+    def _finish_stats(self, season, written):
+        """Refresh the season totals of the players written, a (skater ids, goalie ids) pair."""
+        player_ids, goalie_ids = written
+        if not player_ids:
             self.logger.warning(f"No player stats to synchronize for season {season}")
+        if not goalie_ids:
+            self.logger.warning(f"No goalie stats to synchronize for season {season}")
+        self._refresh_totals(season, player_ids, goalie_ids)
+    
+    def rebuild_season_totals(self, season=None):
+        """Rebuild the season totals tables for one season, or all of them."""
+        self.logger.info(f"Rebuilding season totals for {season or 'all seasons'}")
+        self.totals.rebuild(season)
+    
+    def _refresh_totals(self, season, player_ids, goalie_ids):
+        """Update the season totals of the skaters and goalies touched by a stats write."""
+        if not player_ids and not goalie_ids:
+            return
+        if self._writer is not None:
+            # The totals are computed from the stats tables, so write them first
+            self._writer.flush()
+        try:
+            self.totals.refresh('player_stats', season, player_ids)
+            self.totals.refresh('goalie_stats', season, goalie_ids)
+        except Exception as e:
+            # Stats are already stored; a full rebuild repairs the totals later
+            self.logger.error(f"Error refreshing season totals for {season}: {e}", exc_info=True)
+    
+    def _replace_season(self, season, player_stats, goalie_stats):
+        """Swap freshly loaded stats in as the season's partitions."""
+        if not player_stats and not goalie_stats:
+            # Never swap an empty partition over existing data
+            self.logger.warning(f"No stats fetched for season {season}, keeping the current data")
+            return
+        
+        for table, columns, rows in (('player_stats', PLAYER_STATS_COLUMNS, player_stats),
+                                     ('goalie_stats', GOALIE_STATS_COLUMNS, goalie_stats)):
+            self.db.replace_season_partition(table, season, columns, rows, STATS_KEY_FIELDS,
+                                             bulk=self.bulk_load)
+            # The season's rows were deleted and loaded afresh
+            self._notify_write(table, columns, rows, len(rows), 0)
+            self.logger.info(f"Rebuilt {table} for season {season}: {len(rows)} rows")
+    
+    def _transform_boxscores_in_pool(self, games, season, workers, player_stats, goalie_stats,
+                                     cancel_token=None, progress=None, flush=None):
+        """Download boxscores and transform them in a process pool.
+        
+        Raw payloads are shipped to the workers in batches and come back as
+        row tuples, which are appended to player_stats and goalie_stats
+        (flush, if given, is called after each batch is appended).
+        The number of batches in flight is bounded so raw bytes do not pile
+        up when downloads outpace the workers.
+        """
+        team_code_to_id = dict(self.api.team_code_to_id)
+        pending = deque()
+        batch = []
         
-        # Insert or update goalie stats in database
-        if goalie_stats_to_insert:
-            rows_affected = self.db.insert_or_update(
-                'goalie_stats', goalie_stats_to_insert, ['player_id', 'game_id'])
-            self.logger.info(f"Goalie stats synchronization completed: {rows_affected} rows affected")
+        def collect(future):
+            player_rows, goalie_rows = future.result()
+            player_stats.extend(player_rows)
+            goalie_stats.extend(goalie_rows)
+            if flush is not None:
+                flush()
+        
+        self.logger.info(f"Transforming boxscores with {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for game_index, game in enumerate(_progress_bar(games, desc="Fetching game stats")):
+                if cancel_token is not None and cancel_token.cancelled:
+                    # Keep what was already downloaded
+                    if batch:
+                        pending.append(pool.submit(transform_boxscore_payloads, batch, int(season), team_code_to_id))
+                    while pending:
+                        collect(pending.popleft())
+                    raise SyncCancelled()
+                self._report(progress, 'games', game_index, len(games))
+                raw = self.api.get_game_boxscore_raw(game['id'])
+                if raw is None:
+                    continue
+                batch.append((game['id'], raw))
+                
+                if len(batch) >= TRANSFORM_BATCH_SIZE:
+                    pending.append(pool.submit(transform_boxscore_payloads, batch, int(season), team_code_to_id))
+                    batch = []
+                    while len(pending) > workers * 2:
+                        collect(pending.popleft())
+            
+            if batch:
+                pending.append(pool.submit(transform_boxscore_payloads, batch, int(season), team_code_to_id))
+            while pending:
+                collect(pending.popleft())
+    
+    def sync_events(self, season, cancel_token=None, progress=None, game_range=None):
+        """Synchronize play-by-play events for completed games of a season.
+        
+        Only games without events are fetched, optionally only those in the
+        game_range (first id, last id). Events are streamed into batched
+        writes; a batch always holds whole games so a game is never left
+        half written.
+        """
+        with self._recording('events', season), self._cancellable(cancel_token):
+            self._sync_events(season, cancel_token, progress, game_range)
+    
+    def _sync_events(self, season, cancel_token, progress, game_range=None):
+        """Fetch and write the play-by-play events of one season."""
+        self.logger.info(f"Starting play-by-play synchronization for season {season}")
+        
+        # Events identify teams by the league's ids, mapped through abbreviations
+        if not self.api.team_code_to_id:
+            self.api.get_teams()
+        
+        placeholders = ', '.join(['%s'] * len(COMPLETED_GAME_STATES))
+        range_filter = "AND id BETWEEN %s AND %s" if game_range else ""
+        games_query = f"""
+            SELECT id FROM games
+            WHERE season = %s
+            AND status IN ({placeholders})
+            {range_filter}
+            AND NOT EXISTS (
+                SELECT 1 FROM game_events
+                WHERE game_events.season = %s AND game_events.game_id = games.id
+            )
+            ORDER BY id
+        """
+        games = self.db.execute_query(
+            games_query, (season, *COMPLETED_GAME_STATES, *(game_range or ()), int(season)), fetch=True)
+        
+        events = []
+        total_events = 0
+        try:
+            for game_index, game in enumerate(_progress_bar(games, desc="Fetching play-by-play")):
+                self._checkpoint(cancel_token)
+                self._report(progress, 'games', game_index, len(games))
+                events.extend(self.api.get_play_by_play(game['id'], season))
+                if len(events) >= EVENT_BATCH_SIZE:
+                    total_events += len(events)
+                    self._write_rows('game_events', GAME_EVENT_COLUMNS, events, ['season', 'game_id', 'event_idx'])
+                    events = []
+        except SyncCancelled:
+            if events:
+                # The buffer only holds whole games, so it is safe to keep
+                self._write_rows('game_events', GAME_EVENT_COLUMNS, events, ['season', 'game_id', 'event_idx'])
+            raise
+        
+        if events:
+            total_events += len(events)
+            self._write_rows('game_events', GAME_EVENT_COLUMNS, events, ['season', 'game_id', 'event_idx'])
+        self._report(progress, 'games', len(games), len(games))
+        
+        if total_events:
+            self.logger.info(f"Play-by-play synchronization completed: {total_events} events from {len(games)} games")
         else:
-            self.logger.warning(f"No goalie stats to synchronize for season {season}")
+            self.logger.warning(f"No play-by-play events to synchronize for season {season}")
+    
+    def sync_seasons(self, seasons, workers=4, include_games=True, include_stats=True,
+                     should_continue=None, include_events=False, rebuild=False,
+                     cancel_token=None, progress=None, stats_strategy='auto', game_types=None):
+        """Synchronize games, stats and/or events for several seasons concurrently.
+        
+        Each season is fetched on its own worker thread while all rows are
+        funneled into one shared batch writer, so commits stay serialized.
+        should_continue is an optional callable checked before each season
+        starts; returning False skips the seasons that have not started yet.
+        rebuild and stats_strategy are passed on to sync_stats, game_types to
+        sync_games and sync_stats. progress reports finished seasons.
+        """
+        with self._recording('seasons'), self._cancellable(cancel_token):
+            self._sync_seasons(seasons, workers, include_games, include_stats, should_continue,
+                               include_events, rebuild, cancel_token, progress, stats_strategy, game_types)
+    
+    def _sync_seasons(self, seasons, workers, include_games, include_stats, should_continue,
+                      include_events, rebuild, cancel_token, progress, stats_strategy='auto',
+                      game_types=None):
+        """Run the season workers around one shared batch writer."""
+        seasons = list(seasons)
+        workers = max(1, min(workers, len(seasons)))
+        self.logger.info(f"Starting synchronization of {len(seasons)} seasons with {workers} workers")
+        
+        run = getattr(self._local, 'run', None)
+        writer = BatchWriter(self._write_rows_direct, unit_func=self._write_units_direct)
+        self._writer_run = run
+        self._writer = writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nhl-season') as pool:
+                futures = {
+                    pool.submit(self._sync_season, season, include_games, include_stats,
+                                include_events, should_continue, rebuild, cancel_token, run,
+                                stats_strategy, game_types): season
+                    for season in seasons
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    season = futures[future]
+                    try:
+                        future.result()
+                    except SyncCancelled:
+                        pass  # Raised below once every season thread has stopped
+                    except Exception as e:
+                        self.logger.error(f"Error synchronizing season {season}: {e}", exc_info=True)
+                    self._report(progress, 'seasons', done, len(seasons))
+        finally:
+            self._writer = None
+            writer.close()
+            self._writer_run = None
+        
+        for table, rows_affected in writer.rows_affected.items():
+            self.logger.info(f"{table}: {rows_affected} rows affected")
+        if writer.errors:
+            # Rows were dropped, so the run must not be recorded as done
+            self.logger.error(f"Season synchronization finished with {len(writer.errors)} failed writes")
+            raise writer.errors[0]
+        self._checkpoint(cancel_token)
+        self.logger.info(f"Synchronization of {len(seasons)} seasons completed")
+    
+    def _sync_season(self, season, include_games, include_stats, include_events, should_continue,
+                     rebuild=False, cancel_token=None, run=None, stats_strategy='auto', game_types=None):
+        """Synchronize one season on a sync_seasons worker thread."""
+        # Count this season towards the sync_seasons run instead of recording its own
+        with self._joined(run):
+            self._sync_season_steps(season, include_games, include_stats, include_events,
+                                    should_continue, rebuild, cancel_token, stats_strategy, game_types)
+    
+    def _sync_season_steps(self, season, include_games, include_stats, include_events, should_continue,
+                           rebuild, cancel_token, stats_strategy='auto', game_types=None):
+        """Run the games, stats and events steps of one season."""
+        if should_continue is not None and not should_continue():
+            self.logger.info(f"Skipping season {season}: synchronization stopped")
+            return
+        self._checkpoint(cancel_token)
+        # Do not start fetching a season once the writer has stopped storing rows
+        self._writer.raise_if_failed()
+        if include_games:
+            self.sync_games(season, cancel_token=cancel_token, game_types=game_types)
+            if include_stats or include_events:
+                # Stats and events read the completed games back from the database
+                self._writer.flush()
+        if include_stats:
+            self.sync_stats(season, rebuild=rebuild, cancel_token=cancel_token, strategy=stats_strategy,
+                            game_types=game_types)
+        if include_events:
+            self.sync_events(season, cancel_token=cancel_token)
+    
+    @contextmanager
+    def _recording(self, job_type, season=None):
+        """Record the enclosed sync as one row of sync_runs.
+        
+        A sync called from inside another one (e.g. sync_stats from
+        sync_seasons) counts towards the outer run instead.
+        """
+        if getattr(self._local, 'run', None) is not None:
+            yield
+            return
+        run = SyncRun(job_type, season, self.api)
+        error_counter = ErrorCounter(run)
+        root_logger = logging.getLogger('nhl_sync')
+        root_logger.addHandler(error_counter)
+        status = 'failed'
+        try:
+            with self._joined(run):
+                # Writes spooled by an earlier run go in before this run's
+                self.replay_spool()
+                yield
+            status = 'done'
+        except SyncCancelled:
+            status = 'cancelled'
+            raise
+        finally:
+            root_logger.removeHandler(error_counter)
+            run.finish(status)
+            self.runs.record(run)
+            self.logger.info(f"{job_type} sync {status} in {run.duration_seconds}s: "
+                             f"{run.requests} requests, {run.bytes_downloaded} bytes, "
+                             f"{run.rows_inserted} inserted, {run.rows_updated} updated, "
+                             f"{run.rows_unchanged} unchanged, {run.errors} errors")
+    
+    @contextmanager
+    def _joined(self, run):
+        """Attribute the writes and errors of the current thread to run."""
+        if run is None:
+            yield
+            return
+        run.threads.add(threading.get_ident())
+        self._local.run = run
+        try:
+            yield
+        finally:
+            self._local.run = None
+    
+    @contextmanager
+    def _cancellable(self, cancel_token):
+        """Let the API client abandon in-flight requests while cancel_token is in use."""
+        if cancel_token is None:
+            yield
+            return
+        previous = self.api.cancel_token
+        self.api.cancel_token = cancel_token
+        try:
+            yield
+        finally:
+            self.api.cancel_token = previous
+    
+    def _checkpoint(self, cancel_token):
+        """Stop the running sync if it has been cancelled."""
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+    
+    def _report(self, progress, unit, done, total):
+        """Pass progress on to the caller's callback."""
+        if progress is None:
+            return
+        try:
+            progress(unit, done, total)
+        except Exception as e:
+            self.logger.error(f"Progress callback failed: {e}", exc_info=True)
+    
+    def add_write_listener(self, listener):
+        """Register a callable notified as listener(table, columns, rows) after rows are written."""
+        self._write_listeners.append(listener)
+    
+    def _notify_write(self, table, columns, rows, rows_affected=None, existing_rows=None):
+        """Count written rows (existing_rows of them stored before) towards the current run and tell the write listeners."""
+        run = getattr(self._local, 'run', None) or self._writer_run
+        if run is not None:
+            run.add_rows(len(rows), rows_affected, existing_rows, self.db.backend.affected_per_update)
+        for listener in self._write_listeners:
+            try:
+                listener(table, columns, rows)
+            except Exception as e:
+                self.logger.error(f"Write listener failed for {table}: {e}", exc_info=True)
+    
+    def _notify_records(self, table, records, rows_affected=None, existing_rows=None):
+        """Notify the write listeners about record dicts."""
+        if records:
+            columns = list(records[0].keys())
+            self._notify_write(table, columns, [tuple(record.get(column) for column in columns) for record in records],
+                               rows_affected, existing_rows)
+    
+    def _write_rows(self, table, columns, rows, key_fields):
+        """Write row tuples using the configured write mode.
+        
+        While sync_seasons is running the rows go to the shared writer.
+        """
+        if self._writer is not None:
+            return self._writer.submit(table, columns, rows, key_fields)
+        return self._write_rows_direct(table, columns, rows, key_fields)
+    
+    def _write_rows_direct(self, table, columns, rows, key_fields):
+        """Write row tuples to the database immediately (or to the spool)."""
+        record = {'kind': 'rows', 'table': table, 'columns': list(columns), 'rows': rows,
+                  'key_fields': list(key_fields)}
+        return self._spooled(record, lambda: self._insert_rows(table, columns, rows, key_fields))
+    
+    def _insert_rows(self, table, columns, rows, key_fields):
+        """Write row tuples to the database."""
+        existing_rows = self.db.count_existing(table, columns, rows, key_fields)
+        if self.bulk_load:
+            rows_affected = self.db.bulk_load(table, columns, rows, key_fields)
+        else:
+            rows_affected = self.db.insert_rows(table, columns, rows, key_fields)
+        self._notify_write(table, columns, rows, rows_affected, existing_rows)
+        return rows_affected
+    
+    def _write_units(self, units, key_fields):
+        """Write units of related rows (see lib.batch) using the configured write mode.
+        
+        While sync_seasons is running the units go to the shared writer.
+        """
+        if self._writer is not None:
+            return self._writer.submit_units(units, key_fields)
+        return self._write_units_direct(units, key_fields).rows_affected
+    
+    def _write_units_direct(self, units, key_fields):
+        """Commit units of related rows to the database immediately (or to the spool)."""
+        record = {'kind': 'units', 'units': units, 'key_fields': list(key_fields)}
+        result = self._spooled(record, lambda: self._commit_units(units, key_fields))
+        return result if result is not None else UnitResult()
+    
+    def _commit_units(self, units, key_fields):
+        """Commit units of related rows to the database."""
+        result = self.batches.write_units(units, key_fields, on_commit=self._notify_write)
+        if result.failed:
+            self.logger.warning(f"Skipped {len(result.failed)} units that could not be written")
+        return result
+    
+    def _write_records(self, table, records, key_fields):
+        """Write record dicts using the configured write mode."""
+        if self.bulk_load or self._writer is not None:
+            columns = list(records[0].keys())
+            rows = [tuple(record.get(column) for column in columns) for record in records]
+            return self._write_rows(table, columns, rows, key_fields)
+        return self._upsert_records(table, records, key_fields)
+    
+    def _upsert_records(self, table, records, key_fields):
+        """Upsert record dicts immediately (or to the spool)."""
+        record = {'kind': 'records', 'table': table, 'records': records, 'key_fields': list(key_fields)}
+        return self._spooled(record, lambda: self._insert_records(table, records, key_fields))
+    
+    def _insert_records(self, table, records, key_fields):
+        """Upsert record dicts in the database."""
+        columns = list(records[0].keys()) if records else []
+        existing_rows = self.db.count_existing(
+            table, columns, [tuple(record.get(column) for column in columns) for record in records], key_fields)
+        rows_affected = self.db.insert_or_update(table, records, key_fields)
+        self._notify_records(table, records, rows_affected, existing_rows)
+        return rows_affected
+    
+    def _spooled(self, record, write):
+        """Run write(), or append record to the spool while the database is unavailable.
+        
+        Once anything is spooled, later writes are spooled behind it until
+        the spool has been replayed, so older rows never overwrite newer
+        ones. Returns write()'s result, or None if the record was spooled.
+        """
+        if self.spool is None:
+            return write()
+        if not self.spool.pending() or self.replay_spool():
+            try:
+                return write()
+            except DatabaseUnavailable as e:
+                self.logger.warning(f"Database unavailable, spooling writes to {self.spool.path}: {e}")
+        self.spool.append(record)
+        return None
+    
+    def replay_spool(self, force=False):
+        """Write spooled records to the database; returns True once the spool is empty.
+        
+        Attempts are spaced by the spool's retry interval unless force is
+        set. The season totals of replayed stats are refreshed afterwards.
+        """
+        if self.spool is None or not self.spool.pending():
+            return True
+        touched = {}
+        
+        def apply(record):
+            self._replay_record(record, touched)
+        
+        drained = self.spool.replay(apply, force=force)
+        for (table, season), player_ids in touched.items():
+            try:
+                self.totals.refresh(table, season, player_ids)
+            except Exception as e:
+                self.logger.error(f"Error refreshing {table} season totals for {season}: {e}", exc_info=True)
+        return drained
+    
+    def _replay_record(self, record, touched):
+        """Write one spooled record, noting the (stats table, season) players it touched."""
+        key_fields = record['key_fields']
+        if record['kind'] == 'records':
+            self._insert_records(record['table'], record['records'], key_fields)
+            return
+        if record['kind'] == 'rows':
+            tables = [(record['table'], record['columns'], [tuple(row) for row in record['rows']])]
+            self._insert_rows(*tables[0], key_fields)
+        else:
+            units = [(key, {table: (columns, [tuple(row) for row in rows])
+                            for table, (columns, rows) in unit.items()})
+                     for key, unit in record['units']]
+            self._commit_units(units, key_fields)
+            tables = [(table, columns, rows) for _, unit in units for table, (columns, rows) in unit.items()]
+        for table, columns, rows in tables:
+            if table in ('player_stats', 'goalie_stats'):
+                season, player = columns.index('season'), columns.index('player_id')
+                for row in rows:
+                    touched.setdefault((table, row[season]), set()).add(row[player])
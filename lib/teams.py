@@ -0,0 +1,128 @@
+"""
+Team identity registry for NHL MySQL Sync.
+Maps team abbreviations to stable team ids, persisted in the team_identity table.
+"""
+
+import logging
+import threading
+import zlib
+
+# Known franchises as (id, abbreviation, name); the ids every install starts from
+SEED_TEAMS = [
+    (1, 'NJD', 'New Jersey Devils'),
+    (2, 'NYI', 'New York Islanders'),
+    (3, 'NYR', 'New York Rangers'),
+    (4, 'PHI', 'Philadelphia Flyers'),
+    (5, 'PIT', 'Pittsburgh Penguins'),
+    (6, 'BOS', 'Boston Bruins'),
+    (7, 'BUF', 'Buffalo Sabres'),
+    (8, 'MTL', 'Montreal Canadiens'),
+    (9, 'OTT', 'Ottawa Senators'),
+    (10, 'TOR', 'Toronto Maple Leafs'),
+    (12, 'CAR', 'Carolina Hurricanes'),
+    (13, 'FLA', 'Florida Panthers'),
+    (14, 'TBL', 'Tampa Bay Lightning'),
+    (15, 'WSH', 'Washington Capitals'),
+    (16, 'CHI', 'Chicago Blackhawks'),
+    (17, 'DET', 'Detroit Red Wings'),
+    (18, 'NSH', 'Nashville Predators'),
+    (19, 'STL', 'St. Louis Blues'),
+    (20, 'CGY', 'Calgary Flames'),
+    (21, 'COL', 'Colorado Avalanche'),
+    (22, 'EDM', 'Edmonton Oilers'),
+    (23, 'VAN', 'Vancouver Canucks'),
+    (24, 'ANA', 'Anaheim Ducks'),
+    (25, 'DAL', 'Dallas Stars'),
+    (26, 'LAK', 'Los Angeles Kings'),
+    (28, 'SJS', 'San Jose Sharks'),
+    (29, 'CBJ', 'Columbus Blue Jackets'),
+    (30, 'MIN', 'Minnesota Wild'),
+    (52, 'WPG', 'Winnipeg Jets'),
+    (53, 'ARI', 'Arizona Coyotes'),
+    (54, 'VGK', 'Vegas Golden Knights'),
+    (55, 'SEA', 'Seattle Kraken'),
+    (56, 'UTA', 'Utah Hockey Club'),
+]
+
+# Ids given to abbreviations outside the seed list start here
+FALLBACK_ID_BASE = 1000
+
+
+def fallback_team_id(abbreviation):
+    """Return the preferred id of an unseeded abbreviation, the same in every process."""
+    return zlib.crc32(abbreviation.encode('utf-8')) % 1000 + FALLBACK_ID_BASE
+
+
+class TeamRegistry:
+    """Authoritative abbreviation -> team id mapping.
+
+    Starts from SEED_TEAMS and the team_identity table. An abbreviation
+    seen for the first time gets the id the API reports, or else its
+    fallback_team_id (moved to the next free id on a collision), and is
+    stored right away so every process and every later run agrees on it.
+    Works from the seed list alone when there is no database; when the
+    database is configured but unreachable, DatabaseUnavailable is raised
+    rather than handing out ids other processes may not agree on.
+    """
+
+    def __init__(self, db_manager=None):
+        """Initialize with the database manager holding team_identity (optional)."""
+        self.db = db_manager
+        self.logger = logging.getLogger('nhl_sync.teams')
+        self._ids = {abbreviation: team_id for team_id, abbreviation, _ in SEED_TEAMS}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Refresh the mapping from the team_identity table; returns self."""
+        if self.db is None:
+            return self
+        try:
+            rows = self.db.execute_query("SELECT abbreviation, team_id FROM team_identity", fetch=True)
+        except self.db.errors as e:
+            self.logger.warning(f"Could not load team identities, using the built-in list: {e}")
+            return self
+        with self._lock:
+            self._ids.update((row['abbreviation'], row['team_id']) for row in rows or [])
+        return self
+
+    def team_id(self, abbreviation, name=None, api_id=None):
+        """Return the id of a team abbreviation, registering it if it is new."""
+        with self._lock:
+            team_id = self._ids.get(abbreviation)
+            if team_id is not None:
+                return team_id
+            taken = set(self._ids.values())
+            team_id = api_id or fallback_team_id(abbreviation)
+            while team_id in taken:
+                team_id += 1
+            self._ids[abbreviation] = team_id
+        try:
+            return self._register(abbreviation, team_id, name)
+        except Exception:
+            # Not stored, so not settled yet; the next lookup registers it again
+            with self._lock:
+                self._ids.pop(abbreviation, None)
+            raise
+
+    def _register(self, abbreviation, team_id, name):
+        """Store a new identity; returns the id that ended up stored for the abbreviation."""
+        self.logger.info(f"Registering team {abbreviation} with id {team_id}")
+        if self.db is None:
+            return team_id
+        try:
+            # Another process may have registered the abbreviation first; its id wins
+            self.db.execute_query(
+                self.db.backend.insert_ignore_sql('team_identity', ('abbreviation', 'team_id', 'name')),
+                (abbreviation, team_id, name))
+            rows = self.db.execute_query(
+                "SELECT team_id FROM team_identity WHERE abbreviation = %s", (abbreviation,), fetch=True)
+        except self.db.errors as e:
+            self.logger.warning(f"Could not store the identity of team {abbreviation}: {e}")
+            return team_id
+        if not rows:
+            self.logger.warning(f"Team id {team_id} of {abbreviation} is already stored for another team")
+        elif rows[0]['team_id'] != team_id:
+            team_id = rows[0]['team_id']
+            with self._lock:
+                self._ids[abbreviation] = team_id
+        return team_id
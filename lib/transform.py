@@ -0,0 +1,211 @@
+"""
+Transform functions for NHL MySQL Sync.
+Turns raw NHL API payloads into compact row tuples ready for the database.
+
+These functions are module-level and only depend on their arguments so they
+can run inside worker processes.
+"""
+
+import json
+
+# Column order of the row tuples produced for each stats table
+PLAYER_STATS_COLUMNS = (
+    'player_id', 'game_id', 'season', 'team_id', 'position', 'goals', 'assists', 'shots',
+    'hits', 'blocked_shots', 'penalty_minutes', 'time_on_ice'
+)
+GOALIE_STATS_COLUMNS = (
+    'player_id', 'game_id', 'season', 'team_id', 'shots_against', 'saves', 'goals_against',
+    'time_on_ice', 'decision', 'save_percentage'
+)
+STATS_KEY_FIELDS = ('player_id', 'game_id', 'season')
+
+# Columns a player game log can fill; it has no hits or blocked shots, so those
+# keep their stored (boxscore) values when game log rows are upserted
+GAME_LOG_PLAYER_COLUMNS = (
+    'player_id', 'game_id', 'season', 'team_id', 'position', 'goals', 'assists', 'shots',
+    'penalty_minutes', 'time_on_ice'
+)
+GAME_LOG_GOALIE_COLUMNS = GOALIE_STATS_COLUMNS
+
+
+def _iter_team_players(team_stats):
+    """Yield player entries from a boxscore team block.
+
+    The API returns either a flat list or a dict of position groups
+    (forwards, defense, goalies).
+    """
+    if isinstance(team_stats, list):
+        yield from team_stats
+    elif isinstance(team_stats, dict):
+        for group in team_stats.values():
+            if isinstance(group, list):
+                yield from group
+
+
+def boxscore_rows(game_id, season, boxscore, team_code_to_id):
+    """Extract skater and goalie row tuples from a decoded boxscore."""
+    player_rows = []
+    goalie_rows = []
+
+    player_stats = boxscore.get('playerByGameStats', {})
+    for stats_key in ('homeTeam', 'awayTeam'):
+        team_id = team_code_to_id.get(boxscore.get(stats_key, {}).get('abbrev'))
+
+        for player in _iter_team_players(player_stats.get(stats_key)):
+            player_id = player.get('playerId')
+            if not player_id:
+                continue
+
+            position = player.get('positionCode', player.get('position'))
+            if position == 'G':
+                shots = player.get('shotsAgainst', 0) or 0
+                goals = player.get('goalsAgainst', 0) or 0
+                save_pct = (shots - goals) / shots if shots > 0 else 0
+                goalie_rows.append((
+                    player_id, game_id, season, team_id, shots, player.get('saves', 0), goals,
+                    player.get('toi'), player.get('decision'), save_pct
+                ))
+            else:
+                player_rows.append((
+                    player_id, game_id, season, team_id, position,
+                    player.get('goals', 0), player.get('assists', 0),
+                    player.get('shots', player.get('sog', 0)), player.get('hits', 0),
+                    player.get('blockedShots', 0), player.get('pim', 0), player.get('toi')
+                ))
+
+    return player_rows, goalie_rows
+
+
+def game_log_rows(player_id, season, position, game_log, team_code_to_id):
+    """Extract skater or goalie row tuples from a player's decoded game log entries.
+
+    Skater rows follow GAME_LOG_PLAYER_COLUMNS and goalie rows
+    GAME_LOG_GOALIE_COLUMNS. Goalie entries are told apart by their
+    shotsAgainst field.
+    """
+    player_rows = []
+    goalie_rows = []
+    for game in game_log:
+        game_id = game.get('gameId')
+        if not game_id:
+            continue
+        team_id = team_code_to_id.get(game.get('teamAbbrev'))
+        if 'shotsAgainst' in game or position == 'G':
+            shots = game.get('shotsAgainst', 0) or 0
+            goals = game.get('goalsAgainst', 0) or 0
+            save_pct = (shots - goals) / shots if shots > 0 else 0
+            goalie_rows.append((
+                player_id, game_id, season, team_id, shots, shots - goals, goals,
+                game.get('toi'), game.get('decision'), save_pct
+            ))
+        else:
+            player_rows.append((
+                player_id, game_id, season, team_id, position,
+                game.get('goals', 0), game.get('assists', 0), game.get('shots', 0),
+                game.get('pim', 0), game.get('toi')
+            ))
+    return player_rows, goalie_rows
+
+
+def transform_boxscore_payloads(payloads, season, team_code_to_id):
+    """Decode a batch of (game_id, raw_bytes) boxscores into row tuples.
+
+    Returns a (player_rows, goalie_rows) pair covering the whole batch.
+    Payloads that fail to decode are skipped.
+    """
+    player_rows = []
+    goalie_rows = []
+    for game_id, raw in payloads:
+        try:
+            boxscore = json.loads(raw)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(boxscore, dict):
+            continue
+        game_players, game_goalies = boxscore_rows(game_id, season, boxscore, team_code_to_id)
+        player_rows.extend(game_players)
+        goalie_rows.extend(game_goalies)
+    return player_rows, goalie_rows
+
+
+# Play-by-play event types stored as small integers in game_events.event_type
+EVENT_TYPE_CODES = {
+    'faceoff': 1,
+    'hit': 2,
+    'giveaway': 3,
+    'takeaway': 4,
+    'shot-on-goal': 5,
+    'missed-shot': 6,
+    'blocked-shot': 7,
+    'goal': 8,
+    'penalty': 9,
+    'delayed-penalty': 10,
+    'stoppage': 11,
+    'period-start': 12,
+    'period-end': 13,
+    'game-end': 14,
+    'shootout-complete': 15,
+    'failed-shot-attempt': 16,
+    'game-official': 17,
+}
+UNKNOWN_EVENT_TYPE = 0
+
+# Detail fields holding the (up to three) players involved, in slot order
+EVENT_PLAYER_FIELDS = {
+    'faceoff': ('winningPlayerId', 'losingPlayerId'),
+    'hit': ('hittingPlayerId', 'hitteePlayerId'),
+    'giveaway': ('playerId',),
+    'takeaway': ('playerId',),
+    'shot-on-goal': ('shootingPlayerId', 'goalieInNetId'),
+    'missed-shot': ('shootingPlayerId', 'goalieInNetId'),
+    'failed-shot-attempt': ('shootingPlayerId', 'goalieInNetId'),
+    'blocked-shot': ('shootingPlayerId', 'blockingPlayerId'),
+    'goal': ('scoringPlayerId', 'assist1PlayerId', 'assist2PlayerId'),
+    'penalty': ('committedByPlayerId', 'drawnByPlayerId', 'servedByPlayerId'),
+}
+
+GAME_EVENT_COLUMNS = (
+    'season', 'game_id', 'event_idx', 'event_id', 'event_type', 'period', 'period_seconds',
+    'x_coord', 'y_coord', 'team_id', 'player1_id', 'player2_id', 'player3_id'
+)
+
+
+def _clock_seconds(clock):
+    """Convert an 'MM:SS' clock to seconds."""
+    try:
+        minutes, seconds = clock.split(':')
+        return int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+def play_by_play_rows(game_id, season, play_by_play, team_code_to_id):
+    """Yield compact game_events row tuples from a decoded play-by-play payload."""
+    # Events reference the league's own team ids; map them to ours via abbreviation
+    team_ids = {}
+    for side in ('homeTeam', 'awayTeam'):
+        team = play_by_play.get(side) or {}
+        if team.get('id') is not None:
+            team_ids[team['id']] = team_code_to_id.get(team.get('abbrev'))
+
+    for event_idx, play in enumerate(play_by_play.get('plays') or []):
+        type_key = play.get('typeDescKey')
+        details = play.get('details') or {}
+        players = [details.get(field) for field in EVENT_PLAYER_FIELDS.get(type_key, ())]
+        players += [None] * (3 - len(players))
+
+        yield (
+            season,
+            game_id,
+            event_idx,
+            play.get('eventId'),
+            EVENT_TYPE_CODES.get(type_key, UNKNOWN_EVENT_TYPE),
+            (play.get('periodDescriptor') or {}).get('number', 0),
+            _clock_seconds(play.get('timeInPeriod')),
+            details.get('xCoord'),
+            details.get('yCoord'),
+            team_ids.get(details.get('eventOwnerTeamId')),
+            players[0],
+            players[1],
+            players[2],
+        )
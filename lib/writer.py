@@ -0,0 +1,190 @@
+"""
+Shared batch writer for NHL MySQL Sync.
+Funnels rows from many fetch threads into a single database writer thread.
+"""
+
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+# Marker put on the queue to stop the writer thread
+_STOP = object()
+# Tag of queue items holding units for unit_func
+_UNITS = object()
+
+
+class BatchWriter:
+    """Serializes database writes from concurrent producers.
+
+    Producers call submit() with row tuples; a single background thread
+    buffers them per table and writes them in batches through write_func.
+    Because only one thread ever writes, commits never interleave and
+    concurrent seasons cannot deadlock each other on the unique keys.
+
+    A failed write (including a full spool or an unreachable database) is
+    fatal: it is raised again to every producer by its next submit() or
+    flush(), so no producer keeps fetching rows that would not be stored.
+    """
+
+    def __init__(self, write_func, batch_size=5000, flush_interval=1.0, max_pending=100,
+                 unit_func=None):
+        """Initialize the writer.
+
+        write_func is called as write_func(table, columns, rows, key_fields).
+        unit_func, if given, is called as unit_func(units, key_fields) with
+        units submitted through submit_units() (see lib.batch).
+        batch_size is the number of buffered rows that triggers a write,
+        flush_interval the idle time (in seconds) after which partial
+        batches are written, and max_pending the number of submitted chunks
+        that may wait in the queue before submit() blocks.
+        """
+        self.write_func = write_func
+        self.unit_func = unit_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger('nhl_sync.writer')
+
+        self.rows_affected = defaultdict(int)
+        self.errors = []
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name='nhl-sync-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def raise_if_failed(self):
+        """Raise the first write error, if a write has failed."""
+        if self.errors:
+            raise self.errors[0]
+
+    def submit(self, table, columns, rows, key_fields):
+        """Queue rows for writing. Blocks while the queue is full; raises once a write has failed."""
+        self.raise_if_failed()
+        if rows:
+            self._queue.put((table, tuple(columns), tuple(key_fields), list(rows)))
+        return len(rows)
+
+    def submit_units(self, units, key_fields):
+        """Queue (key, {table: (columns, rows)}) units for unit_func. Blocks while the queue is full."""
+        self.raise_if_failed()
+        if units:
+            self._queue.put((_UNITS, tuple(key_fields), list(units)))
+        return sum(len(rows) for _, unit in units for _, rows in unit.values())
+
+    def flush(self):
+        """Block until every row this thread submitted so far has been written.
+
+        Rows submitted by other producers after this call are not waited for.
+        """
+        self.raise_if_failed()
+        flushed = _Flush()
+        self._queue.put(flushed)
+        flushed.wait()
+        self.raise_if_failed()
+
+    def close(self):
+        """Write any remaining rows and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._queue.join()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        """Writer loop: buffer rows per target and write them in batches."""
+        buffers = defaultdict(list)
+        pending_items = defaultdict(int)
+
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._write_all(buffers, pending_items)
+                continue
+
+            if isinstance(item, _Flush) or item is _STOP:
+                # Everything queued before the marker is in the buffers now
+                self._write_all(buffers, pending_items)
+                self._queue.task_done()
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+
+            if item[0] is _UNITS:
+                _, key_fields, units = item
+                target = (_UNITS, key_fields)
+                buffers[target].extend(units)
+                pending_items[target] += 1
+                if sum(len(rows) for _, unit in buffers[target] for _, rows in unit.values()) >= self.batch_size:
+                    self._write(target, buffers, pending_items)
+                continue
+
+            table, columns, key_fields, rows = item
+            target = (table, columns, key_fields)
+            buffers[target].extend(rows)
+            pending_items[target] += 1
+            if len(buffers[target]) >= self.batch_size:
+                self._write(target, buffers, pending_items)
+
+    def _write_all(self, buffers, pending_items):
+        """Write every non-empty buffer."""
+        for target in list(buffers):
+            self._write(target, buffers, pending_items)
+
+    def _write(self, target, buffers, pending_items):
+        """Write one buffer and mark its queue items as done."""
+        if target[0] is _UNITS:
+            self._write_units(target, buffers, pending_items)
+            return
+        table, columns, key_fields = target
+        rows = buffers.pop(target, [])
+        done = pending_items.pop(target, 0)
+        try:
+            if rows:
+                # Lock rows in key order so overlapping batches cannot deadlock
+                key_index = [columns.index(field) for field in key_fields if field in columns]
+                try:
+                    rows.sort(key=lambda row: tuple(row[i] for i in key_index))
+                except TypeError:
+                    pass  # NULL keys cannot be ordered; write in arrival order
+                self.rows_affected[table] += self.write_func(table, list(columns), rows, list(key_fields)) or 0
+        except Exception as e:
+            self.logger.error(f"Error writing {len(rows)} rows to {table}: {e}", exc_info=True)
+            self.errors.append(e)
+        finally:
+            for _ in range(done):
+                self._queue.task_done()
+
+    def _write_units(self, target, buffers, pending_items):
+        """Hand buffered units to unit_func and mark their queue items as done."""
+        _, key_fields = target
+        units = buffers.pop(target, [])
+        done = pending_items.pop(target, 0)
+        try:
+            if units:
+                result = self.unit_func(units, list(key_fields))
+                for table, rows_affected in result.tables.items():
+                    self.rows_affected[table] += rows_affected
+        except Exception as e:
+            self.logger.error(f"Error writing {len(units)} units: {e}", exc_info=True)
+            self.errors.append(e)
+        finally:
+            for _ in range(done):
+                self._queue.task_done()
+
+
+class _Flush(threading.Event):
+    """Marker put on the queue to force buffered rows out; set once they are written."""
@@ -7,39 +7,54 @@ Fetches data from the NHL API and synchronizes it with a MySQL database.
 import argparse
 import logging
 import time
-import schedule
 import sys
 import threading
 from datetime import datetime
 
-from config import DB_CONFIG, NHL_API_BASE_URL, REFRESH_INTERVALS, LOG_LEVEL, LOG_FILE
+from config import DB_CONFIG, DB_BACKEND, DB_PATH, NHL_API_BASE_URL, REFRESH_INTERVALS, SCHEDULER, PLAYER_STALENESS, TRANSFORM_WORKERS, BULK_LOAD, SEASON_WORKERS, LOGGING, HTTP_CACHE_PATH, STATS_STRATEGY, GAME_TYPE_INTERVALS, EXPORT_DIR, SPOOL, JOB_QUEUE
 from lib.database import DatabaseManager
-from lib.nhl_api import NHLApiClient
-from lib.sync_manager import SyncManager
+from lib.logging_setup import setup_logging
+from lib.nhl_api import parse_game_types
+from lib.planner import STATS_STRATEGIES
 
-def setup_logging():
-    """Configure logging for the application."""
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    logging.basicConfig(
-        level=getattr(logging, LOG_LEVEL),
-        format=log_format,
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    return logging.getLogger('nhl_sync')
+# The sync, export, scheduler and web modules are imported by the code paths
+# that use them, so --init, --export and --web start without loading the rest
 
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='NHL MySQL Sync - Synchronize NHL data with MySQL database')
     parser.add_argument('--init', action='store_true', help='Initialize the database schema')
-    parser.add_argument('--sync', choices=['teams', 'players', 'games', 'stats', 'all'], 
-                        default='all', help='Specify which data to synchronize')
-    parser.add_argument('--season', type=str, help='Specify season (format: YYYYYYYY, e.g., 20222023)')
+    parser.add_argument('--sync', choices=['teams', 'players', 'games', 'stats', 'events', 'all'], 
+                        default='all', help='Specify which data to synchronize (events are not part of all)')
+    parser.add_argument('--season', type=str,
+                        help='Specify season(s) (format: YYYYYYYY, e.g., 20222023 or 20212022,20222023)')
     parser.add_argument('--daemon', action='store_true', help='Run as a daemon with scheduled updates')
     parser.add_argument('--web', action='store_true', help='Start the web interface')
     parser.add_argument('--port', type=int, default=7443, help='Port for the web interface (default: 7443)')
+    parser.add_argument('--in-process', action='store_true',
+                        help='With --web: serve the web interface and run its sync jobs in this process (e.g. next to --daemon)')
+    parser.add_argument('--transform-workers', type=int, default=TRANSFORM_WORKERS,
+                        help='Processes used to transform boxscores during stats sync (default: 0, disabled)')
+    parser.add_argument('--bulk-load', action='store_true', default=BULK_LOAD,
+                        help='Write games and stats with LOAD DATA LOCAL INFILE (for historical backfills)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Reload the stats of each season and swap them in as a fresh partition')
+    parser.add_argument('--rebuild-totals', action='store_true',
+                        help='Rebuild the season totals tables (for --season, or all seasons) and exit')
+    parser.add_argument('--export', action='store_true',
+                        help='Write Parquet snapshots of the seasons (--season, or all) changed since the last export and exit')
+    parser.add_argument('--export-dir', type=str, default=EXPORT_DIR,
+                        help=f'Directory of the Parquet snapshots (default: {EXPORT_DIR})')
+    parser.add_argument('--replay-spool', action='store_true',
+                        help='Write the batches spooled while the database was unavailable and exit')
+    parser.add_argument('--stats-strategy', choices=STATS_STRATEGIES, default=STATS_STRATEGY,
+                        help='Fetch stats per game (boxscore), per player (gamelog) or let the planner choose (auto)')
+    parser.add_argument('--players', type=str,
+                        help='Only sync the stats of these player ids (comma separated), e.g. after a trade')
+    parser.add_argument('--game-types', type=parse_game_types,
+                        help='Only sync these game types: preseason, regular, playoffs (comma separated, default: all)')
+    parser.add_argument('--season-workers', type=int, default=SEASON_WORKERS,
+                        help=f'Seasons synchronized concurrently when several are given (default: {SEASON_WORKERS})')
     return parser.parse_args()
 
 def start_web_server(port):
@@ -55,30 +70,86 @@ def start_web_server(port):
     print(f"Web interface started on http://localhost:{port}")
     return web_process
 
+def start_web_in_process(port):
+    """Serve the web interface and run the jobs it queues on threads of this process."""
+    import sync_worker
+    import web_server
+    
+    threading.Thread(target=sync_worker.run_jobs, args=(JOB_QUEUE['path'], JOB_QUEUE['poll_interval']),
+                     name='nhl-sync-jobs', daemon=True).start()
+    web_thread = threading.Thread(target=web_server.serve, args=('0.0.0.0', port), name='nhl-sync-web', daemon=True)
+    web_thread.start()
+    
+    print(f"Web interface started on http://localhost:{port}")
+    return web_thread
+
+def build_sync_manager(db_manager, args):
+    """Create the API client and sync manager (and import the sync machinery)."""
+    from lib.http_cache import ValidatorCache
+    from lib.jobs import JobQueue
+    from lib.nhl_api import NHLApiClient
+    from lib.spool import WriteSpool
+    from lib.sync_manager import SyncManager
+    from lib.teams import TeamRegistry
+    
+    api_client = NHLApiClient(NHL_API_BASE_URL,
+                              validator_cache=ValidatorCache(HTTP_CACHE_PATH) if HTTP_CACHE_PATH else None,
+                              team_registry=TeamRegistry(db_manager))
+    sync_manager = SyncManager(db_manager, api_client, player_staleness=PLAYER_STALENESS,
+                               transform_workers=args.transform_workers, bulk_load=args.bulk_load,
+                               spool=WriteSpool(**SPOOL) if SPOOL['path'] else None)
+    # The web interface drops the cached responses these writes make stale
+    sync_manager.add_write_listener(JobQueue(JOB_QUEUE['path']).invalidate_rows)
+    return sync_manager
+
 def main():
     """Main application entry point."""
     args = parse_args()
-    logger = setup_logging()
+    logger = setup_logging(**LOGGING)
     
     logger.info("Starting NHL MySQL Sync")
     
     # Start web interface if requested
     if args.web:
-        web_thread = start_web_server(args.port)
+        web_thread = start_web_in_process(args.port) if args.in_process else start_web_server(args.port)
     
     try:
         # Initialize components
-        db_manager = DatabaseManager(DB_CONFIG)
-        api_client = NHLApiClient(NHL_API_BASE_URL)
-        sync_manager = SyncManager(db_manager, api_client)
+        db_manager = DatabaseManager(DB_CONFIG, backend=DB_BACKEND, path=DB_PATH)
         
         # Initialize database if requested
         if args.init:
             logger.info("Initializing database schema")
             db_manager.init_schema()
         
-        # Determine season to use
-        season = args.season or str(datetime.now().year - 1) + str(datetime.now().year)
+        # Export snapshots only; needs no API client
+        if args.export:
+            from lib.export import SnapshotExporter
+            seasons = [season.strip() for season in args.season.split(',') if season.strip()] if args.season else None
+            SnapshotExporter(db_manager, args.export_dir).export(seasons=seasons)
+            return 0
+        
+        sync_manager = build_sync_manager(db_manager, args)
+        
+        # Rebuild the season aggregates only
+        if args.rebuild_totals:
+            for season in (args.season.split(',') if args.season else [None]):
+                sync_manager.rebuild_season_totals(season)
+            return 0
+        
+        # Drain the write spool only
+        if args.replay_spool:
+            if not sync_manager.replay_spool(force=True):
+                logger.error("The write spool could not be fully replayed")
+                return 1
+            return 0
+        
+        # Determine seasons to use
+        if args.season:
+            seasons = [season.strip() for season in args.season.split(',') if season.strip()]
+        else:
+            seasons = [str(datetime.now().year - 1) + str(datetime.now().year)]
+        season = seasons[0]
         
         # Perform initial sync
         if args.sync == 'all' or args.sync == 'teams':
@@ -88,31 +159,59 @@ def main():
         if args.sync == 'all' or args.sync == 'players':
             logger.info("Synchronizing players data")
             sync_manager.sync_players()
+        
+        include_games = args.sync in ('all', 'games')
+        include_stats = args.sync in ('all', 'stats')
+        include_events = args.sync == 'events'
+        player_ids = [int(player_id) for player_id in args.players.split(',') if player_id.strip()] if args.players else None
+        if player_ids and include_stats:
+            # A targeted refresh is small, so its seasons run one after another
+            for player_season in seasons:
+                logger.info(f"Synchronizing stats of {len(player_ids)} players for season {player_season}")
+                sync_manager.sync_stats(player_season, strategy=args.stats_strategy, player_ids=player_ids,
+                                        game_types=args.game_types)
+            include_stats = False
+        if len(seasons) > 1 and (include_games or include_stats or include_events):
+            logger.info(f"Synchronizing seasons {', '.join(seasons)}")
+            sync_manager.sync_seasons(seasons, workers=args.season_workers,
+                                      include_games=include_games, include_stats=include_stats,
+                                      include_events=include_events, rebuild=args.rebuild,
+                                      stats_strategy=args.stats_strategy, game_types=args.game_types)
+        else:
+            if include_games:
+                logger.info(f"Synchronizing games data for season {season}")
+                sync_manager.sync_games(season, game_types=args.game_types)
+                
+            if include_stats:
+                logger.info(f"Synchronizing stats data for season {season}")
+                sync_manager.sync_stats(season, rebuild=args.rebuild, strategy=args.stats_strategy,
+                                        game_types=args.game_types)
             
-        if args.sync == 'all' or args.sync == 'games':
-            logger.info(f"Synchronizing games data for season {season}")
-            sync_manager.sync_games(season)
-            
-        if args.sync == 'all' or args.sync == 'stats':
-            logger.info(f"Synchronizing stats data for season {season}")
-            sync_manager.sync_stats(season)
+            if include_events:
+                logger.info(f"Synchronizing play-by-play events for season {season}")
+                sync_manager.sync_events(season)
         
         # Run as daemon if requested
         if args.daemon:
             logger.info("Running in daemon mode with scheduled updates")
+            from lib.scheduler import SyncScheduler
             
-            # Schedule regular updates
-            schedule.every(REFRESH_INTERVALS['teams']).seconds.do(sync_manager.sync_teams)
-            schedule.every(REFRESH_INTERVALS['players']).seconds.do(sync_manager.sync_players)
-            schedule.every(REFRESH_INTERVALS['games']).seconds.do(
-                lambda: sync_manager.sync_games(season))
-            schedule.every(REFRESH_INTERVALS['stats']).seconds.do(
-                lambda: sync_manager.sync_stats(season))
+            # Plan updates around the game calendar
+            scheduler = SyncScheduler(
+                sync_manager, db_manager, season, REFRESH_INTERVALS,
+                state_file=SCHEDULER['state_file'],
+                workers=SCHEDULER['workers'],
+                game_duration=SCHEDULER['game_duration'],
+                postgame_delay=SCHEDULER['postgame_delay'],
+                idle_interval=SCHEDULER['idle_interval'],
+                game_type_intervals=GAME_TYPE_INTERVALS)
             
             # Run the scheduler
-            while True:
-                schedule.run_pending()
-                time.sleep(1)
+            try:
+                scheduler.run_forever()
+            except KeyboardInterrupt:
+                logger.info("Received keyboard interrupt. Stopping scheduler.")
+                scheduler.stop()
         
         # If web interface is running but not in daemon mode, keep the main thread alive
         if args.web and not args.daemon:
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Sync worker for NHL MySQL Sync.
+Executes sync jobs queued by the web interface, outside the web server process.
+"""
+
+import argparse
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import config
+from lib.cache import QueryCache
+from lib.cancellation import CancellationToken, SyncCancelled
+from lib.database import DatabaseManager
+from lib.export import SnapshotExporter
+from lib.http_cache import ValidatorCache
+from lib.jobs import JobQueue
+from lib.leases import LeaseBoard, ShardedSync
+from lib.logging_setup import SamplingFilter, process_log_file, setup_logging
+from lib.nhl_api import NHLApiClient
+from lib.spool import WriteSpool
+from lib.sync_manager import SyncManager
+from lib.teams import TeamRegistry
+
+# Seconds between heartbeats of a running job
+HEARTBEAT_INTERVAL = 15
+
+# Seconds between checks for a cancel request (and job log flushes)
+CANCEL_POLL_INTERVAL = 1.0
+
+# Minimum seconds between progress updates written to the queue
+PROGRESS_INTERVAL = 1.0
+
+# Job log lines buffered before they are written to the queue
+LOG_BUFFER_SIZE = 100
+
+# Job statistics counter per written table
+STATS_KEYS = {
+    'teams': 'teams_updated',
+    'players': 'players_updated',
+    'games': 'games_updated',
+    'player_stats': 'stats_updated',
+    'goalie_stats': 'stats_updated',
+    'game_events': 'stats_updated',
+}
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='NHL MySQL Sync Worker')
+    parser.add_argument('--queue', type=str, default=config.JOB_QUEUE['path'],
+                        help=f"Job queue database file (default: {config.JOB_QUEUE['path']})")
+    parser.add_argument('--workers', type=int, default=config.JOB_QUEUE['workers'],
+                        help=f"Worker processes; jobs of different types run in parallel (default: {config.JOB_QUEUE['workers']})")
+    parser.add_argument('--poll-interval', type=float, default=config.JOB_QUEUE['poll_interval'],
+                        help=f"Seconds between checks for new jobs (default: {config.JOB_QUEUE['poll_interval']})")
+    parser.add_argument('--leases', type=str, metavar='PLAN', default=config.LEASES['plan'],
+                        help='Instead of running queued jobs, work on the sharded sync PLAN with every other '
+                             'worker started with it, then exit')
+    parser.add_argument('--seasons', type=str, default=config.LEASES['seasons'],
+                        help='Seasons of the --leases plan (comma separated, e.g. 20212022,20222023)')
+    parser.add_argument('--sync', choices=['teams', 'players', 'games', 'stats', 'events', 'all'],
+                        default=config.LEASES['sync'], help=f"Data of the --leases plan (default: {config.LEASES['sync']})")
+    args = parser.parse_args()
+    args.seasons = [season.strip() for season in args.seasons.split(',') if season.strip()]
+    if args.leases and not args.seasons and args.sync not in ('teams', 'players'):
+        parser.error('--leases needs --seasons (or LEASE_SEASONS)')
+    return args
+
+
+def build_sync_manager(queue=None):
+    """Create the sync components from this process's configuration.
+
+    Their writes invalidate the web interface's cached responses through
+    queue (the configured job queue by default).
+    """
+    db_manager = DatabaseManager(config.DB_CONFIG, backend=config.DB_BACKEND, path=config.DB_PATH)
+    validators = ValidatorCache(config.HTTP_CACHE_PATH) if config.HTTP_CACHE_PATH else None
+    api_client = NHLApiClient(config.NHL_API_BASE_URL, validator_cache=validators,
+                              team_registry=TeamRegistry(db_manager))
+    sync_manager = SyncManager(db_manager, api_client, player_staleness=config.PLAYER_STALENESS,
+                               transform_workers=config.TRANSFORM_WORKERS, bulk_load=config.BULK_LOAD,
+                               spool=WriteSpool(**config.SPOOL) if config.SPOOL['path'] else None)
+    sync_manager.add_write_listener((queue or JobQueue(config.JOB_QUEUE['path'])).invalidate_rows)
+    return sync_manager
+
+
+class JobLogHandler(logging.handlers.BufferingHandler):
+    """Copies sync log records into a job's event log.
+
+    Records are buffered and written in batches (when the buffer fills and
+    on the monitor's periodic flush) so logging stays off the hot path.
+    """
+
+    def __init__(self, queue, job_id, capacity=LOG_BUFFER_SIZE):
+        super().__init__(capacity)
+        self.setLevel(logging.INFO)
+        self.queue = queue
+        self.job_id = job_id
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.addFilter(SamplingFilter(config.LOGGING['sample_rates'], config.LOGGING['default_sample_rate']))
+
+    def flush(self):
+        self.acquire()
+        try:
+            records, self.buffer = self.buffer, []
+        finally:
+            self.release()
+        if not records:
+            return
+        try:
+            self.queue.log_many(self.job_id, [
+                (record.created, record.levelname.lower(), self.format(record)) for record in records
+            ])
+        except Exception:
+            self.handleError(records[-1])
+
+
+class JobRunner:
+    """Runs one claimed job and reports its progress through the queue."""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job = job
+        self.job_id = job['id']
+        self.stats = {'teams_updated': 0, 'players_updated': 0, 'games_updated': 0, 'stats_updated': 0}
+        self.cancel_token = CancellationToken()
+        self.logger = logging.getLogger('nhl_sync.worker')
+
+        self._stats_lock = threading.Lock()
+        self._step_index = 0
+        self._step_count = 1
+        self._step_label = None
+        self._last_progress = 0.0
+
+    def run(self):
+        """Execute the job and record how it ended."""
+        params = self.job['params']
+        log_handler = JobLogHandler(self.queue, self.job_id)
+        logging.getLogger('nhl_sync').addHandler(log_handler)
+        done = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(done, log_handler), daemon=True)
+        monitor.start()
+        try:
+            sync_manager = self._build_sync_manager()
+            steps = self._plan(sync_manager, params['data_type'], params['seasons'])
+            self._step_count = len(steps) or 1
+            for index, (label, step) in enumerate(steps):
+                self.cancel_token.raise_if_cancelled()
+                self._step_index = index
+                self._step_label = label
+                self.queue.update(self.job_id, progress=index * 100 // self._step_count, current_task=label)
+                step(self.cancel_token, self._progress)
+            self.queue.update(self.job_id, current_task='Completed', stats=self.stats)
+            self.queue.finish(self.job_id, 'done')
+        except SyncCancelled:
+            self.logger.warning(f"Job {self.job_id} cancelled")
+            self.queue.update(self.job_id, current_task='Cancelled', stats=self.stats)
+            self.queue.finish(self.job_id, 'cancelled')
+        except Exception as e:
+            self.logger.error(f"Job {self.job_id} failed: {e}", exc_info=True)
+            self.queue.update(self.job_id, current_task=f'Error: {e}', stats=self.stats)
+            self.queue.finish(self.job_id, 'failed', error=str(e))
+        finally:
+            done.set()
+            logging.getLogger('nhl_sync').removeHandler(log_handler)
+            log_handler.close()
+
+    def _build_sync_manager(self):
+        """Create the components and hook the job's row counting into their writes."""
+        sync_manager = build_sync_manager(self.queue)
+        sync_manager.add_write_listener(self._count_rows)
+        if config.CACHE['redis_url']:
+            # A shared cache is invalidated right away instead of on the web process's next poll
+            sync_manager.add_write_listener(QueryCache(**config.CACHE).invalidate_rows)
+        return sync_manager
+
+    def _plan(self, sync_manager, data_type, seasons):
+        """Return the job's steps as (label, step) pairs, called as step(cancel_token, progress)."""
+        steps = []
+        if data_type == 'export':
+            exporter = SnapshotExporter(sync_manager.db, config.EXPORT_DIR)
+            steps.append(('Exporting snapshots', lambda token, progress: exporter.export(
+                seasons=seasons or None, cancel_token=token, progress=progress)))
+            return steps
+        if data_type in ('teams', 'all'):
+            steps.append(('Synchronizing teams', lambda token, progress: sync_manager.sync_teams(
+                cancel_token=token, progress=progress)))
+        if data_type in ('players', 'all'):
+            steps.append(('Synchronizing players', lambda token, progress: sync_manager.sync_players(
+                cancel_token=token, progress=progress)))
+
+        include_games = data_type in ('games', 'all')
+        include_stats = data_type in ('stats', 'all')
+        include_events = data_type == 'events'
+        if len(seasons) > 1 and (include_games or include_stats or include_events):
+            # Fetch several seasons concurrently through the shared writer
+            steps.append((f'Synchronizing {len(seasons)} seasons', lambda token, progress: sync_manager.sync_seasons(
+                seasons, workers=config.SEASON_WORKERS,
+                include_games=include_games, include_stats=include_stats, include_events=include_events,
+                stats_strategy=config.STATS_STRATEGY, cancel_token=token, progress=progress)))
+            return steps
+
+        for season in seasons:
+            if include_games:
+                steps.append((f'Synchronizing games for season {season}',
+                              lambda token, progress, season=season: sync_manager.sync_games(
+                                  season, cancel_token=token, progress=progress)))
+            if include_stats:
+                steps.append((f'Synchronizing stats for season {season}',
+                              lambda token, progress, season=season: sync_manager.sync_stats(
+                                  season, strategy=config.STATS_STRATEGY, cancel_token=token, progress=progress)))
+            if include_events:
+                steps.append((f'Synchronizing play-by-play for season {season}',
+                              lambda token, progress, season=season: sync_manager.sync_events(
+                                  season, cancel_token=token, progress=progress)))
+        return steps
+
+    def _progress(self, unit, done, total):
+        """Progress callback: turn units done within the current step into a job percentage."""
+        now = time.monotonic()
+        if done < total and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        fraction = done / total if total else 1.0
+        progress = (self._step_index + fraction) * 100 / self._step_count
+        self.queue.update(self.job_id, progress=min(int(progress), 100),
+                          current_task=f"{self._step_label} ({done}/{total} {unit})")
+
+    def _count_rows(self, table, columns, rows):
+        """Write listener: count written rows per table."""
+        key = STATS_KEYS.get(table)
+        if key:
+            # Writes may come from several season threads at once
+            with self._stats_lock:
+                self.stats[key] += len(rows)
+                self.queue.update(self.job_id, stats=self.stats)
+
+    def _monitor(self, done, log_handler):
+        """Watch for cancel requests, flush job logs and keep the heartbeat fresh until the job ends."""
+        last_heartbeat = time.monotonic()
+        while not done.wait(CANCEL_POLL_INTERVAL):
+            try:
+                log_handler.flush()
+                if not self.cancel_token.cancelled and self.queue.cancel_requested(self.job_id):
+                    self.logger.warning(f"Cancelling job {self.job_id}")
+                    self.cancel_token.cancel()
+                if time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    self.queue.update(self.job_id)
+                    last_heartbeat = time.monotonic()
+            except Exception as e:
+                self.logger.warning(f"Monitoring job {self.job_id} failed: {e}")
+
+
+def worker_loop(queue_path, poll_interval, process_name='worker'):
+    """Set up this process's logging, then claim and run jobs until the process is stopped."""
+    # Each process gets its own logging thread and log file
+    setup_logging(**dict(config.LOGGING, log_file=process_log_file(config.LOGGING['log_file'], process_name)))
+    run_jobs(queue_path, poll_interval)
+
+
+def run_jobs(queue_path, poll_interval):
+    """Claim and run jobs forever, logging through whatever logging is already set up."""
+    queue = JobQueue(queue_path)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    logger = logging.getLogger('nhl_sync.worker')
+    logger.info(f"Sync worker {name} waiting for jobs")
+
+    while True:
+        job = queue.claim(name)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        logger.info(f"Worker {name} running {job['job_type']} job {job['id']}")
+        JobRunner(queue, job).run()
+
+
+def lease_loop(plan_id, seasons, data_type, process_name='worker'):
+    """Work on a sharded sync plan until none of its units are left."""
+    setup_logging(**dict(config.LOGGING, log_file=process_log_file(config.LOGGING['log_file'], process_name)))
+    sync_manager = build_sync_manager()
+    board = LeaseBoard(sync_manager.db, plan_id, f"{socket.gethostname()}:{os.getpid()}",
+                       lease_seconds=config.LEASES['lease_seconds'])
+    sharded = ShardedSync(sync_manager, board, seasons, data_type,
+                          games_per_unit=config.LEASES['games_per_unit'])
+    sharded.seed()
+    sharded.run(poll_interval=config.LEASES['poll_interval'])
+
+
+def _raise_interrupt(signum, frame):
+    """Signal handler: stop the main process like Ctrl+C does."""
+    raise KeyboardInterrupt()
+
+
+def main():
+    """Main entry point for the sync worker."""
+    args = parse_args()
+    if args.leases:
+        target, target_args = lease_loop, (args.leases, args.seasons, args.sync)
+    else:
+        target, target_args = worker_loop, (args.queue, args.poll_interval)
+
+    if args.workers <= 1:
+        try:
+            target(*target_args)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    # Not daemonic: a worker's stats sync may start its own transform process pool
+    processes = [
+        multiprocessing.Process(target=target, args=(*target_args, f'worker-{index}'),
+                                name=f'nhl-sync-worker-{index}')
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    # Stop the workers on SIGTERM (e.g. docker stop) as on Ctrl+C; set after the fork so they keep the default
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Shared test setup for NHL MySQL Sync.
+"""
+
+import os
+import sys
+
+# Make the application modules (lib, config, ...) importable when pytest runs from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+"""
+Tests for query cache invalidation.
+"""
+
+from lib import jobs
+from lib.cache import QueryCache, cache_key, keys_for_rows
+from lib.jobs import JobQueue
+
+
+def test_keys_for_rows():
+    assert keys_for_rows('teams', ['id', 'name'], [(6, 'Boston Bruins')]) == {'team:6'}
+    assert keys_for_rows('players', ['id', 'current_team_id'], [(8478402, 22), (8471214, None)]) == {
+        'player:8478402', 'player:8471214', 'team:22'}
+    assert keys_for_rows('player_stats', ['player_id', 'game_id', 'season', 'goals'],
+                         [(8478402, 2023020001, 20232024, 1), (8477934, 2023020001, 20232024, 0)]) == {
+        'player:8478402', 'player:8477934', 'game:2023020001', 'leaders:20232024'}
+    # Columns a write does not carry cannot be mapped, and unknown tables make nothing stale
+    assert keys_for_rows('games', ['season'], [(20232024,)]) == set()
+    assert keys_for_rows('game_events', ['game_id'], [(2023020001,)]) == set()
+
+
+def test_published_invalidations_reach_the_cache(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    cache = QueryCache()
+    for key in (cache_key('game', 2023020001), cache_key('game', 2023020002), cache_key('team', 6)):
+        cache.set(key, {'key': key})
+
+    after_id = queue.last_invalidation_id()
+    queue.invalidate_rows('games', ['id', 'season'], [(2023020001, 20232024)])
+    queue.invalidate_rows('teams', ['id'], [(6,)])
+    invalidations = queue.invalidations(after_id)
+    cache.invalidate(row['cache_key'] for row in invalidations)
+
+    assert [row['cache_key'] for row in invalidations] == ['game:2023020001', 'team:6']
+    assert cache.get('game:2023020001') is None
+    assert cache.get('team:6') is None
+    assert cache.get('game:2023020002') is not None
+    assert queue.invalidations(invalidations[-1]['id']) == []
+
+
+def test_old_invalidations_are_pruned(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    queue.publish_invalidations(['game:1'])
+    monkeypatch.setattr(jobs, 'INVALIDATION_RETENTION', -1)
+    queue.publish_invalidations(['game:2'])
+
+    assert [row['cache_key'] for row in queue.invalidations()] == ['game:2']
@@ -0,0 +1,27 @@
+"""
+Tests for season partition handling.
+"""
+
+import pytest
+
+from lib.database import DatabaseManager, PartitionError
+
+
+def test_seasons_before_partitioning_have_no_partition():
+    db = DatabaseManager({}, backend='mysql')
+    with pytest.raises(PartitionError):
+        db.ensure_season_partition('player_stats', '20052006')
+
+
+def test_rebuild_before_partitioning_deletes_and_reloads(monkeypatch):
+    db = DatabaseManager({}, backend='mysql')
+    replaced = []
+
+    def exchange(*args):
+        raise AssertionError('p_before cannot be exchanged')
+
+    monkeypatch.setattr(db, 'ensure_season_partition', exchange)
+    monkeypatch.setattr(db, '_replace_season_rows', lambda *args: replaced.append(args))
+    db.replace_season_partition('player_stats', '20052006', ['player_id'], [(1,)], ['player_id'])
+
+    assert replaced == [('player_stats', '20052006', ['player_id'], [(1,)], ['player_id'])]
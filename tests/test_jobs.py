@@ -0,0 +1,24 @@
+"""
+Tests for the job queue's one-time migrations.
+"""
+
+import json
+import sqlite3
+
+from lib.jobs import MIGRATIONS, JobQueue
+
+
+def test_credentials_are_scrubbed_once(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(path)
+    with sqlite3.connect(path) as connection:
+        connection.execute("PRAGMA user_version = 0")
+    job_id = queue.enqueue('sync', {'data_type': 'all', 'db_config': {'password': 'secret'}})
+
+    assert JobQueue(path).get(job_id)['params'] == {'data_type': 'all'}
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+
+    # Migrated files are left alone
+    other_id = queue.enqueue('export', {'data_type': 'export', 'api_url': 'https://example.org'})
+    assert JobQueue(path).get(other_id)['params']['api_url'] == 'https://example.org'
@@ -0,0 +1,184 @@
+"""
+Tests for lease-based work partitioning, on the SQLite backend.
+"""
+
+import threading
+from collections import Counter
+
+import pytest
+
+from lib.database import DatabaseManager
+from lib.leases import LeaseBoard, LeaseLost, ShardedSync, work_unit
+
+SEASONS = ['20212022', '20222023']
+
+# Games stored per season by FakeSync.sync_games
+GAMES_PER_SEASON = 250
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager({}, backend='sqlite', path=str(tmp_path / 'nhl.sqlite'))
+    db.init_schema()
+    return db
+
+
+def expire_leases(db, plan_id):
+    """Let every lease of a plan run out, as if its holders had died."""
+    db.execute_query("UPDATE sync_leases SET expires_at = 0 WHERE plan_id = %s AND status = 'leased'",
+                     (plan_id,))
+
+
+class FakeApi:
+    def get_teams(self):
+        return [{'id': 1}, {'id': 2}, {'id': 3}]
+
+
+class FakeSync:
+    """Stands in for SyncManager, recording the syncs the units run."""
+
+    def __init__(self, db, ran):
+        self.db = db
+        self.api = FakeApi()
+        self.ran = ran
+        self.lock = threading.Lock()
+
+    def _record(self, *call):
+        with self.lock:
+            self.ran[call] += 1
+
+    def sync_teams(self, cancel_token=None):
+        self._record('teams')
+
+    def sync_players(self, cancel_token=None, team_ids=None):
+        self._record('roster', *team_ids)
+
+    def sync_games(self, season, cancel_token=None):
+        self._record('games', season)
+        first_id = int(season[:4]) * 1000000 + 20000
+        self.db.execute_transaction([(
+            "INSERT INTO games (id, season, game_type, date_time, away_team_id, home_team_id, venue, status) "
+            "VALUES (%s, %s, 2, '2022-01-01 00:00:00', 1, 2, 'Arena', 'Final')",
+            (first_id + number, int(season)),
+        ) for number in range(1, GAMES_PER_SEASON + 1)])
+
+    def sync_stats(self, season, cancel_token=None, strategy=None, game_range=None):
+        self._record('stats', season, game_range)
+
+    def sync_events(self, season, cancel_token=None, game_range=None):
+        self._record('events', season, game_range)
+
+
+def test_two_boards_compete_for_one_unit(db):
+    LeaseBoard(db, 'plan', 'seed').add([work_unit('games', '20232024')])
+    boards = [LeaseBoard(db, 'plan', f'worker-{n}') for n in range(2)]
+    start = threading.Barrier(len(boards))
+    claims = {}
+
+    def claim(board):
+        start.wait()
+        claims[board.owner] = board.claim()
+
+    threads = [threading.Thread(target=claim, args=(board,)) for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [owner for owner, unit in claims.items() if unit is not None]
+    assert len(winners) == 1
+    assert claims[winners[0]]['unit'] == 'games:20232024'
+    assert boards[0].counts() == {'leased': 1}
+
+    loser = next(board for board in boards if board.owner != winners[0])
+    with pytest.raises(LeaseLost):
+        loser.renew(claims[winners[0]])
+    assert not loser.complete(claims[winners[0]])
+
+
+def test_expired_lease_is_reclaimed(db):
+    dead = LeaseBoard(db, 'plan', 'dead')
+    alive = LeaseBoard(db, 'plan', 'alive')
+    dead.add([work_unit('games', '20232024')])
+    unit = dead.claim()
+    assert alive.claim() is None
+
+    expire_leases(db, 'plan')
+    reclaimed = alive.claim()
+    assert reclaimed['unit'] == unit['unit']
+    assert reclaimed['attempts'] == 2
+
+    with pytest.raises(LeaseLost):
+        dead.renew(unit)
+    assert not dead.complete(unit)
+    assert alive.complete(reclaimed)
+    assert alive.counts() == {'done': 1}
+
+
+def test_unit_fails_after_max_attempts(db):
+    board = LeaseBoard(db, 'plan', 'worker', max_attempts=3)
+    board.add([work_unit('stats', '20232024', 1, 5)])
+
+    # Stopping without an error does not use up an attempt
+    board.release(board.claim())
+    for attempt in range(1, 4):
+        unit = board.claim()
+        assert unit['attempts'] == attempt
+        board.release(unit, 'boom')
+
+    assert board.counts() == {'failed': 1}
+    assert board.claim() is None
+
+
+def test_unit_fails_after_max_expired_leases(db):
+    board = LeaseBoard(db, 'plan', 'worker', max_attempts=2)
+    board.add([work_unit('games', '20232024')])
+    for _ in range(2):
+        assert board.claim() is not None
+        expire_leases(db, 'plan')
+
+    assert board.claim() is None
+    assert board.counts() == {'failed': 1}
+    rows = db.execute_query("SELECT error FROM sync_leases WHERE plan_id = 'plan'", fetch=True)
+    assert rows[0]['error'] == 'lease expired'
+
+
+def test_follow_ups_are_added_before_the_unit_completes(db):
+    ran = Counter()
+    board = LeaseBoard(db, 'plan', 'worker')
+    pending_at_completion = {}
+    complete = board.complete
+
+    def recording_complete(unit):
+        pending_at_completion[unit['unit']] = board.counts().get('pending', 0)
+        return complete(unit)
+
+    board.complete = recording_complete
+    board.add([work_unit('games', '20232024')])
+    ShardedSync(FakeSync(db, ran), board, ['20232024'], 'all').run(poll_interval=0.01)
+
+    # The games unit was the only one left, so its stats units kept the plan open
+    assert pending_at_completion['games:20232024'] == 3
+    assert board.counts() == {'done': 4}
+
+
+def test_workers_share_a_plan(db):
+    ran = Counter()
+
+    def worker(n):
+        board = LeaseBoard(db, 'plan', f'worker-{n}')
+        sharded = ShardedSync(FakeSync(db, ran), board, SEASONS, 'all', games_per_unit=100)
+        sharded.seed()
+        sharded.run(poll_interval=0.01)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # teams, 3 rosters, and per season the schedule and 3 stats ranges, each run once
+    assert len(ran) == 12
+    assert set(ran.values()) == {1}
+    assert ('stats', '20222023', (2022020201, 2022020250)) in ran
+    assert LeaseBoard(db, 'plan', 'check').counts() == {'done': 12}
@@ -0,0 +1,68 @@
+"""
+Tests for the row counts recorded in sync_runs.
+"""
+
+import pytest
+
+from lib.batch import group_units
+from lib.database import DatabaseManager
+from lib.runs import SyncRun, split_affected_rows
+from lib.sync_manager import SyncManager
+
+GAME_COLUMNS = ['id', 'season', 'game_type', 'date_time', 'away_team_id', 'home_team_id', 'venue', 'status']
+
+STAT_COLUMNS = ['player_id', 'game_id', 'season', 'team_id', 'goals']
+
+
+def game(game_id, status='Final'):
+    return (game_id, 20232024, '2', '2023-10-10 23:00:00', 1, 2, 'Arena', status)
+
+
+def test_split_affected_rows():
+    # MySQL: 1 insert (1) + 1 unchanged (0) + 1 update (2)
+    assert split_affected_rows(3, 3, existing_rows=2, affected_per_update=2) == (1, 1, 1)
+    # File backends: 1 insert (1) + 1 unchanged (0) + 1 update (1)
+    assert split_affected_rows(3, 2, existing_rows=2, affected_per_update=1) == (1, 1, 1)
+    assert split_affected_rows(3, 0, existing_rows=3, affected_per_update=2) == (0, 0, 3)
+    assert split_affected_rows(3, None, existing_rows=1) == (3, 0, 0)
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def sync_manager(request, tmp_path):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    db = DatabaseManager({}, backend=request.param, path=str(tmp_path / f'nhl.{request.param}'))
+    db.init_schema()
+    return SyncManager(db, None)
+
+
+def write_counted(sync_manager, write):
+    """Run write() as part of a run and return the run's (inserted, updated, unchanged)."""
+    run = SyncRun('games')
+    with sync_manager._joined(run):
+        write()
+    return run.rows_inserted, run.rows_updated, run.rows_unchanged
+
+
+def test_mixed_batch_is_split_exactly(sync_manager):
+    write_counted(sync_manager, lambda: sync_manager._write_rows(
+        'games', GAME_COLUMNS, [game(1), game(2)], ['id']))
+
+    counts = write_counted(sync_manager, lambda: sync_manager._write_rows(
+        'games', GAME_COLUMNS, [game(1), game(2, 'Postponed'), game(3)], ['id']))
+
+    assert counts == (1, 1, 1)
+    rows = sync_manager.db.execute_query("SELECT id, status FROM games ORDER BY id", fetch=True)
+    assert [(row['id'], row['status']) for row in rows] == [(1, 'Final'), (2, 'Postponed'), (3, 'Final')]
+
+
+def test_mixed_units_are_split_exactly(sync_manager):
+    def write(rows):
+        units = group_units('game_id', [('player_stats', STAT_COLUMNS, rows)])
+        sync_manager._write_units(units, ['player_id', 'game_id', 'season'])
+
+    write_counted(sync_manager, lambda: write([(10, 1, 20232024, 1, 0), (11, 1, 20232024, 1, 1)]))
+    counts = write_counted(sync_manager, lambda: write(
+        [(10, 1, 20232024, 1, 0), (11, 1, 20232024, 1, 2), (12, 2, 20232024, 2, 0)]))
+
+    assert counts == (1, 1, 1)
@@ -0,0 +1,187 @@
+"""
+Tests for the write-ahead spool.
+"""
+
+import os
+import subprocess
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from lib.database import DatabaseManager, DatabaseUnavailable
+from lib.spool import FRAME_HEADER, SEALED_SUFFIX, SpoolFull, WriteSpool
+from lib.sync_manager import SyncManager
+
+RECORD = {
+    'sql': 'INSERT INTO games (id, date_time) VALUES (%s, %s)',
+    'rows': [[2023020001, datetime(2023, 10, 10, 19, 0)], [2023020002, date(2023, 10, 11)]],
+    'toi': Decimal('12.5'),
+    'note': 'Montréal',
+}
+
+# The record as replay hands it back: dates as ISO strings, decimals as floats
+REPLAYED = {
+    'sql': 'INSERT INTO games (id, date_time) VALUES (%s, %s)',
+    'rows': [[2023020001, '2023-10-10T19:00:00'], [2023020002, '2023-10-11']],
+    'toi': 12.5,
+    'note': 'Montréal',
+}
+
+
+def json_spool(path, **kwargs):
+    """Return a spool that encodes with JSON whether or not msgpack is installed."""
+    spool = WriteSpool(str(path), **kwargs)
+    spool._msgpack = None
+    return spool
+
+
+def dead_pid():
+    """Return the id of a process that has exited."""
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def replay_all(spool):
+    """Replay the spool and return the records it applied."""
+    records = []
+    assert spool.replay(records.append, force=True)
+    return records
+
+
+def test_json_round_trip(tmp_path):
+    spool = json_spool(tmp_path)
+    spool.append(RECORD)
+    spool.append({'sql': 'DELETE FROM games', 'rows': []})
+
+    assert spool.pending()
+    assert replay_all(spool) == [REPLAYED, {'sql': 'DELETE FROM games', 'rows': []}]
+    assert not spool.pending()
+    assert spool.size() == 0
+
+
+def test_msgpack_round_trip(tmp_path):
+    pytest.importorskip('msgpack')
+    spool = WriteSpool(str(tmp_path))
+    spool.append(RECORD)
+    spool.close()
+
+    with open(spool._segments(SEALED_SUFFIX)[0], 'rb') as f:
+        assert FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))[1] == b'm'
+    assert replay_all(WriteSpool(str(tmp_path))) == [REPLAYED]
+
+
+def test_msgpack_segment_without_msgpack(tmp_path):
+    msgpack = pytest.importorskip('msgpack')
+    spool = WriteSpool(str(tmp_path))
+    spool.append(RECORD)
+    spool._msgpack = None
+
+    assert not spool.replay(lambda record: None, force=True)
+    assert spool.pending()
+    spool._msgpack = msgpack
+    assert replay_all(spool) == [REPLAYED]
+
+
+def test_truncated_last_frame(tmp_path):
+    spool = json_spool(tmp_path)
+    spool.append({'id': 1})
+    spool.append({'id': 2})
+    spool.close()
+
+    # The writer died part way through a third frame's payload
+    payload = b'{"id":3}'
+    with open(spool._segments(SEALED_SUFFIX)[0], 'ab') as f:
+        f.write(FRAME_HEADER.pack(len(payload), b'j') + payload[:3])
+    assert replay_all(json_spool(tmp_path)) == [{'id': 1}, {'id': 2}]
+
+
+def test_truncated_last_header(tmp_path):
+    spool = json_spool(tmp_path)
+    spool.append({'id': 1})
+    spool.close()
+
+    with open(spool._segments(SEALED_SUFFIX)[0], 'ab') as f:
+        f.write(FRAME_HEADER.pack(8, b'j')[:2])
+    assert replay_all(json_spool(tmp_path)) == [{'id': 1}]
+
+
+def test_recover_segments_of_dead_processes(tmp_path):
+    pid = dead_pid()
+    payload = b'{"id":1}'
+    frame = FRAME_HEADER.pack(len(payload), b'j') + payload
+    for name in (f"{1:020d}-{pid}.open", f"{2:020d}-{pid}.replaying.{pid}"):
+        with open(tmp_path / name, 'wb') as f:
+            f.write(frame)
+
+    spool = json_spool(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == [f"{1:020d}-{pid}.spool", f"{2:020d}-{pid}.spool"]
+    assert replay_all(spool) == [{'id': 1}, {'id': 1}]
+
+
+def test_recover_leaves_live_processes_alone(tmp_path):
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        names = [f"{1:020d}-{process.pid}.open", f"{2:020d}-{process.pid}.replaying.{process.pid}"]
+        for name in names:
+            (tmp_path / name).write_bytes(b'')
+
+        json_spool(tmp_path)
+        assert sorted(os.listdir(tmp_path)) == names
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_spool_full(tmp_path):
+    spool = json_spool(tmp_path, max_bytes=64)
+    spool.append({'id': 1})
+
+    with pytest.raises(SpoolFull):
+        spool.append({'rows': 'x' * 64})
+    assert replay_all(spool) == [{'id': 1}]
+    spool.append({'rows': 'x' * 32})
+
+
+class ScheduleApi:
+    """Stands in for NHLApiClient, streaming a long schedule and counting the games it handed out."""
+
+    def __init__(self, games):
+        self.games = games
+        self.fetched = 0
+        self.cancel_token = None
+
+    def iter_schedule(self, season, game_types=None):
+        for number in range(1, self.games + 1):
+            self.fetched += 1
+            yield {
+                'gamePk': int(season[:4]) * 1000000 + number,
+                'gameType': 2,
+                'gameDate': '2023-10-10T23:00:00Z',
+                'teams': {'away': {'team': {'id': 1}}, 'home': {'team': {'id': 2}}},
+                'venue': {'name': 'Arena'},
+                'status': {'detailedState': 'Final'},
+            }
+
+
+def test_full_spool_stops_the_season_sync(tmp_path, monkeypatch):
+    db = DatabaseManager({}, backend='sqlite', path=str(tmp_path / 'nhl.sqlite'))
+    db.init_schema()
+
+    def unavailable(*args, **kwargs):
+        raise DatabaseUnavailable('database went away')
+
+    monkeypatch.setattr(db, 'insert_rows', unavailable)
+    api = ScheduleApi(games=200000)
+    spool = json_spool(tmp_path / 'spool', max_bytes=64 * 1024)
+    sync_manager = SyncManager(db, api, spool=spool)
+
+    with pytest.raises(SpoolFull):
+        sync_manager.sync_seasons(['20222023', '20232024'], workers=2, include_stats=False)
+
+    # The season threads stopped fetching once the writer could not store their rows
+    assert api.fetched < api.games
+    assert spool.size() <= spool.max_bytes
+    assert sync_manager.runs.recent()[0]['status'] == 'failed'
@@ -0,0 +1,59 @@
+"""
+Tests for SyncManager behaviour while the database is unreachable.
+"""
+
+import pytest
+
+from lib.database import DatabaseManager, DatabaseUnavailable
+from lib.sync_manager import SyncManager
+from lib.teams import TeamRegistry
+
+
+class RosterApi:
+    """Stands in for NHLApiClient, counting the landing pages requested."""
+
+    def __init__(self):
+        self.cancel_token = None
+        self.players_fetched = 0
+
+    def get_teams(self):
+        return [{'id': 1}]
+
+    def get_team_roster(self, team_id):
+        return {'roster': [{'person': {'id': 8478402}}]}
+
+    def roster_unchanged(self, team_id):
+        return False
+
+    def get_player(self, player_id):
+        self.players_fetched += 1
+        return {'id': player_id}
+
+
+@pytest.fixture
+def unreachable_db(tmp_path, monkeypatch):
+    db = DatabaseManager({}, backend='sqlite', path=str(tmp_path / 'nhl.sqlite'))
+    db.init_schema()
+
+    def unavailable(**options):
+        raise DatabaseUnavailable('database went away')
+
+    monkeypatch.setattr(db, 'get_connection', unavailable)
+    return db
+
+
+def test_players_sync_needs_the_stored_players(unreachable_db):
+    api = RosterApi()
+    with pytest.raises(DatabaseUnavailable):
+        SyncManager(unreachable_db, api).sync_players()
+    assert api.players_fetched == 0
+
+
+def test_team_registry_does_not_guess_without_the_database(unreachable_db):
+    registry = TeamRegistry(unreachable_db)
+    with pytest.raises(DatabaseUnavailable):
+        registry.load()
+    for _ in range(2):
+        with pytest.raises(DatabaseUnavailable):
+            registry.team_id('XYZ', 'Expansion Team')
+    assert registry.team_id('BOS') == 6
@@ -0,0 +1,60 @@
+"""
+Tests for the shared batch writer.
+"""
+
+import threading
+import time
+
+import pytest
+
+from lib.writer import BatchWriter
+
+
+class WriteFailed(Exception):
+    pass
+
+
+def test_write_error_reaches_the_producers():
+    def write(table, columns, rows, key_fields):
+        raise WriteFailed(table)
+
+    with BatchWriter(write) as writer:
+        writer.submit('games', ['id'], [(1,)], ['id'])
+        with pytest.raises(WriteFailed):
+            writer.flush()
+        with pytest.raises(WriteFailed):
+            writer.submit('games', ['id'], [(2,)], ['id'])
+        with pytest.raises(WriteFailed):
+            writer.submit_units([(1, {'player_stats': (['id'], [(1,)])})], ['id'])
+    assert len(writer.errors) == 1
+
+
+def test_flush_waits_only_for_earlier_rows():
+    gate = threading.Event()
+    written = []
+
+    def write(table, columns, rows, key_fields):
+        if table == 'slow':
+            gate.wait(5)
+        written.extend(rows)
+        return len(rows)
+
+    writer = BatchWriter(write, flush_interval=0.05)
+    writer.submit('fast', ['id'], [(1,)], ['id'])
+    flushed = threading.Event()
+    producer = threading.Thread(target=lambda: (writer.flush(), flushed.set()))
+    producer.start()
+    while writer._queue.qsize() < 2:
+        time.sleep(0.01)
+    # Another producer's rows queued behind the flush marker
+    writer.submit('slow', ['id'], [(2,)], ['id'])
+
+    writer.start()
+    try:
+        assert flushed.wait(2)
+        assert written == [(1,)]
+    finally:
+        gate.set()
+        producer.join()
+        writer.close()
+    assert written == [(1,), (2,)]
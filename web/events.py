@@ -0,0 +1,95 @@
+"""
+Buffered Socket.IO event channel for the NHL MySQL Sync web interface.
+"""
+
+import threading
+import time
+from collections import deque
+
+from web import app
+
+# Seconds between batched emits
+FLUSH_INTERVAL = 0.25
+
+# Most log lines sent in one batch; the rest of a burst is summarized
+MAX_BATCH_SIZE = 200
+
+# Recent log lines replayed to clients that connect mid-sync
+HISTORY_SIZE = 500
+
+
+class EventChannel:
+    """Coalesces log lines and status updates into periodic batched emits.
+
+    Log lines are queued and sent every FLUSH_INTERVAL as one 'log_batch'
+    event; status updates are coalesced so only the latest is sent as
+    'sync_update'. Recent log lines are kept in a ring buffer and replayed
+    to clients that connect late.
+    """
+
+    def __init__(self, socketio, flush_interval=FLUSH_INTERVAL, max_batch_size=MAX_BATCH_SIZE,
+                 history_size=HISTORY_SIZE):
+        self.socketio = socketio
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.history = deque(maxlen=history_size)
+
+        self._pending = []
+        self._status = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Start the background task that flushes the channel."""
+        if not self._started:
+            self._started = True
+            self.socketio.start_background_task(self._run)
+        return self
+
+    def log(self, level, message, timestamp=None):
+        """Queue a log line."""
+        entry = {'level': level, 'message': message, 'time': timestamp or time.time()}
+        with self._lock:
+            self._pending.append(entry)
+            self.history.append(entry)
+
+    def status(self, status):
+        """Queue a status update, replacing any update not sent yet."""
+        with self._lock:
+            self._status = status
+
+    def replay(self, sid):
+        """Send the recent log lines to one client."""
+        with self._lock:
+            history = list(self.history)
+        if history:
+            self.socketio.emit('log_batch', {'messages': history}, to=sid)
+
+    def flush(self):
+        """Emit everything queued since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            status, self._status = self._status, None
+
+        if len(pending) > self.max_batch_size:
+            # Keep the newest lines of a burst and say how many were dropped
+            skipped = len(pending) - self.max_batch_size
+            pending = [{
+                'level': 'warning',
+                'message': f'{skipped} log messages skipped',
+                'time': pending[skipped - 1]['time']
+            }] + pending[skipped:]
+        if pending:
+            self.socketio.emit('log_batch', {'messages': pending})
+        if status is not None:
+            self.socketio.emit('sync_update', status)
+
+    def _run(self):
+        """Background task: flush on a fixed interval."""
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                # A failed emit must not stop the channel
+                app.logger.error(f"Error emitting sync events: {e}")
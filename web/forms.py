@@ -40,7 +40,8 @@ class SyncForm(FlaskForm):
                                ('teams', 'Teams'),
                                ('players', 'Players'),
                                ('games', 'Games'),
-                               ('stats', 'Statistics')
+                               ('stats', 'Statistics'),
+                               ('events', 'Play-by-Play Events')
                            ],
                            validators=[DataRequired()])
     
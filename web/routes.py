@@ -4,71 +4,122 @@ Routes for the NHL MySQL Sync web interface.
 
 import os
 import json
-import threading
 from datetime import datetime
-from flask import render_template, request, jsonify, redirect, url_for, flash
-from web import app, socketio, scheduler
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response
+from web import app, socketio
 from web.forms import ConfigForm, SyncForm
-from lib.database import DatabaseManager
-from lib.nhl_api import NHLApiClient
-from lib.sync_manager import SyncManager
+from web.events import EventChannel
+from lib.database import DatabaseManager, DatabaseUnavailable
+from lib.cache import QueryCache, cache_key
+from lib.jobs import JobQueue, JobConflict, ACTIVE_STATUSES
+from lib.runs import SyncRunHistory
 import config
 
-# Global variables to track sync status
-sync_status = {
-    'is_running': False,
-    'current_task': None,
-    'progress': 0,
-    'last_run': None,
-    'stats': {
-        'teams_updated': 0,
-        'players_updated': 0,
-        'games_updated': 0,
-        'stats_updated': 0
-    }
-}
+# Seconds between checks of the job queue for status updates
+RELAY_INTERVAL = 0.5
+
+# Sync jobs are executed by sync_worker.py; the web process only queues them
+job_queue = JobQueue(config.JOB_QUEUE['path'])
+
+# Log lines and status updates are sent to the browser in batches
+events = EventChannel(socketio).start()
 
-# Initialize components
+# Read-through cache for the JSON API; kept across component reinitialization
+query_cache = QueryCache(**config.CACHE)
+
+# Components are created on first use (see get_db_manager) so the app starts quickly
 db_manager = None
-api_client = None
-sync_manager = None
 
 def init_components():
-    """Initialize the application components."""
-    global db_manager, api_client, sync_manager
-    db_manager = DatabaseManager(config.DB_CONFIG)
-    api_client = NHLApiClient(config.NHL_API_BASE_URL)
-    sync_manager = SyncManager(db_manager, api_client)
+    """Drop the application components; they are recreated from the current config on first use."""
+    global db_manager
+    db_manager = None
+
+def get_db_manager():
+    """Return the database manager, creating it on first use."""
+    global db_manager
+    if db_manager is None:
+        db_manager = DatabaseManager(config.DB_CONFIG, backend=config.DB_BACKEND, path=config.DB_PATH)
+    return db_manager
+
+def job_status(job):
+    """Build the sync status shown in the interface from a queued job."""
+    status = {
+        'job_id': None,
+        'status': None,
+        'is_running': False,
+        'current_task': None,
+        'progress': 0,
+        'last_run': None,
+        'stats': {
+            'teams_updated': 0,
+            'players_updated': 0,
+            'games_updated': 0,
+            'stats_updated': 0
+        }
+    }
     
-    # Override the sync manager's logger to emit socket events
-    original_logger = sync_manager.logger
+    last_finished = job_queue.last_finished_at()
+    if last_finished:
+        status['last_run'] = datetime.fromtimestamp(last_finished).strftime('%Y-%m-%d %H:%M:%S')
+    if job is None:
+        return status
     
-    class SocketLogger:
-        def debug(self, message):
-            original_logger.info(message)  # Use info level instead of debug
-            socketio.emit('log_message', {'level': 'debug', 'message': message})
+    status['job_id'] = job['id']
+    status['status'] = job['status']
+    status['is_running'] = job['status'] in ACTIVE_STATUSES
+    status['progress'] = job['progress']
+    status['stats'].update(job['stats'])
+    if job['status'] == 'queued':
+        status['current_task'] = f"Waiting for a worker ({job['job_type']})"
+    elif job['status'] == 'cancelled':
+        status['current_task'] = 'Cancelled'
+    elif job['status'] == 'failed':
+        status['current_task'] = f"Error: {job['error']}"
+    else:
+        status['current_task'] = job['current_task']
+    return status
+
+def current_sync_status():
+    """Return the status of the running job, or of the most recent one."""
+    return job_status(job_queue.latest())
+
+def relay_job_updates():
+    """Forward job progress and log lines from the queue to Socket.IO clients."""
+    last_status = None
+    last_event_id = {}
+    last_invalidation_id = job_queue.last_invalidation_id()
+    while True:
+        socketio.sleep(RELAY_INTERVAL)
+        try:
+            # Drop the cached responses made stale by any sync process (worker, --daemon or CLI)
+            invalidations = job_queue.invalidations(last_invalidation_id)
+            if invalidations:
+                query_cache.invalidate(row['cache_key'] for row in invalidations)
+                last_invalidation_id = invalidations[-1]['id']
             
-        def info(self, message):
-            original_logger.info(message)
-            socketio.emit('log_message', {'level': 'info', 'message': message})
+            job_queue.fail_stale(config.JOB_QUEUE['heartbeat_timeout'])
+            job = job_queue.latest()
+            if job is None:
+                continue
             
-        def warning(self, message):
-            original_logger.warning(message)
-            socketio.emit('log_message', {'level': 'warning', 'message': message})
+            for event in job_queue.events(job['id'], last_event_id.get(job['id'], 0)):
+                events.log(event['level'], event['message'], event['created_at'])
+                last_event_id[job['id']] = event['id']
             
-        def error(self, message, exc_info=None):
-            original_logger.error(message, exc_info=exc_info)
-            socketio.emit('log_message', {'level': 'error', 'message': message})
-    
-    sync_manager.logger = SocketLogger()
+            status = job_status(job)
+            if status != last_status:
+                events.status(status)
+                last_status = status
+        except Exception as e:
+            app.logger.error(f"Error relaying sync job updates: {e}")
 
-# Initialize components on startup
-init_components()
+socketio.start_background_task(relay_job_updates)
 
 @app.route('/')
 def index():
     """Render the dashboard page."""
-    return render_template('dashboard.html', sync_status=sync_status)
+    return render_template('dashboard.html', sync_status=current_sync_status())
 
 @app.route('/config', methods=['GET', 'POST'])
 def config_page():
@@ -93,7 +144,8 @@ def config_page():
         # Reinitialize components with new config
         init_components()
         
-        flash('Configuration updated successfully', 'success')
+        flash('Configuration updated successfully. Sync jobs keep using the sync worker\'s own '
+              'configuration (environment or .env).', 'success')
         return redirect(url_for('config_page'))
     
     # Pre-populate form with current values
@@ -123,16 +175,34 @@ def sync_page():
         all_seasons = form.all_seasons.data
         season = form.season.data if form.season.data and not all_seasons else None
         
-        # Start sync in background thread
-        thread = threading.Thread(target=run_sync, args=(data_type, season, all_seasons))
-        thread.daemon = True
-        thread.start()
+        if all_seasons:
+            # Process seasons from 2010-2011 to present
+            current_year = datetime.now().year
+            seasons = [str(year) + str(year + 1) for year in range(2010, current_year)]
+        else:
+            # Determine single season to use if not provided
+            if not season:
+                current_year = datetime.now().year
+                season = str(current_year - 1) + str(current_year)
+            seasons = [season]
+        
+        # Hand the sync to the worker process; only one job per data type may be active.
+        # The worker connects with its own configuration, so no credentials go into the queue.
+        params = {
+            'data_type': data_type,
+            'seasons': seasons,
+        }
+        try:
+            job_queue.enqueue(data_type, params)
+        except JobConflict as e:
+            flash(str(e), 'warning')
+            return redirect(url_for('sync_page'))
         
-        season_msg = "all seasons" if all_seasons else f"season {season if season else 'current'}"
-        flash(f'Started synchronization of {data_type} data for {season_msg}', 'success')
+        season_msg = "all seasons" if all_seasons else f"season {season}"
+        flash(f'Queued synchronization of {data_type} data for {season_msg}', 'success')
         return redirect(url_for('sync_page'))
     
-    return render_template('sync.html', form=form, sync_status=sync_status)
+    return render_template('sync.html', form=form, sync_status=current_sync_status())
 
 @app.route('/stats')
 def stats_page():
@@ -145,13 +215,13 @@ def stats_page():
         tables = ['teams', 'players', 'games', 'player_stats', 'goalie_stats']
         for table in tables:
             count_query = f"SELECT COUNT(*) as count FROM {table}"
-            result = db_manager.execute_query(count_query, fetch=True)
+            result = get_db_manager().execute_query(count_query, fetch=True)
             db_stats[table] = result[0]['count'] if result else 0
         
         # Get last updated timestamps
         for table in tables:
             query = f"SELECT MAX(last_updated) as last_updated FROM {table}"
-            result = db_manager.execute_query(query, fetch=True)
+            result = get_db_manager().execute_query(query, fetch=True)
             timestamp = result[0]['last_updated'] if result and result[0]['last_updated'] else None
             db_stats[f"{table}_updated"] = timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else 'Never'
         
@@ -159,136 +229,178 @@ def stats_page():
         app.logger.error(f"Error fetching database statistics: {e}")
         db_stats = {'error': str(e)}
     
-    return render_template('stats.html', db_stats=db_stats, sync_status=sync_status)
+    return render_template('stats.html', db_stats=db_stats, sync_status=current_sync_status())
+
+@app.route('/history')
+def history_page():
+    """Render the sync run history page."""
+    return render_template('history.html')
+
+@app.route('/api/sync/runs')
+def get_sync_runs():
+    """API endpoint to get the most recent sync runs, newest first."""
+    limit = min(request.args.get('limit', 200, type=int), 1000)
+    try:
+        runs = SyncRunHistory(get_db_manager()).recent(limit, request.args.get('job_type') or None)
+    except Exception as e:
+        app.logger.error(f"Error fetching sync runs: {e}")
+        return jsonify({'runs': [], 'error': str(e)}), 500
+    for run in runs:
+        for field in ('started_at', 'finished_at'):
+            if run[field] is not None:
+                run[field] = run[field].isoformat(sep=' ')
+        if run['duration_seconds'] is not None:
+            run['duration_seconds'] = float(run['duration_seconds'])
+    return jsonify({'runs': runs})
 
 @app.route('/api/sync/status')
 def get_sync_status():
     """API endpoint to get the current sync status."""
-    return jsonify(sync_status)
+    return jsonify(current_sync_status())
 
 @app.route('/api/sync/cancel', methods=['POST'])
 def cancel_sync():
     """API endpoint to cancel the current sync operation."""
-    global sync_status
-    sync_status['is_running'] = False
-    socketio.emit('sync_update', sync_status)
+    cancelled = job_queue.request_cancel()
+    if not cancelled:
+        return jsonify({'success': False, 'message': 'No sync operation is running'})
+    events.status(current_sync_status())
     return jsonify({'success': True, 'message': 'Sync operation cancelled'})
 
+def cached_json(key, loader):
+    """Serve a JSON API response through the query cache, honouring If-None-Match."""
+    try:
+        entry = query_cache.get_or_load(key, loader)
+    except DatabaseUnavailable as e:
+        app.logger.error(f"Error loading {key}: {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        app.logger.error(f"Error loading {key}: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    if entry is None:
+        return jsonify({'error': 'Not found'}), 404
+    
+    body, etag = entry
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def load_team(team_id):
+    """Load a team and its current roster."""
+    teams = get_db_manager().execute_query("SELECT * FROM teams WHERE id = %s", (team_id,), fetch=True)
+    if not teams:
+        return None
+    team = teams[0]
+    team['roster'] = get_db_manager().execute_query("""
+        SELECT id, full_name, primary_number, position
+        FROM players
+        WHERE current_team_id = %s AND active = TRUE
+        ORDER BY last_name, first_name
+    """, (team_id,), fetch=True)
+    return team
+
+def load_player(player_id):
+    """Load a player and their season totals."""
+    players = get_db_manager().execute_query("SELECT * FROM players WHERE id = %s", (player_id,), fetch=True)
+    if not players:
+        return None
+    player = players[0]
+    player['seasons'] = get_db_manager().execute_query(
+        "SELECT * FROM player_season_totals WHERE player_id = %s ORDER BY season", (player_id,), fetch=True)
+    player['goalie_seasons'] = get_db_manager().execute_query(
+        "SELECT * FROM goalie_season_totals WHERE player_id = %s ORDER BY season", (player_id,), fetch=True)
+    return player
+
+def load_game(game_id):
+    """Load a game with its skater and goalie stat lines."""
+    games = get_db_manager().execute_query("SELECT * FROM games WHERE id = %s", (game_id,), fetch=True)
+    if not games:
+        return None
+    game = games[0]
+    # Filtering on season as well limits the lookups to the game's partition
+    params = (game_id, game['season'])
+    game['player_stats'] = get_db_manager().execute_query(
+        "SELECT * FROM player_stats WHERE game_id = %s AND season = %s", params, fetch=True)
+    game['goalie_stats'] = get_db_manager().execute_query(
+        "SELECT * FROM goalie_stats WHERE game_id = %s AND season = %s", params, fetch=True)
+    return game
+
+def load_leaders(season, limit=25):
+    """Load the scoring and goaltending leaders of a season."""
+    leaders = {'season': season}
+    for category in ('points', 'goals', 'assists'):
+        leaders[category] = get_db_manager().execute_query(f"""
+            SELECT t.player_id, p.full_name, t.games_played, t.{category}
+            FROM player_season_totals t
+            JOIN players p ON p.id = t.player_id
+            WHERE t.season = %s
+            ORDER BY t.{category} DESC, t.games_played ASC
+            LIMIT %s
+        """, (season, limit), fetch=True)
+    leaders['save_percentage'] = get_db_manager().execute_query("""
+        SELECT t.player_id, p.full_name, t.games_played, t.save_percentage
+        FROM goalie_season_totals t
+        JOIN players p ON p.id = t.player_id
+        WHERE t.season = %s AND t.shots_against > 0
+        ORDER BY t.save_percentage DESC
+        LIMIT %s
+    """, (season, limit), fetch=True)
+    return leaders
+
+@app.route('/api/teams/<int:team_id>')
+def get_team(team_id):
+    """API endpoint to get a team with its roster."""
+    return cached_json(cache_key('team', team_id), lambda: load_team(team_id))
+
+@app.route('/api/players/<int:player_id>')
+def get_player(player_id):
+    """API endpoint to get a player with their season totals."""
+    return cached_json(cache_key('player', player_id), lambda: load_player(player_id))
+
+@app.route('/api/games/<int:game_id>')
+def get_game(game_id):
+    """API endpoint to get a game with its stat lines."""
+    return cached_json(cache_key('game', game_id), lambda: load_game(game_id))
+
+@app.route('/api/leaders/<int:season>')
+def get_leaders(season):
+    """API endpoint to get the leaders of a season."""
+    return cached_json(cache_key('leaders', season), lambda: load_leaders(season))
+
+@app.route('/api/export', methods=['POST'])
+def start_export():
+    """API endpoint to queue a Parquet snapshot export of the changed seasons."""
+    params = {
+        'data_type': 'export',
+        'seasons': [],
+    }
+    try:
+        job_queue.enqueue('export', params)
+    except JobConflict as e:
+        return jsonify({'success': False, 'message': str(e)})
+    return jsonify({'success': True, 'message': f'Queued snapshot export to {config.EXPORT_DIR}'})
+
 @app.route('/api/db/init', methods=['POST'])
 def init_database():
     """API endpoint to initialize the database schema."""
     try:
-        db_manager.init_schema()
+        get_db_manager().init_schema()
         return jsonify({'success': True, 'message': 'Database schema initialized successfully'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error initializing database: {str(e)}'})
 
-def run_sync(data_type, season=None, all_seasons=False):
-    """Run a synchronization operation in the background."""
-    global sync_status
-    
-    # Update sync status
-    sync_status['is_running'] = True
-    sync_status['current_task'] = data_type
-    sync_status['progress'] = 0
-    sync_status['stats'] = {
-        'teams_updated': 0,
-        'players_updated': 0,
-        'games_updated': 0,
-        'stats_updated': 0
-    }
-    socketio.emit('sync_update', sync_status)
-    
-    try:
-        # Generate list of seasons to process
-        seasons_to_process = []
-        
-        if all_seasons:
-            # Process seasons from 2010-2011 to present
-            current_year = datetime.now().year
-            for year in range(2010, current_year):
-                seasons_to_process.append(str(year) + str(year + 1))
-        else:
-            # Determine single season to use if not provided
-            if not season:
-                current_year = datetime.now().year
-                season = str(current_year - 1) + str(current_year)
-            seasons_to_process.append(season)
-        
-        # Override the database manager's insert_or_update method to track progress
-        original_insert_or_update = db_manager.insert_or_update
-        
-        def tracked_insert_or_update(table, data, key_fields):
-            rows_affected = original_insert_or_update(table, data, key_fields)
-            
-            # Update stats based on table
-            if table == 'teams':
-                sync_status['stats']['teams_updated'] += rows_affected
-            elif table == 'players':
-                sync_status['stats']['players_updated'] += rows_affected
-            elif table == 'games':
-                sync_status['stats']['games_updated'] += rows_affected
-            elif table in ['player_stats', 'goalie_stats']:
-                sync_status['stats']['stats_updated'] += rows_affected
-            
-            # Update progress (simplified)
-            sync_status['progress'] += 10
-            if sync_status['progress'] > 100:
-                sync_status['progress'] = 100
-                
-            socketio.emit('sync_update', sync_status)
-            return rows_affected
-        
-        # Replace the method temporarily
-        db_manager.insert_or_update = tracked_insert_or_update
-        
-        # Perform the requested sync operation
-        if data_type == 'teams' or data_type == 'all':
-            sync_status['current_task'] = 'Synchronizing teams'
-            socketio.emit('sync_update', sync_status)
-            sync_manager.sync_teams()
-            
-        if data_type == 'players' or data_type == 'all':
-            sync_status['current_task'] = 'Synchronizing players'
-            socketio.emit('sync_update', sync_status)
-            sync_manager.sync_players()
-            
-        if data_type == 'games' or data_type == 'all':
-            for season_to_process in seasons_to_process:
-                if not sync_status['is_running']:
-                    break  # Allow cancellation between seasons
-                sync_status['current_task'] = f'Synchronizing games for season {season_to_process}'
-                socketio.emit('sync_update', sync_status)
-                sync_manager.sync_games(season_to_process)
-            
-        if data_type == 'stats' or data_type == 'all':
-            for season_to_process in seasons_to_process:
-                if not sync_status['is_running']:
-                    break  # Allow cancellation between seasons
-                sync_status['current_task'] = f'Synchronizing stats for season {season_to_process}'
-                socketio.emit('sync_update', sync_status)
-                sync_manager.sync_stats(season_to_process)
-        
-        # Restore the original method
-        db_manager.insert_or_update = original_insert_or_update
-        
-        # Update final status
-        sync_status['is_running'] = False
-        sync_status['current_task'] = 'Completed'
-        sync_status['progress'] = 100
-        sync_status['last_run'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-    except Exception as e:
-        app.logger.error(f"Error during sync: {e}")
-        sync_status['is_running'] = False
-        sync_status['current_task'] = f'Error: {str(e)}'
-        
-    socketio.emit('sync_update', sync_status)
-
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection to socket."""
-    socketio.emit('sync_update', sync_status)
+    # Bring the new client up to date without re-sending to everyone else
+    socketio.emit('sync_update', current_sync_status(), to=request.sid)
+    events.replay(request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -5,8 +5,13 @@ Provides a GUI for configuration, manual sync, and monitoring.
 """
 
 import os
+import sys
+import atexit
 import argparse
 import logging
+import subprocess
+import config
+from lib.logging_setup import setup_logging
 from web import app, socketio
 
 def parse_args():
@@ -18,8 +23,18 @@ def parse_args():
                         help='Port to bind the server to (default: 7443)')
     parser.add_argument('--debug', action='store_true',
                         help='Run in debug mode')
+    parser.add_argument('--no-worker', action='store_true',
+                        help='Do not start a sync worker (when sync_worker.py runs separately)')
     return parser.parse_args()
 
+def start_sync_worker():
+    """Start sync_worker.py next to the web server; it is stopped when the server exits."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sync_worker.py')
+    worker_process = subprocess.Popen([sys.executable, script])
+    atexit.register(worker_process.terminate)
+    print(f"Sync worker started (pid {worker_process.pid})")
+    return worker_process
+
 def setup_jinja_filters():
     """Set up custom Jinja2 filters."""
     @app.template_filter('now')
@@ -30,28 +45,33 @@ def setup_jinja_filters():
             return datetime.now().year
         return datetime.now().strftime(fmt)
 
+def serve(host, port, debug=False):
+    """Run the web server until it is stopped; also used by nhl_sync.py --web --in-process."""
+    # Set up Jinja2 filters
+    setup_jinja_filters()
+    
+    # Start the server with CORS support
+    from flask_cors import CORS
+    CORS(app)
+    socketio.run(app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True)
+
 def main():
     """Main entry point for the web server."""
     args = parse_args()
     
     # Set up logging
-    log_level = logging.DEBUG if args.debug else logging.INFO
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    setup_logging(**dict(config.LOGGING, level='DEBUG' if args.debug else config.LOGGING['level']))
     
-    # Set up Jinja2 filters
-    setup_jinja_filters()
+    # Syncs run in a separate worker process so they never block web requests.
+    # In debug mode only the reloader's outer process starts it, so it runs once.
+    if not args.no_worker and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        start_sync_worker()
     
     # Print startup message
     print(f"NHL MySQL Sync Web Server starting on http://{args.host}:{args.port}")
     print("Press Ctrl+C to stop the server")
     
-    # Start the server with CORS support
-    from flask_cors import CORS
-    CORS(app)
-    socketio.run(app, host=args.host, port=args.port, debug=args.debug, allow_unsafe_werkzeug=True)
+    serve(args.host, args.port, debug=args.debug)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file